@@ -0,0 +1,478 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import tempfile
+import asyncio
+import argparse
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import font_assets
+import pandoc_worker
+from browser_pool import BrowserPool
+from dir_watch import DEFAULT_DEBOUNCE, DirectoryWatcher
+from html_template import PDF_OPTIONS, STYLESHEET_VERSION, render_styled_html
+from page_loader import load_page
+
+ENGINES = ("pandoc", "markdown")
+DEFAULT_CONCURRENCY = 4
+MANIFEST_NAME = ".md2pdf-manifest.json"
+MANIFEST_VERSION = 1
+
+
+def find_markdown_files(input_dir: str, patterns: Sequence[str]) -> List[str]:
+    """按glob模式查找输入目录中的Markdown文件，返回排序后的绝对路径"""
+    found = set()
+    for pattern in patterns:
+        for path in glob.glob(os.path.join(input_dir, pattern), recursive=True):
+            if os.path.isfile(path):
+                found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def markdown_file_to_html(md_path: str, engine: str) -> str:
+    """读取Markdown文件并转换为带样式的HTML（在线程池或进程池中运行）"""
+    with open(md_path, encoding="utf-8") as f:
+        text = f.read()
+
+    if engine == "markdown":
+        from markdown import markdown
+
+        html_content = markdown(text, extensions=["extra"])
+    else:
+        html_content = pandoc_worker.convert_text(
+            text, "html", format="markdown", extra_args=["--standalone"]
+        )
+    return render_styled_html(html_content, font_assets.stylesheet_for(text))
+
+
+def _write_file(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+
+def options_hash(engine: str, keep_html: bool) -> str:
+    """影响输出结果的全部渲染选项的哈希"""
+    options = {
+        "engine": engine,
+        "keep_html": keep_html,
+        "stylesheet": STYLESHEET_VERSION,
+        "pdf": PDF_OPTIONS,
+    }
+    return hashlib.sha256(json.dumps(options, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_manifest(output_dir: str) -> dict:
+    """读取输出目录中的清单；不存在或版本不符时返回空清单"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def save_manifest(output_dir: str, entries: dict) -> None:
+    """原子地写入清单，避免中断时留下损坏的文件"""
+    os.makedirs(output_dir, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=output_dir, prefix=".tmp-")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump({"version": MANIFEST_VERSION, "files": entries}, f, ensure_ascii=False, indent=1)
+    os.replace(temp_path, os.path.join(output_dir, MANIFEST_NAME))
+
+
+def source_digest(md_path: str, entry: Optional[dict]) -> str:
+    """计算源文件的内容哈希；大小和修改时间未变时直接沿用清单中的值"""
+    stat = os.stat(md_path)
+    if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+        return entry["source_hash"]
+    digest = hashlib.sha256()
+    with open(md_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _remove_outputs(entry: dict) -> None:
+    for key in ("output", "html_output"):
+        path = entry.get(key)
+        if path and os.path.exists(path):
+            os.remove(path)
+
+
+def _make_executor(engine: str, workers: int) -> Executor:
+    # python-markdown runs in this interpreter, so it needs real processes to use more cores.
+    # pandoc already runs out of process in the pandoc_worker pool; threads just feed it.
+    if engine == "markdown":
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+def _make_pool(concurrency: int, max_waiters: int) -> BrowserPool:
+    return BrowserPool(
+        size=1,
+        pages_per_browser=concurrency,
+        max_waiters=max_waiters,
+        acquire_timeout=None,
+        routes=[(font_assets.FONT_FILE_PATTERN, font_assets.handle_font_route)],
+    )
+
+
+async def convert_file(
+    md_path: str,
+    pdf_path: str,
+    html_path: Optional[str],
+    engine: str,
+    pool: BrowserPool,
+    executor: Executor,
+) -> dict:
+    """转换单个文件：在执行器中生成HTML，借用浏览器页面渲染PDF，然后写出文件
+
+    html_path 为 None 时不保存中间HTML。返回各阶段耗时（毫秒）和输入输出字节数。
+    """
+    loop = asyncio.get_running_loop()
+    started = time.monotonic()
+    styled_html = await loop.run_in_executor(executor, markdown_file_to_html, md_path, engine)
+    converted = time.monotonic()
+
+    async def render(page) -> bytes:
+        await load_page(page, styled_html, base_dir=os.path.dirname(md_path))
+        return await page.pdf(**PDF_OPTIONS)
+
+    # 浏览器崩溃时会换一个新浏览器重试
+    pdf_bytes = await pool.run(render)
+    rendered = time.monotonic()
+
+    writes = [asyncio.to_thread(_write_file, pdf_path, pdf_bytes)]
+    if html_path is not None:
+        writes.append(asyncio.to_thread(_write_file, html_path, styled_html.encode("utf-8")))
+    await asyncio.gather(*writes)
+    finished = time.monotonic()
+    return {
+        "convert_ms": (converted - started) * 1000,
+        "render_ms": (rendered - converted) * 1000,
+        "write_ms": (finished - rendered) * 1000,
+        "bytes_in": os.path.getsize(md_path),
+        "bytes_out": len(pdf_bytes),
+    }
+
+
+def _output_paths(md_path: str, input_dir: str, output_dir: str) -> Tuple[str, str, str]:
+    relative = os.path.relpath(md_path, input_dir)
+    stem = os.path.splitext(relative)[0]
+    return relative, os.path.join(output_dir, stem + ".pdf"), os.path.join(output_dir, stem + ".html")
+
+
+def _manifest_entry(md_path: str, digest: str, render_options: str, pdf_path: str, html_path: Optional[str]) -> dict:
+    stat = os.stat(md_path)
+    return {
+        "source_hash": digest,
+        "options_hash": render_options,
+        "output": pdf_path,
+        "html_output": html_path,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+async def convert_directory(
+    input_dir: str,
+    output_dir: Optional[str] = None,
+    patterns: Sequence[str] = ("*.md",),
+    engine: str = "pandoc",
+    concurrency: int = DEFAULT_CONCURRENCY,
+    convert_workers: Optional[int] = None,
+    keep_html: bool = False,
+    incremental: bool = True,
+    pool: Optional[BrowserPool] = None,
+    executor: Optional[Executor] = None,
+) -> dict:
+    """流水线批量转换：HTML转换、浏览器渲染和文件写入在不同文件之间并行进行
+
+    输出目录中的清单记录每个文件的内容哈希、渲染选项哈希和输出路径，源文件已删除的
+    输出会被清理。增量模式下未变化的文件被跳过；incremental=False 时全部重建。
+    传入已启动的 pool 和 executor 时直接使用且不关闭它们（监视模式）。
+    返回包含每个文件耗时和整体吞吐量的汇总字典。
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"未知的转换引擎 {engine!r}，可选: {', '.join(ENGINES)}")
+    output_dir = output_dir or input_dir
+    md_files = find_markdown_files(input_dir, patterns)
+    summary = {
+        "files": [], "succeeded": 0, "failed": 0, "skipped": 0, "removed": 0,
+        "bytes_in": 0, "bytes_out": 0,
+    }
+
+    previous = load_manifest(output_dir)
+    manifest = {}
+    render_options = options_hash(engine, keep_html)
+
+    # 清理源文件已被删除的输出；未被本次glob匹配但仍存在的文件保留原记录
+    for relative, entry in previous.items():
+        if not os.path.exists(os.path.join(input_dir, relative)):
+            _remove_outputs(entry)
+            summary["removed"] += 1
+            print(f"源文件 {relative} 已删除，移除其输出。")
+        else:
+            manifest[relative] = entry
+
+    pending = []
+    for md_path in md_files:
+        relative = os.path.relpath(md_path, input_dir)
+        entry = previous.get(relative)
+        digest = source_digest(md_path, entry)
+        if (
+            incremental
+            and entry
+            and entry["source_hash"] == digest
+            and entry["options_hash"] == render_options
+            and os.path.exists(entry["output"])
+        ):
+            manifest[relative] = entry
+            summary["skipped"] += 1
+        else:
+            pending.append((md_path, digest))
+
+    if not md_files:
+        print(f"在 {input_dir} 中未找到Markdown文件。")
+    if not pending:
+        save_manifest(output_dir, manifest)
+        if md_files:
+            print(f"全部 {len(md_files)} 个文件均未变化，无需转换。")
+        return summary
+
+    print(f"找到 {len(md_files)} 个Markdown文件，其中 {len(pending)} 个需要转换为PDF...")
+    owned = pool is None
+    if owned:
+        executor = _make_executor(engine, convert_workers or os.cpu_count() or 1)
+        pool = _make_pool(concurrency, len(pending))
+    # 限制同时在流水线中的文件数，避免数千个HTML同时驻留内存
+    admission = asyncio.Semaphore(concurrency * 2)
+
+    async def convert_one(md_path: str, digest: str) -> None:
+        relative, pdf_path, html_path = _output_paths(md_path, input_dir, output_dir)
+        if not keep_html:
+            html_path = None
+        result = {"file": relative, "output": pdf_path}
+
+        async with admission:
+            try:
+                result.update(await convert_file(md_path, pdf_path, html_path, engine, pool, executor))
+            except Exception as e:
+                result["error"] = str(e)
+                summary["failed"] += 1
+                print(f"转换 {relative} 时出错: {str(e)}")
+                summary["files"].append(result)
+                return
+
+        manifest[relative] = _manifest_entry(md_path, digest, render_options, pdf_path, html_path)
+        summary["succeeded"] += 1
+        summary["bytes_in"] += result["bytes_in"]
+        summary["bytes_out"] += result["bytes_out"]
+        summary["files"].append(result)
+        print(
+            f"成功将 {relative} 转换为PDF。"
+            f"(转换 {result['convert_ms']:.0f} ms, 渲染 {result['render_ms']:.0f} ms, "
+            f"写入 {result['write_ms']:.0f} ms, {result['bytes_out'] / 1024:.1f} KB)"
+        )
+
+    started = time.monotonic()
+    if owned:
+        await pool.start()
+    try:
+        await asyncio.gather(*(convert_one(path, digest) for path, digest in pending))
+    finally:
+        if owned:
+            await pool.stop()
+            executor.shutdown()
+        save_manifest(output_dir, manifest)
+
+    elapsed = time.monotonic() - started
+    summary["elapsed_s"] = elapsed
+    summary["files_per_s"] = summary["succeeded"] / elapsed if elapsed else 0.0
+    print(
+        f"完成: 成功 {summary['succeeded']} 个, 失败 {summary['failed']} 个, "
+        f"跳过 {summary['skipped']} 个, 清理 {summary['removed']} 个, "
+        f"用时 {elapsed:.2f} s, 吞吐 {summary['files_per_s']:.2f} 文件/秒, "
+        f"输入 {summary['bytes_in'] / elapsed / 1024:.1f} KB/秒"
+    )
+    return summary
+
+
+async def watch_directory(
+    input_dir: str,
+    output_dir: Optional[str] = None,
+    patterns: Sequence[str] = ("*.md",),
+    engine: str = "pandoc",
+    concurrency: int = DEFAULT_CONCURRENCY,
+    convert_workers: Optional[int] = None,
+    keep_html: bool = False,
+    incremental: bool = True,
+    debounce: float = DEFAULT_DEBOUNCE,
+) -> None:
+    """监视模式：先增量同步一次，之后常驻浏览器和转换工作进程，只重新渲染发生变化的文件
+
+    同一文件同时最多只有一次渲染，渲染期间的新修改在它完成后再渲染一次。
+    每次渲染打印从察觉保存到PDF写出的延迟。一直运行到任务被取消（Ctrl+C）。
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"未知的转换引擎 {engine!r}，可选: {', '.join(ENGINES)}")
+    output_dir = output_dir or input_dir
+    render_options = options_hash(engine, keep_html)
+    executor = _make_executor(engine, convert_workers or os.cpu_count() or 1)
+    pool = _make_pool(concurrency, sys.maxsize)
+    watcher = DirectoryWatcher(input_dir, debounce=debounce)
+    running: Dict[str, asyncio.Task] = {}
+    # 渲染进行中又被修改的文件 -> 其中最早一次修改被察觉的时间
+    dirty: Dict[str, float] = {}
+
+    if engine == "pandoc":
+        await asyncio.to_thread(pandoc_worker.start)
+    await pool.start()
+    # 先开始监视再做首次同步，同步期间的保存也不会漏掉
+    watcher.start()
+    try:
+        await convert_directory(
+            input_dir, output_dir, patterns, engine, concurrency,
+            keep_html=keep_html, incremental=incremental, pool=pool, executor=executor,
+        )
+        manifest = load_manifest(output_dir)
+        print(f"正在监视 {input_dir}（{watcher.backend}），按 Ctrl+C 退出...")
+
+        async def rerender(md_path: str, detected: float) -> None:
+            relative, pdf_path, html_path = _output_paths(md_path, input_dir, output_dir)
+            if not keep_html:
+                html_path = None
+            try:
+                while True:
+                    try:
+                        digest = await asyncio.to_thread(source_digest, md_path, None)
+                        entry = manifest.get(relative)
+                        if not (
+                            entry
+                            and entry["source_hash"] == digest
+                            and entry["options_hash"] == render_options
+                            and os.path.exists(entry["output"])
+                        ):
+                            result = await convert_file(md_path, pdf_path, html_path, engine, pool, executor)
+                            manifest[relative] = _manifest_entry(md_path, digest, render_options, pdf_path, html_path)
+                            save_manifest(output_dir, manifest)
+                            print(
+                                f"已更新 {relative} 的PDF，保存后 {(time.monotonic() - detected) * 1000:.0f} ms。"
+                                f"(转换 {result['convert_ms']:.0f} ms, 渲染 {result['render_ms']:.0f} ms, "
+                                f"写入 {result['write_ms']:.0f} ms, {result['bytes_out'] / 1024:.1f} KB)"
+                            )
+                    except FileNotFoundError:
+                        # 渲染前文件又被删除或改名，随后的事件会处理
+                        pass
+                    except Exception as e:
+                        print(f"转换 {relative} 时出错: {str(e)}")
+                    detected = dirty.pop(md_path, None)
+                    if detected is None:
+                        break
+            finally:
+                del running[md_path]
+
+        def schedule(md_path: str, detected: float) -> None:
+            if md_path in running:
+                dirty.setdefault(md_path, detected)
+            else:
+                running[md_path] = asyncio.ensure_future(rerender(md_path, detected))
+
+        def remove(md_path: str) -> None:
+            relative = os.path.relpath(md_path, input_dir)
+            entry = manifest.pop(relative, None)
+            if entry is not None:
+                _remove_outputs(entry)
+                save_manifest(output_dir, manifest)
+                print(f"源文件 {relative} 已删除，移除其输出。")
+
+        async for paths, detected in watcher.changes():
+            current = set(await asyncio.to_thread(find_markdown_files, input_dir, patterns))
+            if paths is None:
+                # 事件有丢失，按全量重扫处理；未变化的文件会按哈希跳过
+                paths = current | {os.path.abspath(os.path.join(input_dir, relative)) for relative in manifest}
+            for path in paths:
+                if path in current:
+                    schedule(path, detected)
+                elif not os.path.exists(path):
+                    remove(path)
+    finally:
+        watcher.close()
+        tasks = list(running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await pool.stop()
+        executor.shutdown()
+        if engine == "pandoc":
+            pandoc_worker.stop()
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="批量将Markdown文件转换为PDF")
+    parser.add_argument("-i", "--input-dir", default=os.path.join(os.getcwd(), "answer"),
+                        help="输入目录（默认: ./answer）")
+    parser.add_argument("-o", "--output-dir", help="输出目录（默认与输入目录相同）")
+    parser.add_argument("-p", "--pattern", action="append", dest="patterns",
+                        help="glob模式，可重复指定（默认: *.md，递归可用 **/*.md）")
+    parser.add_argument("-e", "--engine", choices=ENGINES, default="pandoc",
+                        help="Markdown转换引擎（默认: pandoc）")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"同时渲染的浏览器页面数（默认: {DEFAULT_CONCURRENCY}）")
+    parser.add_argument("-w", "--convert-workers", type=int,
+                        help="HTML转换的并行工作数（默认: CPU核数）")
+    parser.add_argument("--keep-html", action="store_true", help="同时保存中间HTML文件")
+    parser.add_argument("-f", "--force", action="store_true", help="忽略清单，重新转换全部文件")
+    parser.add_argument("--watch", action="store_true",
+                        help="转换后继续监视输入目录，文件保存后立即重新渲染")
+    parser.add_argument("--debounce", type=float, default=DEFAULT_DEBOUNCE * 1000,
+                        help=f"监视模式下合并连续保存的等待时间，毫秒（默认: {DEFAULT_DEBOUNCE * 1000:.0f}）")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.input_dir):
+        print(f"错误: 目录 {args.input_dir} 不存在。")
+        return 1
+
+    if args.watch:
+        try:
+            asyncio.run(
+                watch_directory(
+                    args.input_dir,
+                    output_dir=args.output_dir,
+                    patterns=args.patterns or ["*.md"],
+                    engine=args.engine,
+                    concurrency=args.concurrency,
+                    convert_workers=args.convert_workers,
+                    keep_html=args.keep_html,
+                    incremental=not args.force,
+                    debounce=args.debounce / 1000,
+                )
+            )
+        except KeyboardInterrupt:
+            print("已停止监视。")
+        return 0
+
+    summary = asyncio.run(
+        convert_directory(
+            args.input_dir,
+            output_dir=args.output_dir,
+            patterns=args.patterns or ["*.md"],
+            engine=args.engine,
+            concurrency=args.concurrency,
+            convert_workers=args.convert_workers,
+            keep_html=args.keep_html,
+            incremental=not args.force,
+        )
+    )
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,6 @@
+"""Benchmarks comparing the Markdown to PDF converter engines.
+
+Run from the repository root::
+
+    python -m benchmarks.run --output results.json --compare previous.json
+"""
@@ -0,0 +1,181 @@
+import os
+import zlib
+import base64
+import random
+import struct
+from typing import Callable, Dict, List
+
+# Rough amount of Markdown text that fills one A4 page with the default stylesheet
+CHARS_PER_PAGE = 2500
+
+_WORDS = (
+    "render browser pipeline document latency throughput memory section table "
+    "chapter figure stream cache worker request response heading paragraph "
+    "margin font glyph layout print page queue engine convert output input"
+).split()
+# Common CJK characters, so the text exercises the Noto Sans SC subsets
+_CJK = (
+    "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动"
+    "同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自"
+    "二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日"
+)
+_EMOJI = "😀😂🥳🚀🔥✨🎉👍🍣🐍🌏📄💡🧪🛠️⏱️"
+_CODE_PYTHON = '''def {name}(items, limit={limit}):
+    """Returns the first ``limit`` items that pass the filter."""
+    result = []
+    for index, item in enumerate(items):
+        if index >= limit:
+            break
+        if item and not str(item).startswith("_"):
+            result.append({{"index": index, "value": item}})
+    return result
+'''
+_CODE_JS = '''export async function {name}(urls, concurrency = {limit}) {{
+  const results = [];
+  for (let i = 0; i < urls.length; i += concurrency) {{
+    const batch = urls.slice(i, i + concurrency).map((url) => fetch(url));
+    results.push(...(await Promise.all(batch)));
+  }}
+  return results;
+}}
+'''
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    text = " ".join(rng.choice(_WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 5) -> str:
+    return " ".join(_sentence(rng, rng.randint(8, 20)) for _ in range(sentences))
+
+
+def _cjk_paragraph(rng: random.Random, length: int = 160) -> str:
+    chars = [rng.choice(_CJK) for _ in range(length)]
+    for position in range(rng.randint(12, 30), length, rng.randint(12, 30)):
+        chars[position] = "，"
+    return "".join(chars) + "。"
+
+
+def png_image(width: int, height: int, seed: int = 0) -> bytes:
+    """Encodes a deterministic RGB gradient as a PNG without any imaging library."""
+    blue = (seed * 40) % 256
+    reds = [(x * 255) // width for x in range(width)]
+    rows = []
+    for y in range(height):
+        green = (y * 255) // height
+        rows.append(b"\x00" + bytes(value for red in reds for value in (red, green, blue)))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", header)
+        + chunk(b"IDAT", zlib.compress(b"".join(rows), 6))
+        + chunk(b"IEND", b"")
+    )
+
+
+def tiny_note(rng: random.Random, scale: float) -> str:
+    return "# Note\n\n" + _paragraph(rng, 3) + "\n\n- " + _sentence(rng) + "\n- " + _sentence(rng) + "\n"
+
+
+def manual(rng: random.Random, scale: float) -> str:
+    """A long, heading-structured manual of roughly 500 pages at scale 1."""
+    target = int(500 * CHARS_PER_PAGE * scale)
+    parts: List[str] = ["# Operations Manual\n"]
+    size = 0
+    chapter = 0
+    while size < target:
+        chapter += 1
+        parts.append(f"\n# Chapter {chapter}\n")
+        for section in range(1, 9):
+            parts.append(f"\n## {chapter}.{section} {_sentence(rng, 4)[:-1]}\n")
+            for _ in range(3):
+                paragraph = _paragraph(rng)
+                parts.append("\n" + paragraph + "\n")
+                size += len(paragraph)
+            if section % 4 == 0:
+                parts.append("\n> " + _sentence(rng) + "\n")
+    return "".join(parts)
+
+
+def huge_table(rng: random.Random, scale: float) -> str:
+    rows = max(1, int(20000 * scale))
+    lines = ["# Inventory\n", "| ID | Name | Category | Quantity | Price | Updated |", "|---|---|---|---|---|---|"]
+    for row in range(rows):
+        lines.append(
+            f"| {row} | {rng.choice(_WORDS)}-{row} | {rng.choice(_WORDS)} | {rng.randint(0, 9999)} "
+            f"| {rng.uniform(0, 1000):.2f} | 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} |"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def cjk_text(rng: random.Random, scale: float) -> str:
+    paragraphs = max(1, int(600 * scale))
+    parts = ["# 中文文档\n"]
+    for index in range(paragraphs):
+        if index % 10 == 0:
+            parts.append(f"\n## 第{index // 10 + 1}节\n")
+        parts.append("\n" + _cjk_paragraph(rng) + "\n")
+    return "".join(parts)
+
+
+def emoji_text(rng: random.Random, scale: float) -> str:
+    paragraphs = max(1, int(300 * scale))
+    parts = ["# Emoji 🎉\n"]
+    for _ in range(paragraphs):
+        words = [rng.choice(_WORDS) + (rng.choice(_EMOJI) if rng.random() < 0.3 else "") for _ in range(40)]
+        parts.append("\n" + " ".join(words) + "\n")
+    return "".join(parts)
+
+
+def code_blocks(rng: random.Random, scale: float) -> str:
+    blocks = max(1, int(400 * scale))
+    parts = ["# Code Samples\n"]
+    for index in range(blocks):
+        language, template = rng.choice((("python", _CODE_PYTHON), ("javascript", _CODE_JS)))
+        parts.append(f"\n## Sample {index}\n\n{_sentence(rng)} Uses `{rng.choice(_WORDS)}()` inline.\n")
+        parts.append(f"\n```{language}\n" + template.format(name=f"sample_{index}", limit=rng.randint(2, 64)) + "```\n")
+    return "".join(parts)
+
+
+def images(rng: random.Random, scale: float) -> str:
+    count = max(1, int(40 * scale))
+    parts = ["# Figures\n"]
+    for index in range(count):
+        data = base64.b64encode(png_image(600, 400, seed=index)).decode("ascii")
+        parts.append(f"\n{_paragraph(rng, 2)}\n\n![Figure {index}](data:image/png;base64,{data})\n")
+    return "".join(parts)
+
+
+DOCUMENTS: Dict[str, Callable[[random.Random, float], str]] = {
+    "tiny": tiny_note,
+    "manual": manual,
+    "table": huge_table,
+    "cjk": cjk_text,
+    "emoji": emoji_text,
+    "code": code_blocks,
+    "images": images,
+}
+
+
+def generate(output_dir: str, names=None, scale: float = 1.0, seed: int = 0) -> Dict[str, str]:
+    """Writes the corpus to ``output_dir`` and returns {document name: path}.
+
+    The same ``seed`` and ``scale`` always produce byte-identical files, so
+    results from different runs describe the same inputs.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = {}
+    for name in names or DOCUMENTS:
+        if name not in DOCUMENTS:
+            raise ValueError(f"Unknown document {name!r}, choose from: {', '.join(DOCUMENTS)}")
+        rng = random.Random(f"{seed}:{name}")
+        path = os.path.join(output_dir, name + ".md")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(DOCUMENTS[name](rng, scale))
+        paths[name] = path
+    return paths
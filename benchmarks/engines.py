@@ -0,0 +1,174 @@
+import os
+import sys
+import asyncio
+import itertools
+from typing import Dict, Type
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _read(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _write(path: str, data: bytes) -> int:
+    with open(path, "wb") as f:
+        f.write(data)
+    return len(data)
+
+
+class Engine:
+    """One converter implementation, driven the way its entry point drives it.
+
+    ``start`` holds everything a cold run pays for once (launching Chromium,
+    pandoc servers, worker processes); ``render`` is a single conversion
+    that writes the PDF to ``output_path`` and returns its size in bytes.
+    """
+
+    name = ""
+    description = ""
+
+    def __init__(self, concurrency: int = 4):
+        self.concurrency = concurrency
+
+    async def start(self) -> None:
+        pass
+
+    async def render(self, md_path: str, output_path: str) -> int:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        pass
+
+
+class ServerEngine(Engine):
+    name = "server"
+    description = "main.py: pooled async Playwright with pandoc server workers"
+    # Pinned, so "auto" picking python-markdown for some documents does not change what is measured
+    markdown_engine = "pandoc"
+
+    async def start(self) -> None:
+        import font_assets
+        import main
+        import pandoc_worker
+        from browser_pool import BrowserPool
+        from render_cache import RenderCache
+
+        self._main = main
+        # Measure rendering, not cache hits on the repeated inputs
+        main.render_cache = RenderCache(max_bytes=0)
+        self._renders = itertools.count()
+        await asyncio.to_thread(pandoc_worker.start)
+        self._pool = BrowserPool(
+            pages_per_browser=self.concurrency,
+            routes=[(font_assets.FONT_FILE_PATTERN, font_assets.handle_font_route)],
+        )
+        await self._pool.start()
+
+    async def render(self, md_path: str, output_path: str) -> int:
+        from render_cache import make_cache_key
+
+        md_content = _read(md_path)
+        options = self._main.render_options("pdf", engine=self.markdown_engine)
+        # A key of its own per render, so the concurrent burst of one document is not coalesced into one render
+        cache_key = f"{make_cache_key(md_content, 'pdf', options)}.{next(self._renders)}"
+        pdf_bytes = await self._main.convert_markdown_to_pdf(
+            md_content, self._pool, cache_key=cache_key, engine=self.markdown_engine
+        )
+        return _write(output_path, pdf_bytes)
+
+    async def stop(self) -> None:
+        import pandoc_worker
+
+        await self._pool.stop()
+        pandoc_worker.stop()
+
+
+class ServerMarkdownEngine(ServerEngine):
+    name = "server-markdown"
+    description = "main.py: pooled async Playwright with python-markdown in process"
+    markdown_engine = "markdown"
+
+
+class SubprocessEngine(Engine):
+    name = "subprocess"
+    description = "pdf_converter.py: one Python process and Chromium launch per document"
+
+    async def render(self, md_path: str, output_path: str) -> int:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(REPO_ROOT, "pdf_converter.py"), md_path, output_path,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=REPO_ROOT,
+        )
+        _, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(stderr.decode("utf-8", "replace").strip() or f"exit code {process.returncode}")
+        return os.path.getsize(output_path)
+
+
+class BatchEngine(Engine):
+    """The batch converter pipeline for one Markdown engine."""
+
+    engine = ""
+
+    async def start(self) -> None:
+        import batch_converter
+        import font_assets
+        import pandoc_worker
+        from browser_pool import BrowserPool
+
+        self._batch = batch_converter
+        if self.engine == "pandoc":
+            await asyncio.to_thread(pandoc_worker.start)
+        self._executor = batch_converter._make_executor(self.engine, self.concurrency)
+        self._pool = BrowserPool(
+            size=1,
+            pages_per_browser=self.concurrency,
+            acquire_timeout=None,
+            routes=[(font_assets.FONT_FILE_PATTERN, font_assets.handle_font_route)],
+        )
+        await self._pool.start()
+
+    async def render(self, md_path: str, output_path: str) -> int:
+        from html_template import PDF_OPTIONS
+        from page_loader import load_page
+
+        loop = asyncio.get_running_loop()
+        styled_html = await loop.run_in_executor(
+            self._executor, self._batch.markdown_file_to_html, md_path, self.engine
+        )
+
+        async def render(page) -> bytes:
+            await load_page(page, styled_html, base_dir=os.path.dirname(md_path))
+            return await page.pdf(**PDF_OPTIONS)
+
+        pdf_bytes = await self._pool.run(render)
+        return await asyncio.to_thread(_write, output_path, pdf_bytes)
+
+    async def stop(self) -> None:
+        import pandoc_worker
+
+        await self._pool.stop()
+        self._executor.shutdown()
+        if self.engine == "pandoc":
+            pandoc_worker.stop()
+
+
+class MarkdownEngine(BatchEngine):
+    name = "markdown"
+    description = "playwright_sync_converter.py: python-markdown in worker processes"
+    engine = "markdown"
+
+
+class PandocEngine(BatchEngine):
+    name = "pandoc"
+    description = "pandoc_playwright_converter.py: pandoc through the batch pipeline"
+    engine = "pandoc"
+
+
+ENGINES: Dict[str, Type[Engine]] = {
+    engine.name: engine
+    for engine in (ServerEngine, ServerMarkdownEngine, SubprocessEngine, MarkdownEngine, PandocEngine)
+}
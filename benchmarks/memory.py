@@ -0,0 +1,31 @@
+import os
+import threading
+
+from process_stats import tree_rss
+
+
+class PeakRSSSampler:
+    """Samples the RSS of this process tree in a background thread and keeps the peak."""
+
+    def __init__(self, interval: float = 0.05, pid: int = None):
+        self.interval = interval
+        self.pid = pid or os.getpid()
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self) -> "PeakRSSSampler":
+        self.peak = tree_rss(self.pid)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, tree_rss(self.pid))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, tree_rss(self.pid))
@@ -0,0 +1,146 @@
+"""Checks that python-markdown and pandoc agree on the documents "auto" sends to python-markdown.
+
+Usage (from the repository root; needs pandoc)::
+
+    python -m benchmarks.parity
+    python -m benchmarks.parity --scale 0.05 --show-diff
+
+Both engines convert every case and the synthetic corpus documents that
+markdown_engines.choose_engine routes to python-markdown. Their HTML is
+compared after canonicalisation: entities decoded, whitespace collapsed,
+attributes sorted and class attributes dropped, since the stylesheet does
+not use them. Anything an engine adds around the body, such as a <head>
+or <style>, is compared too, since it would change the page's layout. Cases that "auto" would send to pandoc are reported as
+skipped; a case the scanner should catch but does not shows up as a
+mismatch.
+"""
+import re
+import sys
+import difflib
+import argparse
+import tempfile
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Sequence
+
+from benchmarks import corpus
+
+# The basic syntax "auto" hands to python-markdown, one construct per case
+CASES: Dict[str, str] = {
+    "headings": "# Title\n\n## Second level\n\n### Third: with punctuation!\n\nSetext\n------\n",
+    "emphasis": "Some *emphasis*, **strong**, ***both*** and `inline code`.\n",
+    "links": 'A [link](https://example.com "Title"), a [reference][ref] and <https://example.com>.\n\n'
+             "[ref]: https://example.com/ref\n",
+    "lists": "- one\n- two\n- three\n\n1. first\n2. second\n\n* loose\n\n* list\n",
+    "blockquote": "> Quoted text\n> over two lines.\n\n> Another quote.\n",
+    "code": "Indented:\n\n    def f():\n        return 1\n\nFenced:\n\n```\nplain = True\n```\n",
+    "table": "| Left | Centre | Right |\n|:-----|:------:|------:|\n| a | b | c |\n| 1 | 2 | 3 |\n",
+    "rules_and_breaks": "Line one  \nline two\n\n---\n\n***\n",
+    "smart_punctuation": 'It\'s "quoted" -- and --- dashed... right?\n',
+    "inline_html": "Press <kbd>Ctrl</kbd> and <em>go</em>.\n",
+    "images": "Inline ![icon](icon.png) image.\n",
+    "escapes": "Not \\*emphasis\\*, 5 < 6 & 7 > 3.\n",
+    "cjk": "# 中文标题\n\n这是一个段落，包含**强调**和`代码`。\n",
+    "emoji": "# Emoji 🎉\n\nRockets 🚀 and fire 🔥.\n",
+}
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# Elements whose surrounding whitespace the browser ignores
+_BLOCK_TAGS = {
+    "p", "div", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li", "blockquote", "pre", "table",
+    "thead", "tbody", "tr", "th", "td", "hr", "br", "html", "head", "body", "style", "title", "meta", "link",
+}
+
+
+class _Canonicaliser(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.tokens: List[str] = []
+        self.in_pre = 0
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("colgroup", "col") or self.skipping:
+            self.skipping += tag == "colgroup"
+            return
+        if tag == "pre":
+            self.in_pre += 1
+        kept = sorted((name, value or "") for name, value in attrs if name != "class")
+        self.tokens.append("<" + tag + "".join(f' {name}="{value}"' for name, value in kept) + ">")
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        if tag == "colgroup":
+            self.skipping -= 1
+            return
+        if tag == "col" or self.skipping:
+            return
+        if tag == "pre":
+            self.in_pre -= 1
+        self.tokens.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if self.skipping:
+            return
+        self.tokens.append(data if self.in_pre else _WHITESPACE_RE.sub(" ", data))
+
+
+def canonical(document: str) -> List[str]:
+    """An HTML document as one line per block element, ready to diff."""
+    parser = _Canonicaliser()
+    parser.feed(document)
+    parser.close()
+    tags = "|".join(_BLOCK_TAGS)
+    text = "".join(parser.tokens)
+    text = re.sub(r"(<(?:%s)[ >])" % tags, r"\n\1", text)
+    text = re.sub(r"(</(?:%s)>)" % tags, r"\1\n", text)
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def compare(name: str, md_content: str, show_diff: bool) -> Optional[bool]:
+    """Converts one document with both engines; None when "auto" would not use python-markdown."""
+    from markdown_engines import MARKDOWN, PANDOC, choose_engine, markdown_to_html
+
+    engine, reason = choose_engine(md_content)
+    if engine != MARKDOWN:
+        print(f"{name:<20} skipped (auto uses pandoc: {reason})")
+        return None
+    expected = canonical(markdown_to_html(md_content, PANDOC))
+    actual = canonical(markdown_to_html(md_content, MARKDOWN))
+    if expected == actual:
+        print(f"{name:<20} ok")
+        return True
+    print(f"{name:<20} MISMATCH")
+    if show_diff:
+        for line in difflib.unified_diff(expected, actual, "pandoc", "python-markdown", lineterm="", n=1):
+            print("    " + line)
+    return False
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the python-markdown and pandoc engines")
+    parser.add_argument("--scale", type=float, default=0.02, help="corpus size multiplier")
+    parser.add_argument("--seed", type=int, default=0, help="corpus random seed")
+    parser.add_argument("--show-diff", action="store_true", help="print a diff for every mismatch")
+    args = parser.parse_args(argv)
+
+    import pandoc_worker
+
+    pandoc_worker.start()
+    try:
+        results = [compare(name, md_content, args.show_diff) for name, md_content in CASES.items()]
+        with tempfile.TemporaryDirectory() as corpus_dir:
+            for name, path in corpus.generate(corpus_dir, scale=args.scale, seed=args.seed).items():
+                with open(path, encoding="utf-8") as f:
+                    results.append(compare("corpus/" + name, f.read(), args.show_diff))
+    finally:
+        pandoc_worker.stop()
+
+    mismatches = results.count(False)
+    print(f"{results.count(True)} matching, {mismatches} mismatched, {results.count(None)} skipped")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
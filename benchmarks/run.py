@@ -0,0 +1,224 @@
+"""Runs every converter engine over the synthetic corpus and records the results.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run -o new.json --compare results.json --fail-on-regression
+
+Each (engine, document) pair starts the engine from scratch, so ``cold_ms``
+includes browser and worker start-up; ``warm_ms`` is the median of the
+following renders and ``docs_per_s`` comes from a burst of concurrent
+renders. Runs are offline: uncached fonts fail fast instead of being
+downloaded and the corpus embeds its images.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+# Must be set before the converter modules read their configuration
+os.environ.setdefault("FONT_OFFLINE", "1")
+os.environ.setdefault("RENDER_CACHE_MAX_BYTES", "0")
+os.environ.pop("RENDER_CACHE_DIR", None)
+
+from benchmarks import corpus
+from benchmarks.engines import ENGINES, REPO_ROOT, Engine
+from benchmarks.memory import PeakRSSSampler
+
+RESULTS_VERSION = 1
+# Metrics compared between runs, and whether a higher value is better
+COMPARED_METRICS = {
+    "cold_ms": False,
+    "warm_ms": False,
+    "docs_per_s": True,
+    "peak_rss_mb": False,
+    "output_bytes": False,
+}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _package_version(name: str) -> Optional[str]:
+    from importlib import metadata
+
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_revision": _git_revision(),
+        "packages": {name: _package_version(name) for name in ("playwright", "pypandoc", "markdown")},
+    }
+
+
+async def bench_document(engine: Engine, name: str, md_path: str, output_dir: str, repeat: int) -> dict:
+    result = {
+        "engine": engine.name,
+        "document": name,
+        "bytes_in": os.path.getsize(md_path),
+    }
+    output_path = os.path.join(output_dir, f"{engine.name}-{name}.pdf")
+    with PeakRSSSampler() as sampler:
+        started = time.perf_counter()
+        await engine.start()
+        try:
+            result["output_bytes"] = await engine.render(md_path, output_path)
+            result["cold_ms"] = (time.perf_counter() - started) * 1000
+
+            warm = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                await engine.render(md_path, output_path)
+                warm.append((time.perf_counter() - started) * 1000)
+            if warm:
+                result["warm_ms"] = statistics.median(warm)
+                result["warm_min_ms"] = min(warm)
+                result["warm_max_ms"] = max(warm)
+
+            burst = [
+                os.path.join(output_dir, f"{engine.name}-{name}-{index}.pdf")
+                for index in range(engine.concurrency)
+            ]
+            started = time.perf_counter()
+            await asyncio.gather(*(engine.render(md_path, path) for path in burst))
+            elapsed = time.perf_counter() - started
+            result["docs_per_s"] = len(burst) / elapsed
+            result["kb_in_per_s"] = len(burst) * result["bytes_in"] / 1024 / elapsed
+        finally:
+            await engine.stop()
+    result["peak_rss_mb"] = sampler.peak / (1024 * 1024)
+    return result
+
+
+async def run(
+    engine_names: Sequence[str],
+    documents: dict,
+    output_dir: str,
+    repeat: int,
+    concurrency: int,
+) -> List[dict]:
+    results = []
+    for engine_name in engine_names:
+        for name, md_path in documents.items():
+            engine = ENGINES[engine_name](concurrency=concurrency)
+            print(f"{engine_name:<15} {name:<8} ...", end=" ", flush=True)
+            try:
+                result = await bench_document(engine, name, md_path, output_dir, repeat)
+            except Exception as e:
+                result = {"engine": engine_name, "document": name, "error": str(e)}
+                print(f"failed: {e}")
+            else:
+                print(
+                    f"cold {result['cold_ms']:.0f} ms, warm {result.get('warm_ms', 0):.0f} ms, "
+                    f"{result['docs_per_s']:.2f} docs/s, peak {result['peak_rss_mb']:.0f} MB, "
+                    f"{result['output_bytes'] / 1024:.0f} KB"
+                )
+            results.append(result)
+    return results
+
+
+def compare(current: dict, previous: dict, threshold: float) -> List[str]:
+    """Prints metric changes against a previous results file and returns the regressions."""
+    if previous.get("settings", {}).get("corpus") != current["settings"]["corpus"]:
+        print("Warning: the previous run used a different corpus; the comparison is not like for like.")
+    before = {(r["engine"], r["document"]): r for r in previous.get("results", [])}
+    regressions = []
+    for result in current["results"]:
+        old = before.get((result["engine"], result["document"]))
+        if old is None or "error" in result or "error" in old:
+            continue
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if not old.get(metric) or metric not in result:
+                continue
+            change = (result[metric] - old[metric]) / old[metric]
+            worse = -change if higher_is_better else change
+            line = (
+                f"{result['engine']:<15} {result['document']:<8} {metric:<12} "
+                f"{old[metric]:>12.1f} -> {result[metric]:>12.1f} ({change:+.1%})"
+            )
+            if worse > threshold:
+                line += "  REGRESSION"
+                regressions.append(line)
+            print(line)
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the Markdown to PDF converter engines")
+    parser.add_argument("-e", "--engine", action="append", dest="engines", choices=list(ENGINES),
+                        help="engine to run, may be repeated (default: all)")
+    parser.add_argument("-d", "--document", action="append", dest="documents", choices=list(corpus.DOCUMENTS),
+                        help="corpus document to run, may be repeated (default: all)")
+    parser.add_argument("--scale", type=float, default=1.0,
+                        help="corpus size multiplier; 1.0 makes the manual about 500 pages")
+    parser.add_argument("--seed", type=int, default=0, help="corpus random seed")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="warm renders per document")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="renders in the throughput burst")
+    parser.add_argument("--corpus-dir", help="where to write the corpus (default: a temporary directory)")
+    parser.add_argument("-o", "--output", default="benchmark-results.json", help="results JSON file")
+    parser.add_argument("--compare", help="previous results JSON file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative change counted as a regression (default: 0.1)")
+    parser.add_argument("--fail-on-regression", action="store_true",
+                        help="exit with status 1 when a regression is found")
+    args = parser.parse_args(argv)
+
+    engine_names = args.engines or list(ENGINES)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_dir = args.corpus_dir or os.path.join(temp_dir, "corpus")
+        documents = corpus.generate(corpus_dir, args.documents, scale=args.scale, seed=args.seed)
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir)
+        started = datetime.now(timezone.utc)
+        results = asyncio.run(run(engine_names, documents, output_dir, args.repeat, args.concurrency))
+
+    report = {
+        "version": RESULTS_VERSION,
+        "started_at": started.isoformat(),
+        "environment": environment(),
+        "settings": {
+            "corpus": {"documents": list(documents), "scale": args.scale, "seed": args.seed},
+            "engines": {name: ENGINES[name].description for name in engine_names},
+            "repeat": args.repeat,
+            "concurrency": args.concurrency,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)
+        regressions = compare(report, previous, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) above {args.threshold:.0%}")
+            if args.fail_on_regression:
+                return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
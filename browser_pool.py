@@ -0,0 +1,409 @@
+import os
+import sys
+import uuid
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from typing import (
+    TYPE_CHECKING, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple, TypeVar,
+)
+
+from metrics import BROWSER_RECYCLES
+from process_stats import find_pid, tree_rss
+
+if TYPE_CHECKING:
+    # Playwright itself is imported by start(), so processes that never render PDFs skip it
+    from playwright.async_api import Browser, Page, Playwright
+
+# Pool sizing, overridable from the environment
+DEFAULT_POOL_SIZE = int(os.environ.get("BROWSER_POOL_SIZE", "2"))
+DEFAULT_PAGES_PER_BROWSER = int(os.environ.get("BROWSER_POOL_PAGES_PER_BROWSER", "4"))
+DEFAULT_MAX_WAITERS = int(os.environ.get("BROWSER_POOL_MAX_WAITERS", "32"))
+DEFAULT_ACQUIRE_TIMEOUT = float(os.environ.get("BROWSER_POOL_ACQUIRE_TIMEOUT", "30"))
+
+# Browser lifecycle; 0 disables a limit
+DEFAULT_MAX_RENDERS = int(os.environ.get("BROWSER_MAX_RENDERS", "500"))
+DEFAULT_MAX_RSS_MB = float(os.environ.get("BROWSER_MAX_RSS_MB", "1536"))
+DEFAULT_RENDER_TIMEOUT = float(os.environ.get("BROWSER_RENDER_TIMEOUT", "120"))
+DEFAULT_PROBE_INTERVAL = float(os.environ.get("BROWSER_PROBE_INTERVAL", "30"))
+DEFAULT_RETRIES = int(os.environ.get("BROWSER_RENDER_RETRIES", "1"))
+PROBE_TIMEOUT = 10.0
+
+T = TypeVar("T")
+
+
+class PoolBusyError(Exception):
+    """Raised when the pool's wait queue is full or a slot cannot be acquired in time."""
+
+
+class BrowserUnavailableError(Exception):
+    """Raised when the pool could not launch any browser, so no slot will ever come free."""
+
+
+class BrowserCrashedError(Exception):
+    """Raised when the browser or page died mid-render; the render can be retried."""
+
+
+class RenderTimeoutError(Exception):
+    """Raised when a render holds its page for longer than the pool's render timeout."""
+
+
+class _PooledBrowser:
+    """A launched browser and its lifecycle state."""
+
+    def __init__(self, browser: "Browser", marker: str):
+        self.browser = browser
+        self.marker = marker
+        self.pid: Optional[int] = None
+        self.renders = 0
+        self.active = 0
+        self.retiring = False
+        self.idle = asyncio.Event()
+
+    @property
+    def alive(self) -> bool:
+        return not self.retiring and self.browser.is_connected()
+
+    def rss_mb(self) -> Optional[float]:
+        if self.pid is None:
+            self.pid = find_pid(self.marker)
+            if self.pid is None:
+                return None
+        return tree_rss(self.pid) / (1024 * 1024)
+
+
+class _RenderClock:
+    """Counts down a page's render timeout; the countdown can be paused and resumed."""
+
+    def __init__(self, seconds: float, expire: Callable[[asyncio.Task], None], task: asyncio.Task):
+        self.remaining = seconds
+        self._expire = expire
+        self._task = task
+        self._loop = asyncio.get_running_loop()
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._started = 0.0
+        self.start()
+
+    def start(self) -> None:
+        if self._handle is None:
+            self._started = self._loop.time()
+            self._handle = self._loop.call_later(max(self.remaining, 0.0), self._expire, self._task)
+
+    def stop(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+            self.remaining -= self._loop.time() - self._started
+
+
+class BrowserPool:
+    """A set of long-lived Chromium instances handing out isolated pages.
+
+    Each browser offers ``pages_per_browser`` slots. A caller takes a slot,
+    gets a fresh browser context (so cookies, storage and routes never leak
+    between renders) and hands the slot back when the context is closed.
+    At most ``max_waiters`` callers may queue for a slot; beyond that the
+    pool fails fast with :class:`PoolBusyError`; an ``acquire_timeout`` of
+    None waits indefinitely. ``routes`` are
+    ``(url pattern, handler)`` pairs installed on every context, e.g. to
+    serve fonts from a local cache.
+
+    Browsers are replaced with a fresh launch once they have served
+    ``max_renders`` pages, grown past ``max_rss_mb`` of resident memory,
+    failed a liveness probe (run every ``probe_interval`` seconds on idle
+    browsers), crashed, or held a page past ``render_timeout``. A
+    retiring browser finishes its in-flight renders before it is closed.
+    """
+
+    def __init__(
+        self,
+        size: int = DEFAULT_POOL_SIZE,
+        pages_per_browser: int = DEFAULT_PAGES_PER_BROWSER,
+        max_waiters: int = DEFAULT_MAX_WAITERS,
+        acquire_timeout: Optional[float] = DEFAULT_ACQUIRE_TIMEOUT,
+        routes: Sequence[Tuple[str, Callable]] = (),
+        max_renders: int = DEFAULT_MAX_RENDERS,
+        max_rss_mb: float = DEFAULT_MAX_RSS_MB,
+        render_timeout: Optional[float] = DEFAULT_RENDER_TIMEOUT or None,
+        probe_interval: float = DEFAULT_PROBE_INTERVAL,
+        retries: int = DEFAULT_RETRIES,
+    ):
+        if size < 1 or pages_per_browser < 1:
+            raise ValueError("Pool size and pages per browser must be at least 1")
+        self.size = size
+        self.pages_per_browser = pages_per_browser
+        self.max_waiters = max_waiters
+        self.acquire_timeout = acquire_timeout
+        self.routes = list(routes)
+        self.max_renders = max_renders
+        self.max_rss_mb = max_rss_mb
+        self.render_timeout = render_timeout
+        self.probe_interval = probe_interval
+        self.retries = retries
+
+        self._playwright: Optional["Playwright"] = None
+        self._browsers: List[_PooledBrowser] = []
+        # Holds None once start() failed without launching any browser
+        self._slots: "asyncio.Queue[Optional[_PooledBrowser]]" = asyncio.Queue()
+        self._waiters = 0
+        self._tasks: Set[asyncio.Task] = set()
+        self._clocks: Dict["Page", _RenderClock] = {}
+        self._stopping = False
+        self.start_error: Optional[Exception] = None
+
+    @property
+    def capacity(self) -> int:
+        return self.size * self.pages_per_browser
+
+    @property
+    def waiting(self) -> int:
+        return self._waiters
+
+    @property
+    def available(self) -> int:
+        if self.start_error is not None and not self._browsers:
+            return 0
+        return self._slots.qsize()
+
+    async def start(self) -> None:
+        """Starts the Playwright driver and launches every browser in the pool.
+
+        A failure is kept in ``start_error``. If no browser came up, callers
+        then fail fast with :class:`BrowserUnavailableError` instead of
+        waiting ``acquire_timeout`` for a slot.
+        """
+        self._stopping = False
+        self.start_error = None
+        try:
+            from playwright.async_api import async_playwright
+
+            self._playwright = await async_playwright().start()
+            for _ in range(self.size):
+                await self._launch()
+        except Exception as e:
+            self.start_error = e
+            if not self._browsers:
+                # Wakes the callers already waiting; it stays queued for the ones after them
+                self._slots.put_nowait(None)
+            raise
+        finally:
+            # The monitor also tops up a pool that only partly started
+            if self._browsers and self.probe_interval:
+                self._spawn(self._monitor())
+
+    async def stop(self) -> None:
+        """Closes all browsers and stops the Playwright driver."""
+        self._stopping = True
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for entry in self._browsers:
+            try:
+                await entry.browser.close()
+            except Exception:
+                pass
+        self._browsers.clear()
+        self._slots = asyncio.Queue()
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def _spawn(self, coroutine) -> None:
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _launch(self) -> None:
+        # The marker lets the monitor find this browser's process tree to measure its memory
+        marker = f"--md-convert-browser={uuid.uuid4().hex}"
+        browser = await self._playwright.chromium.launch(args=[marker])
+        entry = _PooledBrowser(browser, marker)
+        browser.on("disconnected", lambda _: self._retire(entry, "disconnected"))
+        self._browsers.append(entry)
+        for _ in range(self.pages_per_browser):
+            self._slots.put_nowait(entry)
+
+    def _retire(self, entry: _PooledBrowser, reason: str) -> None:
+        """Stops handing out ``entry`` and starts a replacement browser."""
+        if entry.retiring or self._stopping:
+            return
+        entry.retiring = True
+        BROWSER_RECYCLES.inc(reason=reason)
+        print(f"Replacing browser after {entry.renders} renders: {reason}", file=sys.stderr)
+        if entry.active == 0:
+            entry.idle.set()
+        self._spawn(self._replace(entry))
+
+    async def _replace(self, entry: _PooledBrowser) -> None:
+        try:
+            await self._launch()
+        except Exception as e:
+            # The monitor tops the pool back up on its next pass
+            print(f"Could not launch a replacement browser: {e}", file=sys.stderr)
+        if entry.browser.is_connected():
+            await entry.idle.wait()
+        self._browsers.remove(entry)
+        try:
+            await asyncio.wait_for(entry.browser.close(), PROBE_TIMEOUT)
+        except Exception:
+            pass
+
+    async def _probe(self, entry: _PooledBrowser) -> bool:
+        try:
+            context = await asyncio.wait_for(entry.browser.new_context(), PROBE_TIMEOUT)
+            await asyncio.wait_for(context.close(), PROBE_TIMEOUT)
+            return True
+        except Exception:
+            return False
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(self.probe_interval)
+            for entry in list(self._browsers):
+                if not entry.alive:
+                    continue
+                if self.max_rss_mb:
+                    rss_mb = await asyncio.to_thread(entry.rss_mb)
+                    if rss_mb is not None and rss_mb > self.max_rss_mb:
+                        self._retire(entry, "memory limit")
+                        continue
+                if entry.active == 0 and not await self._probe(entry):
+                    self._retire(entry, "liveness probe failed")
+
+            missing = self.size - sum(1 for entry in self._browsers if not entry.retiring)
+            for _ in range(missing):
+                try:
+                    await self._launch()
+                except Exception as e:
+                    print(f"Could not launch a replacement browser: {e}", file=sys.stderr)
+                    break
+
+    async def _acquire(self) -> _PooledBrowser:
+        # Callers arriving while the pool is still starting wait for its first slots
+        if self._stopping:
+            raise RuntimeError("Browser pool is stopped")
+        if self._slots.empty() and self._waiters >= self.max_waiters:
+            raise PoolBusyError("Browser pool wait queue is full")
+
+        loop = asyncio.get_running_loop()
+        deadline = None if self.acquire_timeout is None else loop.time() + self.acquire_timeout
+        self._waiters += 1
+        try:
+            while True:
+                timeout = None if deadline is None else max(deadline - loop.time(), 0)
+                entry = await asyncio.wait_for(self._slots.get(), timeout)
+                if entry is None:
+                    self._slots.put_nowait(None)
+                    raise BrowserUnavailableError(f"The browser pool could not start: {self.start_error}")
+                # Slots of retired browsers are dropped as they come up
+                if entry.alive:
+                    return entry
+        except asyncio.TimeoutError:
+            raise PoolBusyError(
+                f"No browser slot became free within {self.acquire_timeout:.0f}s"
+            )
+        finally:
+            self._waiters -= 1
+
+    def _release(self, entry: _PooledBrowser) -> None:
+        entry.active -= 1
+        entry.renders += 1
+        if self.max_renders and entry.renders >= self.max_renders:
+            self._retire(entry, "render limit")
+        if entry.retiring:
+            if entry.active == 0:
+                entry.idle.set()
+        else:
+            self._slots.put_nowait(entry)
+
+    @asynccontextmanager
+    async def page(self) -> AsyncIterator["Page"]:
+        """Yields a page in a fresh context; the context is closed on exit.
+
+        Raises :class:`BrowserCrashedError` if the browser or page dies while
+        in use and :class:`RenderTimeoutError` once the page has been held
+        for ``render_timeout`` seconds; either way the browser is replaced.
+        """
+        entry = await self._acquire()
+        entry.active += 1
+        crashed = False
+        expired = False
+        clock = None
+
+        def on_crash(_) -> None:
+            nonlocal crashed
+            crashed = True
+
+        def expire(task: asyncio.Task) -> None:
+            nonlocal expired
+            expired = True
+            task.cancel()
+
+        try:
+            context = await entry.browser.new_context()
+            try:
+                for pattern, handler in self.routes:
+                    await context.route(pattern, handler)
+                page = await context.new_page()
+                page.on("crash", on_crash)
+                if self.render_timeout:
+                    clock = _RenderClock(self.render_timeout, expire, asyncio.current_task())
+                    self._clocks[page] = clock
+                yield page
+            finally:
+                if clock is not None:
+                    clock.stop()
+                    del self._clocks[page]
+                try:
+                    # A hung browser may never answer, so do not wait on it indefinitely
+                    await asyncio.wait_for(context.close(), PROBE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    # Runaway work cut short by a deadline can leave the renderer unable to close
+                    self._retire(entry, "close timeout")
+                except Exception:
+                    pass
+        except asyncio.CancelledError:
+            if not expired:
+                raise
+            task = asyncio.current_task()
+            if hasattr(task, "uncancel"):
+                task.uncancel()
+            self._retire(entry, "render timeout")
+            raise RenderTimeoutError(f"Render did not finish within {self.render_timeout:g}s") from None
+        except Exception as e:
+            if crashed or not entry.browser.is_connected():
+                self._retire(entry, "crash")
+                raise BrowserCrashedError(f"Browser crashed during render: {e}") from e
+            raise
+        finally:
+            self._release(entry)
+
+    @contextmanager
+    def paused(self, page: "Page") -> Iterator[None]:
+        """Stops ``page``'s render timeout from running down while the block waits on something else.
+
+        A render that streams its output holds the page while the client
+        reads; time spent waiting on a slow reader is not the browser's.
+        """
+        clock = self._clocks.get(page)
+        if clock is None:
+            yield
+            return
+        clock.stop()
+        try:
+            yield
+        finally:
+            clock.start()
+
+    async def run(self, render: Callable[["Page"], Awaitable[T]]) -> T:
+        """Runs ``render(page)`` on a pooled page.
+
+        If the browser crashes the render is retried, up to ``retries``
+        times, on a page from another browser.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                async with self.page() as page:
+                    return await render(page)
+            except BrowserCrashedError:
+                if attempt == self.retries:
+                    raise
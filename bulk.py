@@ -0,0 +1,110 @@
+import os
+import json
+import time
+import tarfile
+import zipfile
+import posixpath
+from typing import BinaryIO, List, Tuple
+
+BULK_MAX_FILES = int(os.environ.get("BULK_MAX_FILES", "1000"))
+BULK_MAX_ENTRY_BYTES = int(os.environ.get("BULK_MAX_ENTRY_BYTES", str(10 * 1024 * 1024)))
+# Request body limit for bulk uploads, in place of MAX_UPLOAD_BYTES
+BULK_MAX_UPLOAD_BYTES = int(os.environ.get("BULK_MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+MARKDOWN_SUFFIXES = (".md", ".markdown")
+
+
+class ArchiveError(Exception):
+    """Raised for archives that cannot be read or exceed the bulk limits."""
+
+
+def safe_name(name: str) -> str:
+    """Normalizes an archive member name so it cannot escape the output archive root."""
+    name = posixpath.normpath(name.replace("\\", "/")).lstrip("/")
+    parts = [part for part in name.split("/") if part not in ("", ".", "..")]
+    return "/".join(parts)
+
+
+def output_name(name: str, output_format: str) -> str:
+    return posixpath.splitext(name)[0] + "." + output_format
+
+
+def _check_entry(name: str, size: int, count: int) -> None:
+    if count >= BULK_MAX_FILES:
+        raise ArchiveError(f"Archive contains more than {BULK_MAX_FILES} Markdown files")
+    if size > BULK_MAX_ENTRY_BYTES:
+        raise ArchiveError(f"{name} is larger than {BULK_MAX_ENTRY_BYTES} bytes")
+
+
+def read_archive(fileobj: BinaryIO) -> List[Tuple[str, bytes]]:
+    """Returns the (name, contents) of every Markdown file in a zip or tar archive."""
+    entries: List[Tuple[str, bytes]] = []
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not info.filename.lower().endswith(MARKDOWN_SUFFIXES):
+                    continue
+                _check_entry(info.filename, info.file_size, len(entries))
+                with archive.open(info) as member:
+                    # file_size comes from the archive itself, so cap what is actually read
+                    data = member.read(BULK_MAX_ENTRY_BYTES + 1)
+                _check_entry(info.filename, len(data), len(entries))
+                entries.append((safe_name(info.filename), data))
+        return entries
+
+    fileobj.seek(0)
+    try:
+        with tarfile.open(fileobj=fileobj, mode="r:*") as archive:
+            for member in archive:
+                if not member.isfile() or not member.name.lower().endswith(MARKDOWN_SUFFIXES):
+                    continue
+                _check_entry(member.name, member.size, len(entries))
+                entries.append((safe_name(member.name), archive.extractfile(member).read()))
+    except tarfile.TarError as e:
+        raise ArchiveError(f"Unsupported or corrupt archive: {e}")
+    return entries
+
+
+class _ChunkBuffer:
+    """A write-only, unseekable sink; zipfile then writes data descriptors."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class StreamingZipWriter:
+    """Builds a zip archive incrementally, handing back the bytes written so far.
+
+    Each :meth:`add` returns the archive bytes for that member, so a
+    response can send finished files while others are still converting;
+    only one member is ever buffered.
+    """
+
+    def __init__(self):
+        self._buffer = _ChunkBuffer()
+        self._zip = zipfile.ZipFile(self._buffer, mode="w")
+
+    def add(self, name: str, data: bytes, compress: bool = True) -> bytes:
+        info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+        self._zip.writestr(info, data)
+        return self._buffer.drain()
+
+    def add_json(self, name: str, value) -> bytes:
+        return self.add(name, json.dumps(value, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    def close(self) -> bytes:
+        self._zip.close()
+        return self._buffer.drain()
@@ -0,0 +1,135 @@
+import os
+import re
+import base64
+import hashlib
+import zipfile
+import mimetypes
+import posixpath
+from typing import BinaryIO, Dict, Optional, Tuple
+from urllib.parse import unquote
+
+from bulk import MARKDOWN_SUFFIXES
+from image_assets import optimize_image
+from ingest import MAX_UPLOAD_BYTES, UploadTooLarge
+
+# Request body limit for /convert, which also takes Markdown bundled with its assets in a zip
+BUNDLE_MAX_UPLOAD_BYTES = int(os.environ.get("BUNDLE_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+BUNDLE_MAX_FILES = int(os.environ.get("BUNDLE_MAX_FILES", "500"))
+# Limit on the unpacked size of all files together
+BUNDLE_MAX_UNPACKED_BYTES = int(os.environ.get("BUNDLE_MAX_UNPACKED_BYTES", str(500 * 1024 * 1024)))
+MAIN_DOCUMENT_NAMES = ("index.md", "readme.md")
+
+_SRC_RE = re.compile(r'(<img\b[^>]*?\bsrc=")([^"]+)(")', re.IGNORECASE)
+
+
+class BundleError(Exception):
+    """Raised for bundles that cannot be read, have no main document or exceed the limits."""
+
+
+def is_bundle(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(".zip")
+
+
+class AssetBundle:
+    """The files uploaded alongside a Markdown document, looked up by their path in the zip.
+
+    ``root`` is the directory of the document, which relative references
+    resolve against. Images are downscaled for print on their way out.
+    """
+
+    def __init__(self, files: Dict[str, bytes], root: str = ""):
+        self.files = files
+        self.root = root
+        digest = hashlib.sha256()
+        for name in sorted(files):
+            digest.update(name.encode("utf-8") + b"\0" + hashlib.sha256(files[name]).digest())
+        self.digest = digest.hexdigest()
+
+    def resolve(self, reference: str) -> str:
+        """The path in the zip of a reference relative to the document."""
+        return posixpath.normpath(posixpath.join(self.root, unquote(reference.split("#")[0].split("?")[0])))
+
+    def get(self, path: str) -> Optional[Tuple[bytes, str]]:
+        """The body and content type of the file at ``path``, or None if there is none."""
+        data = self.files.get(path.lstrip("/"))
+        if data is None:
+            return None
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        return optimize_image(data, content_type), content_type
+
+    def inline_images(self, html: str) -> str:
+        """Replaces image references into the bundle with data: URLs, for standalone HTML."""
+
+        def replace(match: "re.Match") -> str:
+            reference = match.group(2)
+            if "://" in reference or reference.startswith(("data:", "/")):
+                return match.group(0)
+            found = self.get(self.resolve(reference))
+            if found is None:
+                return match.group(0)
+            body, content_type = found
+            encoded = base64.b64encode(body).decode("ascii")
+            return f"{match.group(1)}data:{content_type};base64,{encoded}{match.group(3)}"
+
+        return _SRC_RE.sub(replace, html)
+
+
+def _main_document(names) -> str:
+    documents = [name for name in names if name.lower().endswith(MARKDOWN_SUFFIXES)]
+    if not documents:
+        raise BundleError("The zip contains no Markdown file")
+    shallowest = min(name.count("/") for name in documents)
+    candidates = [name for name in documents if name.count("/") == shallowest]
+    if len(candidates) > 1:
+        named = [name for name in candidates if posixpath.basename(name).lower() in MAIN_DOCUMENT_NAMES]
+        if len(named) != 1:
+            raise BundleError(
+                "The zip contains several Markdown files; name the main one index.md or README.md"
+            )
+        candidates = named
+    return candidates[0]
+
+
+def read_bundle(fileobj: BinaryIO) -> Tuple[str, AssetBundle, int]:
+    """Unpacks a zip of Markdown and its assets.
+
+    The main document is the shallowest Markdown file, or index.md or
+    README.md when there are several. Returns its text, the bundle of the
+    other files and the size of the zip; a zip over BUNDLE_MAX_UPLOAD_BYTES
+    raises UploadTooLarge.
+    """
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    if size > BUNDLE_MAX_UPLOAD_BYTES:
+        raise UploadTooLarge(BUNDLE_MAX_UPLOAD_BYTES)
+    if not zipfile.is_zipfile(fileobj):
+        raise BundleError("Upload is not a zip file")
+    fileobj.seek(0)
+
+    files: Dict[str, bytes] = {}
+    unpacked = 0
+    try:
+        with zipfile.ZipFile(fileobj) as archive:
+            members = [info for info in archive.infolist() if not info.is_dir()]
+            if len(members) > BUNDLE_MAX_FILES:
+                raise BundleError(f"The zip holds more than {BUNDLE_MAX_FILES} files")
+            for info in members:
+                name = posixpath.normpath(info.filename.replace("\\", "/")).lstrip("/")
+                if name.startswith("../") or name.startswith("__MACOSX/"):
+                    continue
+                with archive.open(info) as member:
+                    # file_size comes from the archive itself, so cap what is actually read
+                    data = member.read(BUNDLE_MAX_UNPACKED_BYTES - unpacked + 1)
+                unpacked += len(data)
+                if unpacked > BUNDLE_MAX_UNPACKED_BYTES:
+                    raise BundleError(f"The zip unpacks to more than {BUNDLE_MAX_UNPACKED_BYTES} bytes")
+                files[name] = data
+    except (zipfile.BadZipFile, zipfile.LargeZipFile, NotImplementedError) as e:
+        raise BundleError(f"Unsupported or corrupt zip: {e}")
+
+    document = _main_document(files)
+    source = files.pop(document)
+    if len(source) > MAX_UPLOAD_BYTES:
+        raise BundleError(f"{document} exceeds the {MAX_UPLOAD_BYTES} byte limit")
+    return source.decode("utf-8"), AssetBundle(files, posixpath.dirname(document)), size
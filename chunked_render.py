@@ -0,0 +1,243 @@
+import io
+import os
+import re
+import sys
+import html
+import asyncio
+from html.parser import HTMLParser
+from typing import List, Optional, Tuple
+
+import font_assets
+from browser_pool import BrowserPool
+from html_template import PDF_OPTIONS, render_styled_html
+from metrics import stage_timer
+from page_loader import load_page
+from pdf_stream import stream_pdf
+
+# Markdown documents with at least this many characters are rendered section by section
+CHUNKED_RENDER_THRESHOLD = int(os.environ.get("CHUNKED_RENDER_THRESHOLD", str(512 * 1024)))
+# Sections rendered at once; 0 means as many as the browser pool has pages
+CHUNKED_RENDER_PARALLELISM = int(os.environ.get("CHUNKED_RENDER_PARALLELISM", "0"))
+
+TOC_TITLE = "Contents"
+# Renders of the table of contents allowed for its page count to stop changing
+TOC_PASSES = 3
+FOOTER_TEMPLATE = (
+    '<div style="width: 100%; font-size: 9px; color: #666; text-align: center;">'
+    '<span class="pageNumber"></span> / <span class="totalPages"></span></div>'
+)
+TOC_STYLE = """
+    <style>
+        ol.toc { list-style: none; padding: 0; }
+        ol.toc li { display: flex; align-items: baseline; margin: 4px 0; }
+        ol.toc .leader { flex: 1; border-bottom: 1px dotted #999; margin: 0 6px; }
+    </style>
+"""
+
+_VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+# (document prefix, document suffix, [(section title, section body)])
+Sections = Tuple[str, str, List[Tuple[str, str]]]
+
+
+class _TopLevelHeadings(HTMLParser):
+    """Finds the <h1> elements that are direct children of the parsed fragment."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.depth = 0
+        self.positions: List[Tuple[int, int]] = []
+        self.titles: List[str] = []
+        self._title: Optional[List[str]] = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _VOID_ELEMENTS:
+            return
+        if tag == "h1" and self.depth == 0:
+            self.positions.append(self.getpos())
+            self._title = []
+        self.depth += 1
+
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+    def handle_endtag(self, tag):
+        if tag in _VOID_ELEMENTS:
+            return
+        self.depth = max(self.depth - 1, 0)
+        if tag == "h1" and self.depth == 0 and self._title is not None:
+            self.titles.append(" ".join("".join(self._title).split()))
+            self._title = None
+
+    def handle_data(self, data):
+        if self._title is not None:
+            self._title.append(data)
+
+
+def split_sections(document: str) -> Optional[Sections]:
+    """Splits pandoc HTML at its top-level headings.
+
+    Content before the first heading stays with the first section and the
+    footnotes pandoc appends stay with the last. Returns None when there
+    are fewer than two sections to render.
+    """
+    body_open = re.search(r"<body[^>]*>", document)
+    body_close = document.rfind("</body>")
+    if body_open and body_close > body_open.end():
+        start, end = body_open.end(), body_close
+    else:
+        start, end = 0, len(document)
+    body = document[start:end]
+
+    parser = _TopLevelHeadings()
+    parser.feed(body)
+    parser.close()
+    if len(parser.titles) < 2:
+        return None
+
+    line_starts = [0]
+    for match in re.finditer("\n", body):
+        line_starts.append(match.end())
+    offsets = [line_starts[line - 1] + column for line, column in parser.positions]
+    offsets[0] = 0
+    offsets.append(len(body))
+    sections = [
+        (title, body[offsets[index]:offsets[index + 1]])
+        for index, title in enumerate(parser.titles)
+    ]
+    return document[:start], document[end:], sections
+
+
+async def _print(page) -> bytes:
+    return b"".join([chunk async for chunk in stream_pdf(page, {**PDF_OPTIONS, "outline": True})])
+
+
+def _toc_html(titles: List[str], first_pages: List[int]) -> str:
+    entries = "\n".join(
+        f'<li><span>{html.escape(title)}</span><span class="leader"></span><span>{page}</span></li>'
+        for title, page in zip(titles, first_pages)
+    )
+    return f'{TOC_STYLE}<h1>{TOC_TITLE}</h1>\n<ol class="toc">\n{entries}\n</ol>'
+
+
+def _blank_pages_html(count: int) -> str:
+    page = '<div style="height: 1px; break-after: page;"></div>'
+    return page * (count - 1) + '<div style="height: 1px;"></div>'
+
+
+def _page_count(pdf_bytes: bytes) -> int:
+    from pypdf import PdfReader
+
+    return len(PdfReader(io.BytesIO(pdf_bytes)).pages)
+
+
+def merge_pdfs(toc_pdf: bytes, section_pdfs: List[bytes], titles: List[str], numbers_pdf: bytes) -> bytes:
+    """Joins the table of contents and section PDFs, then stamps the page numbers.
+
+    Bookmarks Chromium generated for each section are kept; sections
+    without any get a single bookmark for their heading.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    writer.append(PdfReader(io.BytesIO(toc_pdf)), import_outline=False)
+    writer.add_outline_item(TOC_TITLE, 0)
+    for title, section_pdf in zip(titles, section_pdfs):
+        reader = PdfReader(io.BytesIO(section_pdf))
+        first_page = len(writer.pages)
+        has_outline = bool(reader.outline)
+        writer.append(reader, import_outline=has_outline)
+        if not has_outline:
+            writer.add_outline_item(title, first_page)
+
+    numbers = PdfReader(io.BytesIO(numbers_pdf))
+    for page, overlay in zip(writer.pages, numbers.pages):
+        page.merge_page(overlay)
+
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+async def render_sections(
+    pool: BrowserPool,
+    sections: Sections,
+    timings: Optional[dict] = None,
+    parallelism: Optional[int] = None,
+    assets=None,
+) -> bytes:
+    """Renders each section on its own pooled page in parallel and merges the results.
+
+    Every section starts on a new page. The merged PDF opens with a table of
+    contents, numbers its pages continuously and keeps an outline; links
+    between sections do not survive the split. At most ``parallelism``
+    sections (by default CHUNKED_RENDER_PARALLELISM, else as many as the
+    pool has pages) render at once. Files referenced by the sections are
+    served from ``assets`` when given.
+    """
+    prefix, suffix, parts = sections
+    titles = [title for title, _ in parts]
+    limit = asyncio.Semaphore(parallelism or CHUNKED_RENDER_PARALLELISM or pool.capacity)
+    ready = []
+
+    async def render_part(body: str) -> bytes:
+        styled_html = render_styled_html(prefix + body + suffix, font_assets.stylesheet_for(body))
+
+        async def render(page) -> bytes:
+            ready.append(await load_page(page, styled_html, assets=assets))
+            return await _print(page)
+
+        async with limit:
+            return await pool.run(render)
+
+    async def render_html(content: str, **options) -> bytes:
+        styled_html = render_styled_html(content, font_assets.stylesheet_for(content))
+
+        async def render(page) -> bytes:
+            await load_page(page, styled_html)
+            return await page.pdf(**PDF_OPTIONS, **options)
+
+        return await pool.run(render)
+
+    with stage_timer("chunk_render", "pdf"):
+        tasks = [asyncio.create_task(render_part(body)) for _, body in parts]
+        try:
+            section_pdfs = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        if timings is not None:
+            timings["page_ready"] = max(ready)
+
+        counts = await asyncio.to_thread(lambda: [_page_count(pdf) for pdf in section_pdfs])
+        # The contents pages shift every section, so re-render until their length is stable
+        toc_pages = 1
+        for attempt in range(TOC_PASSES):
+            first_pages = [toc_pages + sum(counts[:index]) + 1 for index in range(len(counts))]
+            toc_pdf = await render_html(_toc_html(titles, first_pages))
+            rendered_pages = _page_count(toc_pdf)
+            if rendered_pages == toc_pages:
+                break
+            if attempt == TOC_PASSES - 1:
+                # The last contents were laid out for a different length, so they point at the wrong pages
+                print(
+                    f"Table of contents did not settle after {TOC_PASSES} passes; "
+                    f"its page numbers are off by {rendered_pages - toc_pages}",
+                    file=sys.stderr,
+                )
+            toc_pages = rendered_pages
+
+        numbers_pdf = await render_html(
+            _blank_pages_html(toc_pages + sum(counts)),
+            display_header_footer=True,
+            header_template="<span></span>",
+            footer_template=FOOTER_TEMPLATE,
+        )
+
+    with stage_timer("chunk_merge", "pdf"):
+        return await asyncio.to_thread(merge_pdfs, toc_pdf, section_pdfs, titles, numbers_pdf)
@@ -0,0 +1,124 @@
+import os
+import time
+import asyncio
+from contextlib import contextmanager
+from typing import Awaitable, Dict, Iterator, Optional, TypeVar
+
+# Time a /convert request may take end to end, not counting time spent waiting on the client
+CONVERT_DEADLINE = float(os.environ.get("CONVERT_DEADLINE", "120"))
+# Share of the deadline each stage may use at most; stages not listed may use whatever is left
+DEFAULT_STAGE_SHARES = os.environ.get("CONVERT_STAGE_SHARES", "pandoc=0.25,page_load=0.25,print=0.75")
+# How often a request checks whether its client has gone away
+DISCONNECT_POLL_INTERVAL = 0.5
+
+T = TypeVar("T")
+
+
+def parse_shares(spec: str) -> Dict[str, float]:
+    """Parses "stage=share,..." into a dict."""
+    shares = {}
+    for part in spec.split(","):
+        stage, _, share = part.partition("=")
+        if stage.strip() and share.strip():
+            shares[stage.strip()] = float(share)
+    return shares
+
+
+STAGE_SHARES = parse_shares(DEFAULT_STAGE_SHARES)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a stage runs out of its share of the request's deadline."""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f"Conversion exceeded its deadline in the {stage} stage ({budget:.1f}s allowed)")
+        self.stage = stage
+        self.budget = budget
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away before the response started."""
+
+
+class Deadline:
+    """A request's time budget, split across the stages of its conversion.
+
+    Each stage may use up to its share of ``total`` (summed over all the
+    times it runs) and never more than what is left of ``total``. Time the
+    response spends waiting for the client to read is handed back with
+    :meth:`exclude`. A ``total`` of 0 disables the deadline.
+    """
+
+    def __init__(self, total: float = CONVERT_DEADLINE, shares: Optional[Dict[str, float]] = None):
+        self.total = total
+        self.shares = STAGE_SHARES if shares is None else shares
+        self.started = time.monotonic()
+        self.excluded = 0.0
+        self.spent: Dict[str, float] = {}
+
+    def remaining(self) -> float:
+        return self.total - (time.monotonic() - self.started - self.excluded)
+
+    def exclude(self, seconds: float) -> None:
+        self.excluded += seconds
+
+    def budget(self, stage: str) -> Optional[float]:
+        """Seconds ``stage`` may still take, or None without a deadline."""
+        if not self.total:
+            return None
+        budget = self.remaining()
+        share = self.shares.get(stage)
+        if share is not None:
+            budget = min(budget, share * self.total - self.spent.get(stage, 0.0))
+        return max(0.0, budget)
+
+    def check(self, stage: str) -> None:
+        """Raises :class:`DeadlineExceeded` if ``stage`` has used up its budget; for work that cannot be interrupted."""
+        budget = self.budget(stage)
+        if budget is not None and budget <= 0:
+            raise DeadlineExceeded(stage, self.shares.get(stage, 1.0) * self.total)
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[Optional[float]]:
+        """Charges a block to ``stage``, yielding its budget for work that enforces a timeout itself."""
+        self.check(stage)
+        started = time.monotonic()
+        try:
+            yield self.budget(stage)
+        finally:
+            self.spent[stage] = self.spent.get(stage, 0.0) + time.monotonic() - started
+
+    async def run(self, stage: str, awaitable: Awaitable[T]) -> T:
+        """Awaits ``awaitable``, cancelling it once ``stage`` runs out of time."""
+        budget = self.budget(stage)
+        started = time.monotonic()
+        try:
+            return await asyncio.wait_for(awaitable, budget)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(stage, budget) from None
+        finally:
+            self.spent[stage] = self.spent.get(stage, 0.0) + time.monotonic() - started
+
+
+async def _wait_for_disconnect(request) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+
+
+async def unless_disconnected(request, awaitable: Awaitable[T]) -> T:
+    """Awaits ``awaitable``, cancelling it and raising :class:`ClientDisconnected` if the client goes away first."""
+    work = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_disconnect(request))
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    except asyncio.CancelledError:
+        work.cancel()
+        raise
+    finally:
+        watcher.cancel()
+    if not work.done():
+        work.cancel()
+        # Let the work unwind, returning its page to the pool, before the request ends
+        await asyncio.gather(work, return_exceptions=True)
+        raise ClientDisconnected("Client disconnected before the response started")
+    return work.result()
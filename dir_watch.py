@@ -0,0 +1,196 @@
+import os
+import sys
+import time
+import errno
+import struct
+import asyncio
+import ctypes
+import ctypes.util
+from typing import AsyncIterator, Dict, Optional, Set, Tuple
+
+# inotify(7) 事件掩码。只关心写完关闭和改名，编辑器保存过程中的零散写入不触发渲染
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+DEFAULT_DEBOUNCE = 0.1
+# 持续有事件时最多攒这么久，避免一直保存的文件永远得不到渲染
+DEFAULT_MAX_DELAY = 1.0
+DEFAULT_POLL_INTERVAL = 0.5
+
+
+def _load_inotify():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class DirectoryWatcher:
+    """监视目录树中的文件变化，按批次（去抖后）产出发生变化的文件路径
+
+    Linux 上通过 ctypes 调用 inotify，其他平台或 inotify 不可用时退回定时轮询
+    文件的大小和修改时间。一批事件在 debounce 秒内没有新事件时结束，最长不超过
+    max_delay 秒。事件队列溢出时产出 None，调用方应重新扫描整个目录。
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        debounce: float = DEFAULT_DEBOUNCE,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+    ):
+        self.directory = os.path.abspath(directory)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.backend: Optional[str] = None
+        self._pending: Set[str] = set()
+        self._overflow = False
+        self._first_event: Optional[float] = None
+        self._event = asyncio.Event()
+        self._fd: Optional[int] = None
+        self._libc = None
+        self._watches: Dict[int, str] = {}
+        self._poller: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._libc = _load_inotify()
+        if self._libc is not None:
+            fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+                self.backend = "inotify"
+                self._watch_tree(self.directory)
+                asyncio.get_running_loop().add_reader(fd, self._read_events)
+                return
+        self.backend = "polling"
+        self._poller = asyncio.ensure_future(self._poll())
+
+    def close(self) -> None:
+        if self._fd is not None:
+            asyncio.get_running_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        if self._poller is not None:
+            self._poller.cancel()
+            self._poller = None
+
+    def _notify(self, path: Optional[str]) -> None:
+        if path is None:
+            self._overflow = True
+        else:
+            self._pending.add(path)
+        if self._first_event is None:
+            self._first_event = time.monotonic()
+        self._event.set()
+
+    def _watch_tree(self, root: str) -> None:
+        for directory, subdirs, _ in os.walk(root):
+            subdirs[:] = [name for name in subdirs if not name.startswith(".")]
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    print(f"警告: inotify 监视数已达上限，{directory} 的变化将无法察觉。")
+                continue
+            self._watches[wd] = directory
+
+    def _read_events(self) -> None:
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                self._notify(None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None:
+                continue
+            if mask & IN_IGNORED:
+                del self._watches[wd]
+                continue
+            path = os.path.join(directory, os.fsdecode(name)) if name else directory
+            if mask & IN_ISDIR:
+                # 新建或移入的子目录需要补上监视；其中已有的文件当作一次全量重扫
+                if mask & (IN_CREATE | IN_MOVED_TO) and not os.path.basename(path).startswith("."):
+                    self._watch_tree(path)
+                    self._notify(None)
+                elif mask & IN_MOVED_FROM:
+                    self._notify(None)
+                continue
+            if mask & IN_DELETE_SELF:
+                continue
+            if mask & IN_CREATE:
+                # 新文件写完时还会收到 IN_CLOSE_WRITE
+                continue
+            self._notify(path)
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        files = {}
+        for directory, subdirs, names in os.walk(self.directory):
+            subdirs[:] = [name for name in subdirs if not name.startswith(".")]
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files[path] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    async def _poll(self) -> None:
+        previous = await asyncio.to_thread(self._snapshot)
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await asyncio.to_thread(self._snapshot)
+            for path in previous.keys() | current.keys():
+                if previous.get(path) != current.get(path):
+                    self._notify(path)
+            previous = current
+
+    async def changes(self) -> AsyncIterator[Tuple[Optional[Set[str]], float]]:
+        """逐批产出 (变化的文件路径集合, 该批第一个事件的 time.monotonic() 时间)；集合为 None 表示需要全量重扫"""
+        while True:
+            await self._event.wait()
+            first = self._first_event
+            while True:
+                self._event.clear()
+                remaining = min(self.debounce, first + self.max_delay - time.monotonic())
+                if remaining <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._event.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            paths = None if self._overflow else self._pending
+            self._pending = set()
+            self._overflow = False
+            self._first_event = None
+            self._event.clear()
+            yield paths, first
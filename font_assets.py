@@ -0,0 +1,215 @@
+import os
+import re
+import bisect
+import sys
+import json
+import hashlib
+import tempfile
+import threading
+import urllib.request
+from typing import List, Optional, Tuple
+
+from html_template import STYLESHEET
+
+# The stylesheet every template imports for CJK and emoji glyphs
+FONT_CSS_URL = "https://fonts.googleapis.com/css2?family=Noto+Sans+SC&family=Noto+Color+Emoji&display=swap"
+FONT_IMPORT = f"@import url('{FONT_CSS_URL}');"
+FONT_FILE_PATTERN = "https://fonts.gstatic.com/**"
+
+FONT_CACHE_DIR = os.environ.get(
+    "FONT_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts")
+)
+# With FONT_OFFLINE=1 uncached font requests fail immediately instead of going to the network
+FONT_OFFLINE = os.environ.get("FONT_OFFLINE", "0") == "1"
+DOWNLOAD_TIMEOUT = 15
+
+# Google only serves woff2 with unicode-range slices to modern browsers
+_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+_FONT_FACE_RE = re.compile(r"@font-face\s*\{[^}]*\}")
+_URL_RE = re.compile(r"url\((https://[^)]+)\)")
+_UNICODE_RANGE_RE = re.compile(r"unicode-range:\s*([^;}]+)")
+
+# Parsed (css block, unicode ranges) pairs, loaded once per process
+_faces: Optional[List[Tuple[str, List[Tuple[int, int]]]]] = None
+_faces_lock = threading.Lock()
+
+
+def _css_path() -> str:
+    return os.path.join(FONT_CACHE_DIR, "fonts.css")
+
+
+def font_file_path(url: str) -> str:
+    """Returns where the font file for a gstatic URL lives in the cache."""
+    name = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(FONT_CACHE_DIR, "files", name + os.path.splitext(url)[1])
+
+
+def _download(url: str) -> bytes:
+    request = urllib.request.Request(url, headers={"User-Agent": _USER_AGENT})
+    with urllib.request.urlopen(request, timeout=DOWNLOAD_TIMEOUT) as response:
+        return response.read()
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def _parse_unicode_range(value: str) -> List[Tuple[int, int]]:
+    ranges = []
+    for item in value.split(","):
+        item = item.strip().upper().replace("U+", "")
+        if not item:
+            continue
+        if "-" in item:
+            start, end = item.split("-", 1)
+        elif "?" in item:
+            start, end = item.replace("?", "0"), item.replace("?", "F")
+        else:
+            start = end = item
+        ranges.append((int(start, 16), int(end, 16)))
+    return ranges
+
+
+def _parse_faces(css: str) -> List[Tuple[str, List[Tuple[int, int]]]]:
+    faces = []
+    for match in _FONT_FACE_RE.finditer(css):
+        block = match.group(0)
+        unicode_range = _UNICODE_RANGE_RE.search(block)
+        faces.append((block, _parse_unicode_range(unicode_range.group(1)) if unicode_range else []))
+    return faces
+
+
+def prefetch(force: bool = False) -> int:
+    """Downloads the font stylesheet and every font file it references.
+
+    Files already in the cache are kept, so this is cheap to run on every
+    startup once the cache (or the image it was baked into) is populated.
+    Returns the number of @font-face rules available locally.
+    """
+    global _faces
+    css_path = _css_path()
+    if force or not os.path.exists(css_path):
+        _write_atomic(css_path, _download(FONT_CSS_URL))
+
+    with open(css_path, encoding="utf-8") as f:
+        css = f.read()
+
+    for url in _URL_RE.findall(css):
+        path = font_file_path(url)
+        if force or not os.path.exists(path):
+            _write_atomic(path, _download(url))
+
+    faces = _parse_faces(css)
+    with _faces_lock:
+        _faces = faces
+    return len(faces)
+
+
+def _load_faces() -> List[Tuple[str, List[Tuple[int, int]]]]:
+    global _faces
+    with _faces_lock:
+        if _faces is None:
+            try:
+                with open(_css_path(), encoding="utf-8") as f:
+                    _faces = _parse_faces(f.read())
+            except FileNotFoundError:
+                _faces = []
+        return _faces
+
+
+def font_css_for(text: str) -> Optional[str]:
+    """Returns the @font-face rules whose unicode-range covers characters in ``text``.
+
+    Noto Sans SC is published as about a hundred unicode-range slices; only
+    the slices holding glyphs the document uses are kept, so Chromium never
+    even considers the rest. Returns None when the font cache is empty.
+    """
+    faces = _load_faces()
+    if not faces:
+        return None
+
+    # Template chrome (headings, punctuation) is ASCII, so basic Latin is always kept
+    codepoints = {ord(char) for char in text}
+    codepoints.update(range(0x20, 0x7F))
+    codepoints = sorted(codepoints)
+
+    def covers(start: int, end: int) -> bool:
+        index = bisect.bisect_left(codepoints, start)
+        return index < len(codepoints) and codepoints[index] <= end
+
+    selected = [
+        block
+        for block, ranges in faces
+        if not ranges or any(covers(start, end) for start, end in ranges)
+    ]
+    return "\n".join(selected)
+
+
+def stylesheet_for(text: str) -> str:
+    """The shared stylesheet with the Google Fonts @import swapped for the local subset.
+
+    Building the page from this stylesheet avoids copying the whole
+    document again, as :func:`inline_fonts` has to.
+    """
+    css = font_css_for(text)
+    if css is None:
+        return STYLESHEET
+    return STYLESHEET.replace(FONT_IMPORT, css, 1)
+
+
+def inline_fonts(styled_html: str, text: str) -> str:
+    """Replaces the Google Fonts @import with the locally cached subset for ``text``."""
+    css = font_css_for(text)
+    if css is None:
+        return styled_html
+    return styled_html.replace(FONT_IMPORT, css, 1)
+
+
+def _route_response(url: str) -> Optional[dict]:
+    path = font_file_path(url)
+    if not os.path.exists(path):
+        return None
+    return {
+        "path": path,
+        "content_type": "font/" + os.path.splitext(path)[1].lstrip("."),
+        "headers": {"Access-Control-Allow-Origin": "*"},
+    }
+
+
+async def handle_font_route(route) -> None:
+    """Playwright (async) route handler serving font files from the local cache."""
+    response = _route_response(route.request.url)
+    if response is not None:
+        await route.fulfill(**response)
+    elif FONT_OFFLINE:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+def handle_font_route_sync(route) -> None:
+    """Playwright (sync) route handler serving font files from the local cache."""
+    response = _route_response(route.request.url)
+    if response is not None:
+        route.fulfill(**response)
+    elif FONT_OFFLINE:
+        route.abort()
+    else:
+        route.continue_()
+
+
+if __name__ == "__main__":
+    # Populates the cache, e.g. while building the Docker image
+    try:
+        count = prefetch(force="--force" in sys.argv)
+        print(json.dumps({"cache_dir": FONT_CACHE_DIR, "font_faces": count}))
+    except Exception as e:
+        print(f"Font prefetch failed: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,50 @@
+import hashlib
+
+# Styles shared by the HTML and PDF outputs of the web service
+STYLESHEET = """
+    @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+SC&family=Noto+Color+Emoji&display=swap');
+    body {
+        font-family: 'Noto Sans SC', 'Noto Color Emoji', Arial, sans-serif;
+        margin: 40px;
+        line-height: 1.6;
+    }
+    h1, h2, h3 { color: #333; }
+    code { background-color: #f5f5f5; padding: 2px 4px; border-radius: 3px; }
+    pre { background-color: #f5f5f5; padding: 10px; border-radius: 5px; overflow-x: auto; }
+    blockquote { border-left: 4px solid #ddd; padding-left: 20px; color: #555; }
+    img { max-width: 100%; }
+    table { border-collapse: collapse; width: 100%; margin: 15px 0; }
+    th, td { border: 1px solid #ddd; padding: 8px; text-align: left; }
+    th { background-color: #f2f2f2; }
+    tr:nth-child(even) { background-color: #f9f9f9; }
+"""
+
+# Page setup shared by every PDF render
+PDF_OPTIONS = {
+    "format": "A4",
+    "margin": {
+        "top": "1cm",
+        "right": "1cm",
+        "bottom": "1cm",
+        "left": "1cm",
+    },
+}
+
+# Changes whenever the stylesheet does, so cached renders are never served stale
+STYLESHEET_VERSION = hashlib.sha256(STYLESHEET.encode("utf-8")).hexdigest()[:12]
+
+
+def render_styled_html(html_content: str, stylesheet: str = STYLESHEET) -> str:
+    """Wraps converted HTML in the shared styled page."""
+    return f"""
+    <!DOCTYPE html>
+    <html>
+    <head>
+        <meta charset="UTF-8">
+        <style>{stylesheet}</style>
+    </head>
+    <body>
+        {html_content}
+    </body>
+    </html>
+    """
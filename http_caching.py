@@ -0,0 +1,122 @@
+import os
+import gzip
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Outputs depend only on the upload and the render options, so clients may keep them
+CACHE_CONTROL = os.environ.get("CONVERT_CACHE_CONTROL", "private, max-age=3600")
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised for a byte range that lies entirely outside the body."""
+
+
+def etag_for(cache_key: str, encoding: Optional[str] = None) -> str:
+    """A strong ETag for the output cached under ``cache_key``, one per content coding."""
+    return f'"{cache_key}-{encoding}"' if encoding else f'"{cache_key}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header matches ``etag``, comparing weakly as RFC 9110 asks."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Picks br (when brotli is installed) or gzip from Accept-Encoding; None means identity."""
+    weights = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.partition(";")
+        weight = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        if name.strip():
+            weights[name.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+        weight = weights.get(encoding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    # A fixed mtime keeps the output, and so its ETag, the same across renders
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def parse_range(range_header: str, size: int) -> Optional[Tuple[int, int]]:
+    """Parses a single byte range into inclusive ``(start, end)`` offsets.
+
+    Returns None for headers that are answered with the whole body:
+    malformed ones, other units and multiple ranges.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else max(start, size - 1)
+            if end < start:
+                return None
+        else:
+            suffix = int(last)
+            if suffix == 0:
+                raise RangeNotSatisfiable()
+            start, end = max(size - suffix, 0), size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def not_modified(etag: str, headers: Optional[dict] = None) -> Response:
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL})
+
+
+def conditional_response(
+    request: Request, body: bytes, media_type: str, etag: str, headers: Optional[dict] = None
+) -> Response:
+    """Serves ``body`` with its validators, honouring If-None-Match, Range and If-Range."""
+    headers = {**(headers or {}), "ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag, headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, len(body))
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{len(body)}"
+            return Response(status_code=416, headers=headers)
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            return Response(body[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return Response(body, media_type=media_type, headers=headers)
@@ -0,0 +1,96 @@
+import io
+import os
+import json
+import hashlib
+import importlib.util
+from typing import Tuple
+
+from html_template import PDF_OPTIONS
+from pdf_stream import printable_area
+from render_cache import RenderCache
+
+# Pillow is imported by the first image that needs it, so processes that never see one skip it;
+# without it images are served as uploaded
+PILLOW_INSTALLED = importlib.util.find_spec("PIL") is not None
+
+# Resolution images are kept at when printed across the page's printable area
+IMAGE_DPI = int(os.environ.get("IMAGE_DPI", "300"))
+IMAGE_JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Formats re-encoded as themselves; animations and vector images pass through untouched
+_FORMATS = {"image/jpeg": "JPEG", "image/png": "PNG", "image/webp": "WEBP"}
+
+# Processed images keyed by content hash, kept apart from rendered documents. The directory
+# is a sibling of RENDER_CACHE_DIR: inside it, the render cache would count and evict the images.
+_cache_dir = os.environ.get("RENDER_CACHE_DIR")
+image_cache = RenderCache(
+    max_bytes=IMAGE_CACHE_MAX_BYTES,
+    disk_dir=_cache_dir.rstrip(os.sep) + "-images" if _cache_dir else None,
+)
+
+
+def max_pixels(pdf_options: dict = PDF_OPTIONS, dpi: int = IMAGE_DPI) -> Tuple[int, int]:
+    """The largest image, in pixels, that can be printed on the page at ``dpi``."""
+    width, height = printable_area(pdf_options)
+    return max(1, round(width * dpi)), max(1, round(height * dpi))
+
+
+# Everything that changes how an image is processed, for cache keys
+IMAGE_OPTIONS = {"box": max_pixels(), "quality": IMAGE_JPEG_QUALITY, "enabled": PILLOW_INSTALLED}
+
+
+def optimize_image(data: bytes, content_type: str) -> bytes:
+    """Downscales an image to fit the printable area at IMAGE_DPI and re-encodes it.
+
+    Results are cached by content hash, so an image shared between
+    documents is only processed once. The image comes back unchanged when
+    Pillow is not installed, it is not a still JPEG, PNG or WebP, or
+    re-encoding would not make it smaller.
+    """
+    if not PILLOW_INSTALLED or content_type not in _FORMATS:
+        return data
+    digest = hashlib.sha256(json.dumps(IMAGE_OPTIONS).encode("utf-8"))
+    digest.update(data)
+    key = digest.hexdigest()
+    cached = image_cache.get(key)
+    if cached is not None:
+        return cached
+
+    from PIL import Image
+
+    try:
+        result = _reencode(data, _FORMATS[content_type])
+    except (OSError, ValueError, Image.DecompressionBombError):
+        # Chromium decides what to do with images Pillow cannot read
+        result = data
+    image_cache.put(key, result)
+    return result
+
+
+def _reencode(data: bytes, image_format: str) -> bytes:
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as image:
+        if getattr(image, "is_animated", False):
+            return data
+        # Chromium honours EXIF orientation, which the re-encoded image no longer carries
+        image = ImageOps.exif_transpose(image)
+        box = max_pixels()
+        oversized = image.width > box[0] or image.height > box[1]
+        if oversized:
+            image.thumbnail(box, Image.LANCZOS)
+
+        output = io.BytesIO()
+        if image_format == "JPEG":
+            if image.mode not in ("RGB", "L", "CMYK"):
+                image = image.convert("RGB")
+            image.save(output, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+        elif image_format == "WEBP":
+            image.save(output, "WEBP", quality=IMAGE_JPEG_QUALITY)
+        else:
+            image.save(output, "PNG", optimize=True)
+    result = output.getvalue()
+    if not oversized and len(result) >= len(data):
+        return data
+    return result
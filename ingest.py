@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import codecs
+import re
+from typing import Dict, Optional, Tuple
+
+# Largest request body accepted, enforced while the body is still arriving
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = 64 * 1024
+# How much of a multipart body is searched for the uploaded file's name
+FILENAME_SNIFF_BYTES = 16 * 1024
+
+_FILENAME_RE = re.compile(rb'filename\*?=(?:"([^"]*)"|([^;\r\n]*))', re.IGNORECASE)
+
+
+class UploadTooLarge(Exception):
+    """Raised once an upload passes its size limit."""
+
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+class UploadLimitMiddleware:
+    """Rejects request bodies over a size limit with 413 before they are buffered.
+
+    A declared Content-Length over the limit is refused without reading the
+    body at all; otherwise the body is counted as it streams in and the
+    request is cut off at the first chunk past the limit. ``path_limits``
+    overrides the limit for individual paths. ``zip_limits`` raises it for
+    paths that also take zip uploads, but only for requests whose first
+    uploaded file is named *.zip; the name is read from the multipart part
+    headers at the start of the body.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_bytes: int = MAX_UPLOAD_BYTES,
+        path_limits: Optional[Dict[str, int]] = None,
+        zip_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+        self.zip_limits = zip_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.path_limits.get(scope["path"], self.max_bytes)
+        zip_limit = self.zip_limits.get(scope["path"])
+        try:
+            declared = int(dict(scope["headers"]).get(b"content-length", b""))
+        except ValueError:
+            declared = None
+        if declared is not None and declared > max(limit, zip_limit or 0):
+            await self._reject(send, limit if zip_limit is None else max(limit, zip_limit))
+            return
+
+        received = 0
+        exceeded = False
+        started = False
+        # Until the file's name has been seen the request might be a zip
+        prefix = b"" if zip_limit is not None else None
+
+        async def limited_receive():
+            nonlocal received, exceeded, limit, prefix
+            message = await receive()
+            if message["type"] == "http.request":
+                body = message.get("body", b"")
+                received += len(body)
+                if prefix is not None:
+                    prefix += body
+                    match = _FILENAME_RE.search(prefix)
+                    if match is not None or len(prefix) >= FILENAME_SNIFF_BYTES or not message.get("more_body"):
+                        name = (match.group(1) or match.group(2)).strip() if match is not None else b""
+                        if name.lower().endswith(b".zip"):
+                            limit = zip_limit
+                        prefix = None
+                if prefix is None and max(received, declared or 0) > limit:
+                    exceeded = True
+                    raise UploadTooLarge(limit)
+            return message
+
+        async def guarded_send(message):
+            nonlocal started
+            # Whatever error response the app makes of the aborted body is replaced by the 413
+            if exceeded and not started:
+                return
+            if message["type"] == "http.response.start":
+                started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded or started:
+                raise
+        if exceeded and not started:
+            await self._reject(send, limit)
+
+    async def _reject(self, send, limit: int) -> None:
+        body = json.dumps({"error": str(UploadTooLarge(limit))}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("ascii")),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+async def read_upload_text(
+    upload, max_bytes: int = MAX_UPLOAD_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> Tuple[str, int]:
+    """Reads an uploaded file as UTF-8 text, one chunk at a time.
+
+    Returns the text and its size in bytes. Invalid UTF-8 raises
+    UnicodeDecodeError at the chunk that contains it and a file over
+    ``max_bytes`` raises UploadTooLarge, so neither is read in full first;
+    the raw bytes are never held as a whole.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parts = []
+    size = 0
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLarge(max_bytes)
+        parts.append(decoder.decode(chunk))
+    parts.append(decoder.decode(b"", final=True))
+    return "".join(parts), size
+
+
+class BufferUsage:
+    """Accounts for the buffers a request holds at each pipeline stage.
+
+    Stages :meth:`hold` their buffer when it is created and :meth:`release`
+    it once the next stage no longer needs it; ``peak`` is the largest total
+    held at any one time.
+    """
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+
+    def hold(self, buffer) -> int:
+        size = sys.getsizeof(buffer)
+        self.current += size
+        self.peak = max(self.peak, self.current)
+        return size
+
+    def release(self, size: int) -> None:
+        self.current -= size
@@ -0,0 +1,150 @@
+import os
+import time
+import uuid
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+DEFAULT_MAX_QUEUE = int(os.environ.get("JOB_MAX_QUEUE", "64"))
+DEFAULT_RESULT_TTL = float(os.environ.get("JOB_RESULT_TTL", "600"))
+
+# A job body returns the rendered bytes and their media type
+JobFunc = Callable[[], Awaitable[Tuple[bytes, str]]]
+
+
+class QueueFullError(Exception):
+    """Raised when a job cannot be accepted; ``retry_after`` is a hint in seconds."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Job:
+    """A queued conversion and, once finished, its result or error."""
+
+    def __init__(self, func: JobFunc, filename: str, cache_key: Optional[str] = None):
+        self.id = uuid.uuid4().hex
+        self.func = func
+        self.filename = filename
+        # Identifies the output by its source and render options, for ETags
+        self.cache_key = cache_key
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.expires_at: Optional[float] = None
+        self.result: Optional[bytes] = None
+        self.media_type: Optional[str] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "expires_at": self.expires_at,
+            "error": self.error,
+        }
+
+
+class JobScheduler:
+    """Runs submitted jobs on a fixed number of workers behind a bounded queue.
+
+    When ``max_queue`` jobs are already waiting, :meth:`submit` raises
+    :class:`QueueFullError` with a Retry-After estimate derived from recent
+    job durations. Finished jobs are kept for ``result_ttl`` seconds.
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_JOB_WORKERS,
+        max_queue: int = DEFAULT_MAX_QUEUE,
+        result_ttl: float = DEFAULT_RESULT_TTL,
+    ):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.result_ttl = result_ttl
+
+        self._queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=max_queue)
+        self._jobs: Dict[str, Job] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._average_duration = 1.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def retry_after(self) -> int:
+        """Estimated seconds until a queue slot frees up."""
+        return max(1, round(self._average_duration * (self.queue_depth + 1) / self.workers))
+
+    def submit(self, func: JobFunc, filename: str, cache_key: Optional[str] = None) -> Job:
+        if not self.running:
+            raise QueueFullError("Job scheduler is not running", self.retry_after())
+        job = Job(func, filename, cache_key)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Job queue is full", self.retry_after())
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is not None and job.expires_at is not None and job.expires_at < time.time():
+            del self._jobs[job_id]
+            return None
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result, job.media_type = await job.func()
+                job.status = "done"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "Server shutting down"
+                raise
+            except Exception as e:
+                job.status = "failed"
+                job.error = str(e)
+            finally:
+                job.func = None
+                job.finished_at = time.time()
+                job.expires_at = job.finished_at + self.result_ttl
+                duration = job.finished_at - job.started_at
+                # Exponential moving average for Retry-After estimates
+                self._average_duration = 0.8 * self._average_duration + 0.2 * duration
+                self._queue.task_done()
+
+    async def _reaper(self) -> None:
+        while True:
+            await asyncio.sleep(min(self.result_ttl, 60))
+            now = time.time()
+            for job_id in [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.expires_at is not None and job.expires_at < now
+            ]:
+                del self._jobs[job_id]
@@ -1,19 +1,147 @@
 import os
+import sys
+import time
 import asyncio
-import tempfile
-from typing import Optional
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+from urllib.parse import quote
 
-import pypandoc
 from fastapi import FastAPI, File, UploadFile, Form, Request
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from playwright.async_api import async_playwright
-import sys
-import multiprocessing
-import subprocess
-
-app = FastAPI()
+from starlette.background import BackgroundTask
+
+import font_assets
+import pandoc_worker
+from browser_pool import BrowserCrashedError, BrowserPool, BrowserUnavailableError, PoolBusyError, RenderTimeoutError
+from chunked_render import CHUNKED_RENDER_THRESHOLD, render_sections, split_sections
+from bundle import BUNDLE_MAX_UPLOAD_BYTES, AssetBundle, BundleError, is_bundle, read_bundle
+from deadline import ClientDisconnected, Deadline, DeadlineExceeded, unless_disconnected
+from bulk import BULK_MAX_UPLOAD_BYTES, ArchiveError, StreamingZipWriter, output_name, read_archive, safe_name
+from ingest import BufferUsage, UploadLimitMiddleware, UploadTooLarge, read_upload_text
+from jobs import JobScheduler, QueueFullError
+from http_caching import (
+    CACHE_CONTROL, compress, conditional_response, etag_for, etag_matches, negotiate_encoding, not_modified,
+)
+from markdown_engines import DEFAULT_ENGINE, ENGINES, MARKDOWN, choose_engine, engine_options, markdown_to_html
+from metrics import (
+    BYTES_IN, BYTES_OUT, CANCELLED, ENGINE_CHOICES, ERRORS, METRICS_DIR, METRICS_FLUSH_INTERVAL, QUEUE_DEPTH, REGISTRY,
+    PDF_OPTIMIZE_SAVED, REQUEST_PEAK_BYTES, in_flight, observe_stage, stage_timer,
+)
+from html_template import PDF_OPTIONS, STYLESHEET_VERSION, render_styled_html
+from image_assets import IMAGE_OPTIONS, image_cache
+from page_loader import load_page
+from pandoc_worker import PandocTimeout
+from pdf_optimize import PROFILES, OptimizeError, backend_options, optimize_pdf
+from pdf_stream import PDF_STREAM_THRESHOLD, prime_stream, stream_pdf
+from render_cache import RenderCache, make_cache_key
+from render_scheduler import FAST, LARGE, RenderScheduler, count_pdf_pages
+from single_flight import SingleFlight
+from warmup import Warmup
+
+# An instance that only serves HTML never launches Chromium or imports Playwright
+PDF_ENABLED = os.environ.get("PDF_ENABLED", "1") == "1"
+# Header naming the client for fair scheduling of renders; the peer address is used without it
+CLIENT_ID_HEADER = os.environ.get("CLIENT_ID_HEADER", "X-Client-Id")
+
+WARMUP_MARKDOWN = "# Warm-up\n\nText, `code`, 中文 and ✓.\n"
+WARMUP_HTML = "<h1>Warm-up</h1>\n<p>Text, <code>code</code>, 中文 and ✓.</p>"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Runs the shared Chromium pool and pandoc workers for the lifetime of the server.
+
+    They warm up in the background: /healthz answers as soon as the server
+    is up, /readyz only once every component has done a first conversion.
+    Requests that arrive earlier wait for the browser pool to come up.
+    """
+    warmup = Warmup()
+    app.state.warmup = warmup
+    pool = render_scheduler = None
+    if PDF_ENABLED:
+        pool = BrowserPool(routes=[(font_assets.FONT_FILE_PATTERN, font_assets.handle_font_route)])
+        render_scheduler = RenderScheduler(pool.capacity)
+        QUEUE_DEPTH.track(lambda: pool.waiting, queue="browser_pool")
+        QUEUE_DEPTH.track(lambda: render_scheduler.waiting(FAST), queue="render_fast")
+        QUEUE_DEPTH.track(lambda: render_scheduler.waiting(LARGE), queue="render_large")
+    app.state.browser_pool = pool
+    app.state.render_scheduler = render_scheduler
+    scheduler = JobScheduler()
+    await scheduler.start()
+    app.state.job_scheduler = scheduler
+    QUEUE_DEPTH.track(lambda: scheduler.queue_depth, queue="jobs")
+    warming = asyncio.create_task(warm_up(warmup, pool))
+    publisher = asyncio.create_task(publish_metrics()) if METRICS_DIR else None
+    try:
+        yield
+    finally:
+        warmup.stopping = True
+        warming.cancel()
+        await asyncio.gather(warming, return_exceptions=True)
+        if publisher is not None:
+            publisher.cancel()
+        await scheduler.stop()
+        if pool is not None:
+            await pool.stop()
+        pandoc_worker.stop()
+        if METRICS_DIR:
+            REGISTRY.write_snapshot(METRICS_DIR)
+
+
+async def warm_up(warmup: Warmup, pool: Optional[BrowserPool]) -> None:
+    """Starts each component and puts a first conversion through it, so no request pays for a cold one."""
+
+    async def pandoc() -> None:
+        await asyncio.to_thread(pandoc_worker.start)
+        await asyncio.to_thread(pandoc_worker.convert_text, WARMUP_MARKDOWN, "html", format="markdown")
+
+    async def markdown() -> None:
+        await asyncio.to_thread(markdown_to_html, WARMUP_MARKDOWN, MARKDOWN)
+
+    async def fonts() -> None:
+        await asyncio.to_thread(font_assets.prefetch)
+
+    async def browser() -> None:
+        await pool.start()
+        styled_html = render_styled_html(WARMUP_HTML, font_assets.stylesheet_for(WARMUP_MARKDOWN))
+
+        async def render(page) -> None:
+            await load_page(page, styled_html)
+            await page.pdf(**PDF_OPTIONS)
+
+        await pool.run(render)
+
+    async def pdf() -> None:
+        # Pages load their fonts from the local cache, so the browser warms up once it is filled
+        if os.environ.get("FONT_PREFETCH", "1") == "1":
+            await warmup.step("fonts", fonts, optional=True)
+        await warmup.step("browser", browser)
+
+    steps = [warmup.step("pandoc", pandoc), warmup.step("markdown", markdown)]
+    if pool is not None:
+        steps.append(pdf())
+    await asyncio.gather(*steps)
+    warmup.finish()
+
+
+async def publish_metrics() -> None:
+    """Keeps this worker's samples in METRICS_DIR fresh for whichever worker is scraped."""
+    while True:
+        try:
+            await asyncio.to_thread(REGISTRY.write_snapshot, METRICS_DIR)
+        except OSError as e:
+            print(f"Could not publish metrics to {METRICS_DIR}: {e}", file=sys.stderr)
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(
+    UploadLimitMiddleware,
+    path_limits={"/convert/bulk": BULK_MAX_UPLOAD_BYTES},
+    zip_limits={"/convert": BUNDLE_MAX_UPLOAD_BYTES, "/jobs": BUNDLE_MAX_UPLOAD_BYTES},
+)
 
 # Serve static files (like CSS, JavaScript)
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -21,174 +149,397 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 # Templates directory
 templates = Jinja2Templates(directory="templates")
 
+# Rendered outputs keyed by source hash, output format and render options
+render_cache = RenderCache.from_env()
+# Conversions in progress under the same keys, shared by identical concurrent requests
+single_flight = SingleFlight()
+
+HTML_RENDER_OPTIONS = {"stylesheet": STYLESHEET_VERSION}
+PDF_RENDER_OPTIONS = {
+    "stylesheet": STYLESHEET_VERSION,
+    "pdf": PDF_OPTIONS,
+    "chunked_threshold": CHUNKED_RENDER_THRESHOLD,
+    # Optimized copies are cached under the render's key plus their profile
+    "optimizer": {"profiles": PROFILES, "backends": backend_options()},
+}
+
+
+def render_options(
+    output_format: str, assets: Optional[AssetBundle] = None, engine: str = DEFAULT_ENGINE
+) -> dict:
+    """Everything besides the Markdown that an output depends on, for its cache key."""
+    options = PDF_RENDER_OPTIONS if output_format == "pdf" else HTML_RENDER_OPTIONS
+    options = {**options, "markdown_engine": engine_options(engine)}
+    if assets is not None:
+        options = {**options, "assets": assets.digest, "images": IMAGE_OPTIONS}
+    return options
+
+
+async def stream_markdown_to_pdf(
+    md_content: str,
+    pool: BrowserPool,
+    timings: Optional[dict] = None,
+    usage: Optional[BufferUsage] = None,
+    scheduler: Optional[RenderScheduler] = None,
+    client: str = "",
+    cache_key: Optional[str] = None,
+    assets: Optional[AssetBundle] = None,
+    engine: str = DEFAULT_ENGINE,
+    deadline: Optional[Deadline] = None,
+) -> AsyncIterator[bytes]:
+    """Yields the PDF for Markdown content, rendered on a page borrowed from the browser pool.
+
+    Nothing touches the disk: the HTML goes to the page with set_content and
+    large documents are streamed out of Chromium chunk by chunk. Documents
+    of CHUNKED_RENDER_THRESHOLD characters or more are split at their
+    top-level headings and the sections rendered in parallel instead. When
+    ``timings`` is given, the page readiness wait (in ms) is recorded in it
+    before the first chunk is yielded; ``usage`` accounts for the buffers
+    held along the way. With a ``scheduler``, renders that miss the cache
+    wait for it to admit them on behalf of ``client`` first. Identical
+    documents converted at the same time share one render. ``cache_key``
+    saves hashing the document again when the caller already has it.
+    Files the document references are served from ``assets`` if given.
+    ``engine`` picks the Markdown converter (see markdown_engines).
+    Each stage of the render raises DeadlineExceeded once it has used its
+    share of ``deadline``; a shared render runs on its first caller's.
+    """
+    usage = usage or BufferUsage()
+    deadline = deadline or Deadline(0)
+    with stage_timer("cache_lookup", "pdf"):
+        if cache_key is None:
+            cache_key = make_cache_key(md_content, "pdf", render_options("pdf", assets, engine))
+        cached = await render_cache.get_async(cache_key)
+    if cached is not None:
+        usage.hold(cached)
+        BYTES_OUT.inc(len(cached), format="pdf")
+        yield cached
+        return
+
+    async def render(render_timings: dict) -> AsyncIterator[bytes]:
+        async with AsyncExitStack() as stack:
+            parallelism = None
+            if scheduler is not None:
+                with stage_timer("render_queue", "pdf"):
+                    admission = scheduler.admit(scheduler.estimate(md_content), client)
+                    ticket = await deadline.run("render_queue", stack.enter_async_context(admission))
+                parallelism = ticket.slots
+            pages = 0
+            chunks = _render_pdf(
+                md_content, pool, cache_key, render_timings, usage, parallelism, assets, engine, deadline
+            )
+            async for chunk in chunks:
+                pages += count_pdf_pages(chunk)
+                yield chunk
+            if scheduler is not None:
+                scheduler.observe(md_content, pages)
+
+    async for chunk in single_flight.stream(cache_key, render, "pdf", timings):
+        BYTES_OUT.inc(len(chunk), format="pdf")
+        yield chunk
+
+
+async def _render_pdf(
+    md_content: str,
+    pool: BrowserPool,
+    cache_key: str,
+    timings: Optional[dict],
+    usage: BufferUsage,
+    parallelism: Optional[int],
+    assets: Optional[AssetBundle],
+    engine: str,
+    deadline: Deadline,
+) -> AsyncIterator[bytes]:
+    engine, reason = choose_engine(md_content, engine)
+    ENGINE_CHOICES.inc(engine=engine, reason=reason, format="pdf")
+    with stage_timer(engine, "pdf"):
+        html_content = await asyncio.to_thread(_markdown_to_html, md_content, engine, deadline)
+    html_size = usage.hold(html_content)
+    if len(md_content) >= CHUNKED_RENDER_THRESHOLD:
+        sections = split_sections(html_content)
+        if sections is not None:
+            sections_size = sum(usage.hold(body) for _, body in sections[2])
+            del html_content
+            usage.release(html_size)
+            try:
+                pdf_bytes = await deadline.run(
+                    "print", render_sections(pool, sections, timings, parallelism, assets)
+                )
+            except (PoolBusyError, BrowserUnavailableError):
+                ERRORS.inc(stage="browser_acquire")
+                raise
+            del sections
+            usage.release(sections_size)
+            usage.hold(pdf_bytes)
+            await render_cache.put_async(cache_key, pdf_bytes)
+            yield pdf_bytes
+            return
+
+    with stage_timer("template", "pdf"):
+        styled_html = render_styled_html(html_content, font_assets.stylesheet_for(md_content))
+    styled_size = usage.hold(styled_html)
+    del html_content
+    usage.release(html_size)
+
+    # Chunks are kept for the cache only while the document still fits in it
+    buffered = []
+    buffered_bytes = 0
+    buffered_held = 0
+    # Until the first chunk is in hand a crashed browser can be retried from the HTML
+    printed = False
+    for attempt in range(pool.retries + 1):
+        acquire_started = time.perf_counter()
+        try:
+            async with pool.page() as page:
+                observe_stage("browser_acquire", "pdf", time.perf_counter() - acquire_started)
+                with stage_timer("page_load", "pdf"):
+                    ready_ms = await deadline.run("page_load", load_page(page, styled_html, assets=assets))
+                if timings is not None:
+                    timings["page_ready"] = ready_ms
+
+                if len(styled_html) >= PDF_STREAM_THRESHOLD:
+                    chunks = stream_pdf(page, PDF_OPTIONS)
+                else:
+                    chunks = _print_whole(page)
+
+                # Time spent producing chunks, excluding the time the client takes to read them
+                print_seconds = 0.0
+                while True:
+                    print_started = time.perf_counter()
+                    try:
+                        chunk = await deadline.run("print", chunks.__anext__())
+                    except StopAsyncIteration:
+                        break
+                    except DeadlineExceeded:
+                        raise
+                    except Exception:
+                        ERRORS.inc(stage="pdf_print")
+                        raise
+                    finally:
+                        print_seconds += time.perf_counter() - print_started
+
+                    if not printed:
+                        printed = True
+                        del styled_html
+                        usage.release(styled_size)
+                    chunk_size = usage.hold(chunk)
+                    if buffered is not None:
+                        buffered.append(chunk)
+                        buffered_bytes += len(chunk)
+                        buffered_held += chunk_size
+                        if buffered_bytes > render_cache.max_bytes:
+                            buffered = None
+                            # The chunk in hand stays held until it has been sent
+                            usage.release(buffered_held - chunk_size)
+                    sent_started = time.perf_counter()
+                    # Waiting on a slow reader is not the render's fault
+                    with pool.paused(page):
+                        yield chunk
+                    deadline.exclude(time.perf_counter() - sent_started)
+                    if buffered is None:
+                        usage.release(chunk_size)
+                observe_stage("pdf_print", "pdf", print_seconds)
+            break
+        except (PoolBusyError, BrowserUnavailableError):
+            ERRORS.inc(stage="browser_acquire")
+            raise
+        except BrowserCrashedError:
+            ERRORS.inc(stage="browser_crash")
+            if printed or attempt == pool.retries:
+                raise
+
+    if buffered is not None:
+        await render_cache.put_async(cache_key, b"".join(buffered))
+
+
+async def _print_whole(page) -> AsyncIterator[bytes]:
+    yield await page.pdf(**PDF_OPTIONS)
+
+
+async def convert_markdown_to_pdf(
+    md_content: str,
+    pool: BrowserPool,
+    timings: Optional[dict] = None,
+    scheduler: Optional[RenderScheduler] = None,
+    client: str = "",
+    cache_key: Optional[str] = None,
+    engine: str = DEFAULT_ENGINE,
+) -> bytes:
+    """Converts Markdown content to PDF bytes on a page borrowed from the browser pool."""
+    chunks = stream_markdown_to_pdf(
+        md_content, pool, timings, scheduler=scheduler, client=client, cache_key=cache_key, engine=engine
+    )
+    return b"".join([chunk async for chunk in chunks])
+
+
+async def render_markdown_to_html(
+    md_content: str,
+    usage: Optional[BufferUsage] = None,
+    cache_key: Optional[str] = None,
+    assets: Optional[AssetBundle] = None,
+    engine: str = DEFAULT_ENGINE,
+    deadline: Optional[Deadline] = None,
+) -> str:
+    """Runs convert_markdown_to_html in a thread; identical documents converted at the same time share one run."""
+    if cache_key is None:
+        cache_key = await asyncio.to_thread(
+            make_cache_key, md_content, "html", render_options("html", assets, engine)
+        )
+    return await single_flight.do(
+        cache_key,
+        lambda: asyncio.to_thread(convert_markdown_to_html, md_content, usage, cache_key, assets, engine, deadline),
+        "html",
+    )
 
-async def convert_markdown_to_pdf(md_content: str, base_url: str) -> str:
-    """Converts Markdown content to PDF using Playwright."""
-    with tempfile.TemporaryDirectory() as temp_dir:
-        html_path = os.path.join(temp_dir, "temp.html")
-        pdf_path = os.path.join(temp_dir, "output.pdf")
 
-        html_content = pypandoc.convert_text(
-            md_content,
-            "html",
-            format="markdown",
-            extra_args=["--standalone"],
-        )
+def convert_markdown_to_html(
+    md_content: str,
+    usage: Optional[BufferUsage] = None,
+    cache_key: Optional[str] = None,
+    assets: Optional[AssetBundle] = None,
+    engine: str = DEFAULT_ENGINE,
+    deadline: Optional[Deadline] = None,
+) -> str:
+    """Converts Markdown content to HTML with pandoc or python-markdown, as ``engine`` picks.
 
-        styled_html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+SC&family=Noto+Color+Emoji&display=swap');
-                body {{
-                    font-family: 'Noto Sans SC', 'Noto Color Emoji', Arial, sans-serif;
-                    margin: 40px;
-                    line-height: 1.6;
-                }}
-                h1, h2, h3 {{ color: #333; }}
-                code {{ background-color: #f5f5f5; padding: 2px 4px; border-radius: 3px; }}
-                pre {{ background-color: #f5f5f5; padding: 10px; border-radius: 5px; overflow-x: auto; }}
-                blockquote {{ border-left: 4px solid #ddd; padding-left: 20px; color: #555; }}
-                img {{ max-width: 100%; }}
-                table {{ border-collapse: collapse; width: 100%; margin: 15px 0; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-                tr:nth-child(even) {{ background-color: #f9f9f9; }}
-            </style>
-        </head>
-        <body>
-            {html_content}
-        </body>
-        </html>
-        """
-
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(styled_html)
-
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
-            await page.goto(f"file://{os.path.abspath(html_path)}")
-            await page.wait_for_load_state("networkidle")
-            await page.pdf(
-                path=pdf_path,
-                format="A4",
-                margin={
-                    "top": "1cm",
-                    "right": "1cm",
-                    "bottom": "1cm",
-                    "left": "1cm",
-                },
-            )
-            await browser.close()
-        return pdf_path
+    Images from an ``assets`` bundle are embedded, so the page stands alone.
+    Pandoc is killed once it runs past its share of ``deadline``.
+    """
+    usage = usage or BufferUsage()
+    with stage_timer("cache_lookup", "html"):
+        if cache_key is None:
+            cache_key = make_cache_key(md_content, "html", render_options("html", assets, engine))
+        cached = render_cache.get(cache_key)
+    if cached is not None:
+        usage.hold(cached)
+        styled_html = cached.decode("utf-8")
+        usage.hold(styled_html)
+        return styled_html
+
+    engine, reason = choose_engine(md_content, engine)
+    ENGINE_CHOICES.inc(engine=engine, reason=reason, format="html")
+    with stage_timer(engine, "html"):
+        html_content = _markdown_to_html(md_content, engine, deadline or Deadline(0))
+    usage.hold(html_content)
+
+    with stage_timer("template", "html"):
+        styled_html = render_styled_html(html_content)
+    if assets is not None:
+        with stage_timer("images", "html"):
+            styled_html = assets.inline_images(styled_html)
+    usage.hold(styled_html)
+    encoded = styled_html.encode("utf-8")
+    usage.hold(encoded)
+    render_cache.put(cache_key, encoded)
+    return styled_html
 
 
-def convert_markdown_to_html(md_content: str) -> str:
-    """Converts Markdown content to HTML using pypandoc."""
-    html_content = pypandoc.convert_text(
-        md_content, "html", format="markdown", extra_args=["--standalone"]
-    )
+def _markdown_to_html(md_content: str, engine: str, deadline: Deadline) -> str:
+    with deadline.stage(engine) as budget:
+        try:
+            html_content = markdown_to_html(md_content, engine, budget)
+        except PandocTimeout:
+            raise DeadlineExceeded(engine, budget) from None
+    # python-markdown cannot be interrupted, so only find out afterwards
+    deadline.check(engine)
+    return html_content
+
+
+async def encode_body(body: bytes, cache_key: str, encoding: Optional[str]) -> bytes:
+    """``body`` in the negotiated content coding; compressed copies are cached beside the output."""
+    if encoding is None:
+        return body
+    compressed_key = f"{cache_key}.{encoding}"
+    compressed = await render_cache.get_async(compressed_key)
+    if compressed is None:
+        with stage_timer("compress", "html"):
+            compressed = await asyncio.to_thread(compress, body, encoding)
+        await render_cache.put_async(compressed_key, compressed)
+    return compressed
+
+
+async def optimized_pdf(
+    render: Callable[[], AsyncIterator[bytes]],
+    cache_key: str,
+    profile: str,
+    usage: BufferUsage,
+    deadline: Optional[Deadline] = None,
+) -> Tuple[bytes, int, Optional[float], Optional[str]]:
+    """The PDF from ``render()`` shrunk with an optimization profile, cached beside the render.
+
+    Returns the optimized PDF, the size of the render, the seconds the
+    optimizer took, which is None when the result came from the cache, and
+    why optimization was skipped. When the optimizer fails, the render
+    comes back as it is with the error as that reason.
+    """
+    deadline = deadline or Deadline(0)
+    optimized_key = f"{cache_key}.{profile}"
+    size_key = f"{optimized_key}.size"
+    with stage_timer("cache_lookup", "pdf"):
+        optimized = await render_cache.get_async(optimized_key)
+        original_size = await render_cache.get_async(size_key)
+    if optimized is not None and original_size is not None:
+        usage.hold(optimized)
+        return optimized, int(original_size), None, None
+
+    pdf_bytes = b"".join([chunk async for chunk in render()])
+    usage.hold(pdf_bytes)
+
+    async def optimize() -> Tuple[bytes, float]:
+        started = time.perf_counter()
+        with stage_timer("optimize", "pdf"):
+            result = await asyncio.to_thread(optimize_pdf, pdf_bytes, profile)
+        await render_cache.put_async(optimized_key, result)
+        await render_cache.put_async(size_key, str(len(pdf_bytes)).encode("ascii"))
+        # Linearizing can add a little to a file there was nothing to take out of
+        PDF_OPTIMIZE_SAVED.inc(max(0, len(pdf_bytes) - len(result)), profile=profile)
+        return result, time.perf_counter() - started
 
-    styled_html = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+SC&family=Noto+Color+Emoji&display=swap');
-            body {{
-                font-family: 'Noto Sans SC', 'Noto Color Emoji', Arial, sans-serif;
-                margin: 40px;
-                line-height: 1.6;
-            }}
-            h1, h2, h3 {{ color: #333; }}
-            code {{ background-color: #f5f5f5; padding: 2px 4px; border-radius: 3px; }}
-            pre {{ background-color: #f5f5f5; padding: 10px; border-radius: 5px; overflow-x: auto; }}
-            blockquote {{ border-left: 4px solid #ddd; padding-left: 20px; color: #555; }}
-            img {{ max-width: 100%; }}
-            table {{ border-collapse: collapse; width: 100%; margin: 15px 0; }}
-            th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-            th {{ background-color: #f2f2f2; }}
-            tr:nth-child(even) {{ background-color: #f9f9f9; }}
-        </style>
-    </head>
-    <body>
-        {html_content}
-    </body>
-    </html>
+    try:
+        optimized, seconds = await deadline.run("optimize", single_flight.do(optimized_key, optimize, "pdf"))
+    except OptimizeError as e:
+        # The render itself is fine, so it is sent unoptimized rather than failing the request
+        print(f"Skipping {profile} optimization: {e}", file=sys.stderr)
+        return pdf_bytes, len(pdf_bytes), None, str(e)
+    usage.hold(optimized)
+    return optimized, len(pdf_bytes), seconds, None
+
+
+async def _observe_peak(
+    chunks: AsyncIterator[bytes], usage: BufferUsage, output_format: str, sent: Optional[ExitStack] = None
+) -> AsyncIterator[bytes]:
+    """Passes ``chunks`` through and records the request's peak buffer size once they are sent.
+
+    ``sent`` is closed then too. Closing it twice is harmless, so the
+    response can close it as well in case the stream never starts.
     """
-    return styled_html
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        REQUEST_PEAK_BYTES.observe(usage.peak, format=output_format)
+        if sent is not None:
+            sent.close()
 
 
-def convert_markdown_to_pdf_sync(md_content: str) -> str:
-    """Converts Markdown content to PDF using Playwright synchronously."""
-    import os
-    import tempfile
-    from playwright.sync_api import sync_playwright
+async def _join(chunks: AsyncIterator[bytes]) -> bytes:
+    return b"".join([chunk async for chunk in chunks])
 
-    with tempfile.TemporaryDirectory() as temp_dir:
-        html_path = os.path.join(temp_dir, "temp.html")
-        pdf_path = os.path.join(temp_dir, "output.pdf")
 
-        html_content = pypandoc.convert_text(
-            md_content,
-            "html",
-            format="markdown",
-            extra_args=["--standalone"],
-        )
+def client_id(request: Request) -> str:
+    """Identifies the client a render is scheduled for: its CLIENT_ID_HEADER, else its address."""
+    client = request.headers.get(CLIENT_ID_HEADER)
+    if client:
+        return client
+    return request.client.host if request.client else ""
 
-        styled_html = f"""
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <meta charset="UTF-8">
-            <style>
-                @import url('https://fonts.googleapis.com/css2?family=Noto+Sans+SC&family=Noto+Color+Emoji&display=swap');
-                body {{
-                    font-family: 'Noto Sans SC', 'Noto Color Emoji', Arial, sans-serif;
-                    margin: 40px;
-                    line-height: 1.6;
-                }}
-                h1, h2, h3 {{ color: #333; }}
-                code {{ background-color: #f5f5f5; padding: 2px 4px; border-radius: 3px; }}
-                pre {{ background-color: #f5f5f5; padding: 10px; border-radius: 5px; overflow-x: auto; }}
-                blockquote {{ border-left: 4px solid #ddd; padding-left: 20px; color: #555; }}
-                img {{ max-width: 100%; }}
-                table {{ border-collapse: collapse; width: 100%; margin: 15px 0; }}
-                th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                th {{ background-color: #f2f2f2; }}
-                tr:nth-child(even) {{ background-color: #f9f9f9; }}
-            </style>
-        </head>
-        <body>
-            {html_content}
-        </body>
-        </html>
-        """
-
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(styled_html)
-
-        with sync_playwright() as p:
-            browser = p.chromium.launch()
-            page = browser.new_page()
-            page.goto(f"file://{os.path.abspath(html_path)}")
-            page.wait_for_load_state("networkidle")
-            page.pdf(
-                path=pdf_path,
-                format="A4",
-                margin={
-                    "top": "1cm",
-                    "right": "1cm",
-                    "bottom": "1cm",
-                    "left": "1cm",
-                },
-            )
-            browser.close()
-        return pdf_path
+
+def attachment_headers(filename: str) -> dict:
+    """Builds a Content-Disposition header, RFC 5987-encoding non-ASCII names."""
+    quoted = quote(filename)
+    if quoted != filename:
+        return {"Content-Disposition": f"attachment; filename*=utf-8''{quoted}"}
+    return {"Content-Disposition": f'attachment; filename="{filename}"'}
 
 
 @app.post("/convert")
@@ -196,59 +547,455 @@ async def convert(
     request: Request,
     file: UploadFile = File(...),
     output_format: str = Form(...),
+    optimize: Optional[str] = Form(None),
+    engine: Optional[str] = Form(None),
 ):
-    """Converts the uploaded Markdown file to the specified format."""
+    """Converts the uploaded Markdown file to the specified format.
+
+    A .zip upload carries the Markdown together with the images and other
+    files it references, which the page then loads from the upload.
+
+    The X-Peak-Buffer-Bytes response header reports the most memory the
+    request's buffers held at once up to the point the response started.
+    Responses carry a strong ETag derived from the upload and the render
+    options; a matching If-None-Match gets a 304 before any conversion
+    work. HTML is compressed as Accept-Encoding allows and PDFs support
+    single byte ranges.
+
+    ``optimize`` names one of the PDF optimization profiles: screen, print
+    or archive. The PDF is then shrunk before it is sent, and the
+    X-PDF-Original-Bytes and X-PDF-Optimized-Bytes headers and the
+    "optimize" Server-Timing entry report what the stage did. If the
+    optimizer fails, the unoptimized PDF is sent with the error in an
+    X-PDF-Optimize-Skipped header.
+
+    ``engine`` picks the Markdown converter: "markdown" (python-markdown,
+    in process), "pandoc" or "auto", which uses python-markdown unless the
+    document needs pandoc. MARKDOWN_ENGINE sets the default.
+
+    Once the upload is read the conversion has CONVERT_DEADLINE seconds,
+    split across its stages by CONVERT_STAGE_SHARES. A stage that runs out
+    is stopped, its pandoc process or page released, and the request gets
+    a 504 naming the stage in its body and X-Timeout-Stage header. A client
+    that disconnects before the response starts cancels the conversion.
+    """
+    engine = engine or DEFAULT_ENGINE
+    profile = optimize or None
+    error = options_error(output_format, engine, profile)
+    if error is not None:
+        return error
     try:
-        contents = await file.read()
-        md_content = contents.decode("utf-8")
-
-        if output_format == "html":
-            html_content = convert_markdown_to_html(md_content)
-            return HTMLResponse(content=html_content)
-        elif output_format == "pdf":
-            # Create a temporary file to pass the Markdown content to the subprocess
-            with tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".md") as temp_file:
-                temp_file.write(md_content)
-                temp_file_path = temp_file.name
-
+        with ExitStack() as request_scope:
+            request_scope.enter_context(in_flight(output_format))
             try:
-                # Run the synchronous PDF conversion in a separate process
-                result = subprocess.run(
-                    [
-                        sys.executable,  # Path to the current Python interpreter
-                        "pdf_converter.py",  # Script to run
-                        temp_file_path,  # Input Markdown file
-                    ],
-                    capture_output=True,
-                    text=True,
-                    check=True,
+                with stage_timer("upload_decode", output_format):
+                    md_content, assets, upload_size = await read_document(file)
+            except (BundleError, UnicodeDecodeError, UploadTooLarge) as e:
+                return upload_error(e)
+            BYTES_IN.inc(upload_size, format=output_format)
+            usage = BufferUsage()
+            usage.hold(md_content)
+            deadline = Deadline()
+
+            if output_format == "html":
+                encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+                cache_key = await asyncio.to_thread(
+                    make_cache_key, md_content, "html", render_options("html", assets, engine)
                 )
+                etag = etag_for(cache_key, encoding)
+                headers = {"Vary": "Accept-Encoding"}
+                if etag_matches(request.headers.get("if-none-match"), etag):
+                    return not_modified(etag, headers)
 
-                pdf_path = result.stdout.strip()
-
-                if not os.path.exists(pdf_path):
-                    raise Exception(f"PDF conversion failed: {result.stderr}")
-
-                return FileResponse(
-                    pdf_path,
-                    media_type="application/pdf",
-                    filename=file.filename.replace(".md", ".pdf"),
+                html_content = await unless_disconnected(
+                    request, render_markdown_to_html(md_content, usage, cache_key, assets, engine, deadline)
                 )
-
-            except subprocess.CalledProcessError as e:
-                return JSONResponse(
-                    {"error": f"PDF conversion failed: {e.stderr}"}, status_code=500
+                body = await encode_body(html_content.encode("utf-8"), cache_key, encoding)
+                usage.hold(body)
+                REQUEST_PEAK_BYTES.observe(usage.peak, format="html")
+                BYTES_OUT.inc(len(body), format="html")
+                headers["X-Peak-Buffer-Bytes"] = str(usage.peak)
+                if encoding is not None:
+                    headers["Content-Encoding"] = encoding
+                return conditional_response(request, body, OUTPUT_MEDIA_TYPES["html"], etag, headers)
+            elif output_format == "pdf":
+                if not PDF_ENABLED:
+                    return format_error(output_format)
+                cache_key = await asyncio.to_thread(
+                    make_cache_key, md_content, "pdf", render_options("pdf", assets, engine)
+                )
+                etag = etag_for(cache_key if profile is None else f"{cache_key}.{profile}")
+                if etag_matches(request.headers.get("if-none-match"), etag):
+                    return not_modified(etag)
+
+                timings = {}
+
+                def render() -> AsyncIterator[bytes]:
+                    return stream_markdown_to_pdf(
+                        md_content,
+                        request.app.state.browser_pool,
+                        timings,
+                        usage,
+                        request.app.state.render_scheduler,
+                        client_id(request),
+                        cache_key,
+                        assets,
+                        engine,
+                        deadline,
+                    )
+
+                try:
+                    if profile is None:
+                        pdf_stream = await unless_disconnected(request, prime_stream(render()))
+                    else:
+                        pdf_bytes, original_size, optimize_seconds, skipped = await unless_disconnected(
+                            request, optimized_pdf(render, cache_key, profile, usage, deadline)
+                        )
+                except (DeadlineExceeded, ClientDisconnected):
+                    raise
+                except (PoolBusyError, BrowserUnavailableError) as e:
+                    return JSONResponse({"error": str(e)}, status_code=503)
+                except RenderTimeoutError as e:
+                    return JSONResponse({"error": str(e)}, status_code=504)
+                except Exception as e:
+                    return JSONResponse(
+                        {"error": f"PDF conversion failed: {str(e)}"}, status_code=500
+                    )
+
+                headers = attachment_headers(os.path.splitext(file.filename)[0] + ".pdf")
+                headers["X-Peak-Buffer-Bytes"] = str(usage.peak)
+                server_timing = []
+                if "page_ready" in timings:
+                    server_timing.append(f"page-ready;dur={timings['page_ready']:.1f}")
+                if profile is not None:
+                    if skipped is not None:
+                        server_timing.append('optimize;desc="skipped";dur=0')
+                    elif optimize_seconds is None:
+                        server_timing.append('optimize;desc="cached";dur=0')
+                    else:
+                        server_timing.append(f"optimize;dur={optimize_seconds * 1000:.1f}")
+                if server_timing:
+                    headers["Server-Timing"] = ", ".join(server_timing)
+                if profile is not None:
+                    REQUEST_PEAK_BYTES.observe(usage.peak, format="pdf")
+                    headers["X-PDF-Optimize-Profile"] = profile
+                    headers["X-PDF-Original-Bytes"] = str(original_size)
+                    headers["X-PDF-Optimized-Bytes"] = str(len(pdf_bytes))
+                    if skipped is not None:
+                        # Header values are one line of Latin-1
+                        reason = " ".join(skipped.split())
+                        headers["X-PDF-Optimize-Skipped"] = reason.encode("latin-1", "replace").decode("latin-1")
+                        # The body is the plain render, so it must not carry the optimized copy's validator
+                        etag = etag_for(cache_key)
+                    return conditional_response(request, pdf_bytes, OUTPUT_MEDIA_TYPES["pdf"], etag, headers)
+                if "range" in request.headers:
+                    # A range needs the whole document; a resumed download is usually a cache hit
+                    pdf_bytes = await unless_disconnected(request, _join(_observe_peak(pdf_stream, usage, "pdf")))
+                    return conditional_response(request, pdf_bytes, OUTPUT_MEDIA_TYPES["pdf"], etag, headers)
+                headers.update({"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"})
+                # The request stays in flight until the PDF has been sent, not just until the response starts
+                sent = request_scope.pop_all()
+                return StreamingResponse(
+                    _observe_peak(pdf_stream, usage, "pdf", sent),
+                    media_type="application/pdf",
+                    headers=headers,
+                    background=BackgroundTask(sent.close),
                 )
-            finally:
-                # Clean up the temporary file
-                os.remove(temp_file_path)
 
-        else:
-            return JSONResponse({"error": "Invalid output format"}, status_code=400)
+            else:
+                return JSONResponse({"error": "Invalid output format"}, status_code=400)
+    except DeadlineExceeded as e:
+        CANCELLED.inc(format=output_format, reason="deadline")
+        return JSONResponse(
+            {"error": str(e), "stage": e.stage}, status_code=504, headers={"X-Timeout-Stage": e.stage}
+        )
+    except ClientDisconnected as e:
+        CANCELLED.inc(format=output_format, reason="disconnect")
+        # Nobody reads this; nginx's "client closed request" status marks it in access logs
+        return JSONResponse({"error": str(e)}, status_code=499)
     except Exception as e:
         return JSONResponse({"error": str(e)}, status_code=500)
 
 
+OUTPUT_MEDIA_TYPES = {"html": "text/html; charset=utf-8", "pdf": "application/pdf"}
+
+
+async def read_document(file: UploadFile) -> Tuple[str, Optional[AssetBundle], int]:
+    """Reads an uploaded .md file, or the main document and assets of a .zip bundle.
+
+    Returns the Markdown, the bundle (None for a plain file) and the upload's size.
+    """
+    if is_bundle(file.filename):
+        return await asyncio.to_thread(read_bundle, file.file)
+    md_content, upload_size = await read_upload_text(file)
+    return md_content, None, upload_size
+
+
+def upload_error(error: Exception) -> JSONResponse:
+    """The response for an upload read_document could not read."""
+    if isinstance(error, UploadTooLarge):
+        return JSONResponse({"error": str(error)}, status_code=413)
+    if isinstance(error, UnicodeDecodeError):
+        return JSONResponse(
+            {"error": f"Encoding error: {str(error)}.  Please ensure the file is UTF-8 encoded."},
+            status_code=400,
+        )
+    return JSONResponse({"error": str(error)}, status_code=400)
+
+
+def options_error(output_format: str, engine: str, profile: Optional[str]) -> Optional[JSONResponse]:
+    """The 400 response for an unknown engine or optimization profile, if there is one."""
+    if engine not in ENGINES:
+        return JSONResponse({"error": f"Unknown engine; use one of {', '.join(ENGINES)}"}, status_code=400)
+    if profile is not None:
+        if profile not in PROFILES:
+            return JSONResponse(
+                {"error": f"Unknown optimization profile; use one of {', '.join(PROFILES)}"}, status_code=400
+            )
+        if output_format != "pdf":
+            return JSONResponse({"error": "Optimization only applies to PDF output"}, status_code=400)
+    return None
+
+
+def format_error(output_format: str) -> Optional[JSONResponse]:
+    """The 400 response for an output format this instance cannot produce, if it is one."""
+    if output_format not in OUTPUT_MEDIA_TYPES:
+        return JSONResponse({"error": "Invalid output format"}, status_code=400)
+    if output_format == "pdf" and not PDF_ENABLED:
+        return JSONResponse({"error": "PDF output is not enabled on this instance"}, status_code=400)
+    return None
+
+
+BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", "4"))
+
+
+@app.post("/convert/bulk")
+async def convert_bulk(
+    request: Request,
+    output_format: str = Form(...),
+    archive: Optional[UploadFile] = File(None),
+    files: Optional[List[UploadFile]] = File(None),
+):
+    """Converts a zip/tar of Markdown files (or many uploaded files) and streams back a zip.
+
+    Results are written to the zip as each conversion finishes. The archive
+    ends with manifest.json listing every input with its output or error.
+    """
+    error = format_error(output_format)
+    if error is not None:
+        return error
+    try:
+        entries = []
+        if archive is not None:
+            entries.extend(await asyncio.to_thread(read_archive, archive.file))
+        for upload in files or []:
+            entries.append((safe_name(upload.filename), await upload.read()))
+    except ArchiveError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if not entries:
+        return JSONResponse({"error": "No Markdown files uploaded"}, status_code=400)
+
+    pool = request.app.state.browser_pool
+    scheduler = request.app.state.render_scheduler
+    client = client_id(request)
+    limit = asyncio.Semaphore(BULK_CONCURRENCY)
+
+    async def convert_entry(data: bytes) -> bytes:
+        async with limit:
+            md_content = data.decode("utf-8")
+            if output_format == "pdf":
+                return await convert_markdown_to_pdf(md_content, pool, scheduler=scheduler, client=client)
+            html_content = await render_markdown_to_html(md_content)
+            return html_content.encode("utf-8")
+
+    async def zip_body() -> AsyncIterator[bytes]:
+        writer = StreamingZipWriter()
+        tasks = {asyncio.create_task(convert_entry(data)): name for name, data in entries}
+        entries.clear()
+        manifest = []
+        used_names = set()
+        try:
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    name = tasks[task]
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        manifest.append({"file": name, "status": "error", "error": str(e)})
+                        continue
+
+                    target = output_name(name, output_format)
+                    stem, suffix = os.path.splitext(target)
+                    counter = 1
+                    while target in used_names:
+                        counter += 1
+                        target = f"{stem}-{counter}{suffix}"
+                    used_names.add(target)
+
+                    # PDFs are already compressed; deflating them again only costs CPU
+                    yield await asyncio.to_thread(
+                        writer.add, target, result, output_format != "pdf"
+                    )
+                    manifest.append(
+                        {"file": name, "status": "ok", "output": target, "bytes": len(result)}
+                    )
+
+            failed = sum(1 for item in manifest if item["status"] == "error")
+            yield writer.add_json(
+                "manifest.json",
+                {
+                    "output_format": output_format,
+                    "succeeded": len(manifest) - failed,
+                    "failed": failed,
+                    "files": manifest,
+                },
+            )
+            yield writer.close()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        zip_body(),
+        media_type="application/zip",
+        headers=attachment_headers(f"converted-{output_format}.zip"),
+    )
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(
+    request: Request,
+    file: UploadFile = File(...),
+    output_format: str = Form(...),
+    optimize: Optional[str] = Form(None),
+    engine: Optional[str] = Form(None),
+):
+    """Queues a conversion and returns its job id without waiting for the result.
+
+    Takes the same form as /convert: a .md file or .zip bundle, the output
+    format, and optionally the Markdown ``engine`` and an ``optimize`` profile.
+    """
+    engine = engine or DEFAULT_ENGINE
+    profile = optimize or None
+    error = format_error(output_format) or options_error(output_format, engine, profile)
+    if error is not None:
+        return error
+    try:
+        md_content, assets, _ = await read_document(file)
+    except (BundleError, UnicodeDecodeError, UploadTooLarge) as e:
+        return upload_error(e)
+
+    pool = request.app.state.browser_pool
+    scheduler = request.app.state.render_scheduler
+    client = client_id(request)
+    cache_key = await asyncio.to_thread(
+        make_cache_key, md_content, output_format, render_options(output_format, assets, engine)
+    )
+
+    def render() -> AsyncIterator[bytes]:
+        return stream_markdown_to_pdf(
+            md_content, pool, scheduler=scheduler, client=client, cache_key=cache_key, assets=assets,
+            engine=engine,
+        )
+
+    async def run():
+        if output_format == "pdf":
+            if profile is None:
+                pdf_bytes = await _join(render())
+            else:
+                pdf_bytes, _, _, skipped = await optimized_pdf(render, cache_key, profile, BufferUsage())
+                if skipped is not None:
+                    # The result is the plain render; its ETag has to say so
+                    job.cache_key = cache_key
+            return pdf_bytes, OUTPUT_MEDIA_TYPES["pdf"]
+        html_content = await render_markdown_to_html(
+            md_content, cache_key=cache_key, assets=assets, engine=engine
+        )
+        return html_content.encode("utf-8"), OUTPUT_MEDIA_TYPES["html"]
+
+    filename = os.path.splitext(file.filename)[0] + "." + output_format
+    result_key = cache_key if profile is None else f"{cache_key}.{profile}"
+    try:
+        job = request.app.state.job_scheduler.submit(run, filename, result_key)
+    except QueueFullError as e:
+        status_code = 429 if request.app.state.job_scheduler.running else 503
+        return JSONResponse(
+            {"error": str(e)},
+            status_code=status_code,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return {**job.to_dict(), "status_url": f"/jobs/{job.id}", "result_url": f"/jobs/{job.id}/result"}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(request: Request, job_id: str):
+    """Reports the status of a submitted job."""
+    job = request.app.state.job_scheduler.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found or expired"}, status_code=404)
+    return job.to_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(request: Request, job_id: str):
+    """Returns the output of a finished job, with the same validators and ranges as /convert."""
+    job = request.app.state.job_scheduler.get(job_id)
+    if job is None:
+        return JSONResponse({"error": "Job not found or expired"}, status_code=404)
+    if job.status == "failed":
+        return JSONResponse({"error": job.error, "status": job.status}, status_code=500)
+    if job.status != "done":
+        return JSONResponse(
+            {"error": "Job has not finished", "status": job.status},
+            status_code=409,
+            headers={"Retry-After": str(request.app.state.job_scheduler.retry_after())},
+        )
+    headers = attachment_headers(job.filename)
+    body, encoding = job.result, None
+    if job.media_type == OUTPUT_MEDIA_TYPES["html"]:
+        headers["Vary"] = "Accept-Encoding"
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding is not None:
+            body = await encode_body(body, job.cache_key, encoding)
+            headers["Content-Encoding"] = encoding
+    return conditional_response(request, body, job.media_type, etag_for(job.cache_key, encoding), headers)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Exposes pipeline metrics in the Prometheus text format.
+
+    Under serve.py every worker publishes to METRICS_DIR, and the response
+    sums all of them into one view of the host.
+    """
+    if METRICS_DIR:
+        body = await asyncio.to_thread(REGISTRY.render_aggregated, METRICS_DIR)
+    else:
+        body = REGISTRY.render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/healthz")
+async def healthz():
+    """Liveness probe: the process is up and its event loop is responding."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+async def readyz(request: Request):
+    """Readiness probe: 200 once warm-up has finished, 503 before then, after a failed step or while shutting down."""
+    warmup = request.app.state.warmup
+    return JSONResponse(warmup.report(), status_code=200 if warmup.ready else 503)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Reports render cache hit, miss and eviction counters, and the image cache's under "images"."""
+    return {**render_cache.stats(), "images": image_cache.stats()}
+
+
 @app.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Serves the HTML form."""
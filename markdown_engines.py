@@ -0,0 +1,118 @@
+import os
+import re
+import threading
+from typing import Optional, Tuple
+
+import pandoc_worker
+
+MARKDOWN = "markdown"
+PANDOC = "pandoc"
+AUTO = "auto"
+ENGINES = (AUTO, MARKDOWN, PANDOC)
+# Engine used when a request does not name one
+DEFAULT_ENGINE = os.environ.get("MARKDOWN_ENGINE", AUTO)
+
+# python-markdown set up to match what pandoc's Markdown does with the same basic syntax
+MARKDOWN_EXTENSIONS = ["extra", "smarty", "toc"]
+
+# Syntax python-markdown renders differently from pandoc, or not at all. A
+# false positive only costs the pandoc round trip, so the patterns err that way.
+PANDOC_FEATURES = (
+    ("metadata", re.compile(r"\A(?:---[ \t]*\n|%)")),
+    ("math", re.compile(r"\$\$|(?<![\\$\w])\$[^\s$](?:[^$\n]*[^\s$\\])?\$(?!\d)|\\\(|\\\[|\\begin\{")),
+    ("citation", re.compile(r"(?<![\w.<])@[A-Za-z_][\w:.#$%&+?<>~/-]*")),
+    ("footnote", re.compile(r"\[\^[^\]\n]+\]|\^\[")),
+    ("definition_list", re.compile(r"^[ ]{0,3}[:~][ \t]+\S", re.MULTILINE)),
+    ("attributes", re.compile(r"\{[ \t]*[:#.=][^}\n]*\}|\{[^}\n]*=[^}\n]*\}")),
+    ("highlighted_code", re.compile(r"^[ ]{0,3}(?:`{3,}|~{3,})[ \t]*[\w{.]", re.MULTILINE)),
+    ("strikeout_or_scripts", re.compile(r"~~|\^[^\s^]+\^|(?<!~)~[^\s~]+~(?!~)")),
+    ("task_list", re.compile(r"^[ \t]*[-*+][ \t]+\[[ xX]\]", re.MULTILINE)),
+    ("fancy_list", re.compile(r"^[ ]{0,3}(?:(?:[A-Za-z]|[ivxlcdmIVXLCDM]+|#)[.)]|\(?\d+\))[ \t]", re.MULTILINE)),
+    ("nested_list", re.compile(r"^[ ]{1,3}(?:[-*+]|\d+\.)[ \t]", re.MULTILINE)),
+    ("grid_or_simple_table", re.compile(r"^(?:\+[-=:+]+\+|[ ]{0,3}-{3,}(?:[ ]+-{3,})+)[ \t]*$", re.MULTILINE)),
+    ("table_caption", re.compile(r"^[ ]{0,3}Table:", re.MULTILINE)),
+    ("fenced_div", re.compile(r"^:::", re.MULTILINE)),
+    ("standalone_image", re.compile(r"(?:\A|\n[ \t]*\n)[ ]{0,3}!\[[^\]\n]*\]\([^)\n]*\)[ \t]*(?:\n[ \t]*\n|\n?\Z)")),
+    ("html_block", re.compile(r"^[ ]{0,3}<[A-Za-z][\w-]*[\s/>]", re.MULTILINE)),
+    ("email_link", re.compile(r"<[^\s<>@]+@[^\s<>@]+>")),
+    ("abbreviation", re.compile(r"^\*\[[^\]\n]+\]:", re.MULTILINE)),
+    ("escaped_line_break", re.compile(r"\\\n")),
+    ("block_without_blank_line", re.compile(r"^[ \t]*[^\s#>][^\n]*\n[ ]{0,3}(?:#{1,6}[ \t]|>)", re.MULTILINE)),
+)
+_ATX_HEADING_RE = re.compile(r"^[ ]{0,3}#{1,6}[ \t]+(.*?)[ \t#]*$", re.MULTILINE)
+
+_local = threading.local()
+
+
+def pandoc_slug(value: str, separator: str = "-") -> str:
+    """Pandoc's auto_identifiers algorithm, for python-markdown's toc extension."""
+    value = re.sub(r"[^\w\s.-]", "", value)
+    value = re.sub(r"\s+", separator, value.strip()).lower()
+    value = re.sub(r"^[\W\d_]+", "", value)
+    return value or "section"
+
+
+def _has_duplicate_headings(md_content: str) -> bool:
+    # The engines number repeated heading ids differently
+    slugs = [pandoc_slug(title) for title in _ATX_HEADING_RE.findall(md_content)]
+    return len(slugs) != len(set(slugs))
+
+
+def choose_engine(md_content: str, engine: str = DEFAULT_ENGINE) -> Tuple[str, str]:
+    """Resolves ``engine`` for a document, returning the engine and why it was picked.
+
+    "auto" scans the document for syntax only pandoc renders faithfully and
+    picks the in-process python-markdown engine when it finds none.
+    """
+    if engine != AUTO:
+        return engine, "requested"
+    for name, pattern in PANDOC_FEATURES:
+        if pattern.search(md_content):
+            return PANDOC, name
+    if _has_duplicate_headings(md_content):
+        return PANDOC, "duplicate_headings"
+    return MARKDOWN, "basic_syntax"
+
+
+def _markdown():
+    # Building the extension set costs more than small documents take to convert
+    converter = getattr(_local, "markdown", None)
+    if converter is None:
+        from markdown import Markdown
+
+        converter = _local.markdown = Markdown(
+            extensions=MARKDOWN_EXTENSIONS,
+            extension_configs={"toc": {"marker": "", "slugify": pandoc_slug}},
+        )
+    return converter
+
+
+def markdown_to_html(md_content: str, engine: str = DEFAULT_ENGINE, timeout: Optional[float] = None) -> str:
+    """Converts Markdown to HTML with ``engine``: "markdown", "pandoc" or "auto".
+
+    ``timeout`` kills pandoc when it runs longer (see pandoc_worker);
+    python-markdown runs in this process and always finishes.
+    """
+    engine, _ = choose_engine(md_content, engine)
+    if engine == MARKDOWN:
+        converter = _markdown()
+        try:
+            return converter.convert(md_content)
+        finally:
+            converter.reset()
+    # A fragment like python-markdown's: a standalone document would bring pandoc's own <style> into the page
+    return pandoc_worker.convert_text(md_content, "html", format="markdown", timeout=timeout)
+
+
+def engine_options(engine: str = DEFAULT_ENGINE) -> dict:
+    """What an engine setting changes about the output, for cache keys."""
+    options = {"engine": engine}
+    if engine == AUTO:
+        options["features"] = [name for name, _ in PANDOC_FEATURES]
+    if engine != MARKDOWN:
+        options["pandoc_output"] = "fragment"
+    if engine != PANDOC:
+        from markdown import __version__
+
+        options.update({"markdown": __version__, "extensions": MARKDOWN_EXTENSIONS})
+    return options
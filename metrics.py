@@ -0,0 +1,380 @@
+import os
+import glob
+import json
+import time
+import bisect
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # exited workers' snapshots are kept as they are
+    fcntl = None
+
+# Stage latencies span sub-millisecond cache hits to multi-minute prints
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# Shared directory where each worker process publishes its samples; unset for one process
+METRICS_DIR = os.environ.get("METRICS_DIR") or None
+METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))
+# Counter and histogram totals of exited workers, merged into one file so the directory stops growing
+RETIRED_SNAPSHOT = "retired.json"
+
+# Powers of four from 64 KiB to 1 GiB
+BYTE_BUCKETS = tuple(64 * 1024 * 4 ** power for power in range(8))
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> Iterator[Tuple[str, str, float]]:
+        raise NotImplementedError
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}"
+
+    def render(self) -> str:
+        lines = [self.header()]
+        lines.extend(f"{name}{labels} {_format_value(value)}" for name, labels, value in self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+        self._callbacks: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def track(self, func: Callable[[], float], **labels) -> None:
+        """Reads the gauge value from ``func`` at scrape time."""
+        with self._lock:
+            self._callbacks[self._key(labels)] = func
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+            callbacks = dict(self._callbacks)
+        for key, func in callbacks.items():
+            try:
+                values[key] = func()
+            except Exception:
+                continue
+        for key, value in sorted(values.items()):
+            yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: per-bucket (non-cumulative) counts plus +Inf, then sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][index] += 1
+            entry[1][0] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total[0]) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                yield self.name + "_bucket", _format_labels(self.labelnames, key, le), cumulative
+            yield self.name + "_sum", _format_labels(self.labelnames, key), total
+            yield self.name + "_count", _format_labels(self.labelnames, key), cumulative
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics) + "\n"
+
+    def write_snapshot(self, directory: str) -> None:
+        """Publishes this process's samples as ``<pid>.json`` in ``directory``."""
+        snapshot = {metric.name: list(metric.samples()) for metric in self._metrics}
+        _write_json(os.path.join(directory, f"{os.getpid()}.json"), snapshot)
+
+    def render_aggregated(self, directory: str) -> str:
+        """Renders the sum of the snapshots every worker published in ``directory``.
+
+        Counters and histograms of workers that have exited still count, so
+        totals never go backwards; their gauges are dropped. Their snapshots
+        are folded into RETIRED_SNAPSHOT, so restarts do not leave a file
+        behind for every scrape to read.
+        """
+        self.write_snapshot(directory)
+        kinds = {metric.name: metric.kind for metric in self._metrics}
+        snapshots = []
+        # Reading under the lock keeps a concurrent scrape from folding a file in between the reads
+        with _snapshots_locked(directory):
+            if fcntl is not None:
+                _retire_snapshots(directory, kinds)
+            for path in sorted(glob.glob(os.path.join(directory, "*.json"))):
+                pid = _snapshot_pid(path)
+                try:
+                    with open(path) as f:
+                        snapshots.append((pid is None or _process_alive(pid), json.load(f)))
+                except (OSError, ValueError):
+                    continue
+        totals: Dict[str, Dict[Tuple[str, str], float]] = {metric.name: {} for metric in self._metrics}
+        for alive, snapshot in snapshots:
+            for name, samples in snapshot.items():
+                if name not in totals or (kinds[name] == "gauge" and not alive):
+                    continue
+                for sample, labels, value in samples:
+                    key = (sample, labels)
+                    totals[name][key] = totals[name].get(key, 0) + value
+
+        blocks = []
+        for metric in self._metrics:
+            lines = [metric.header()]
+            lines.extend(
+                f"{sample}{labels} {_format_value(value)}"
+                for (sample, labels), value in totals[metric.name].items()
+            )
+            blocks.append("\n".join(lines))
+        return "\n".join(blocks) + "\n"
+
+
+def _write_json(path: str, data) -> None:
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(temp_path, path)
+
+
+def _snapshot_pid(path: str) -> Optional[int]:
+    """The worker a snapshot belongs to; None for RETIRED_SNAPSHOT."""
+    try:
+        return int(os.path.basename(path)[:-len(".json")])
+    except ValueError:
+        return None
+
+
+@contextmanager
+def _snapshots_locked(directory: str):
+    """Holds the snapshot directory's lock; a no-op where ``fcntl`` is unavailable."""
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(directory, ".lock"), "w") as lock:
+        # Workers scrape concurrently; only one may move a snapshot, or it would be counted twice
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+
+def _retire_snapshots(directory: str, kinds: Dict[str, str]) -> None:
+    """Adds the counters and histograms of exited workers to RETIRED_SNAPSHOT and removes their files.
+
+    The caller holds :func:`_snapshots_locked`.
+    """
+    exited = [
+        path for path in glob.glob(os.path.join(directory, "*.json"))
+        if _snapshot_pid(path) is not None and not _process_alive(_snapshot_pid(path))
+    ]
+    if not exited:
+        return
+    retired_path = os.path.join(directory, RETIRED_SNAPSHOT)
+    totals: Dict[str, Dict[Tuple[str, str], float]] = {}
+    for path in [retired_path] + exited:
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, samples in snapshot.items():
+            if kinds.get(name) == "gauge":
+                continue
+            merged = totals.setdefault(name, {})
+            for sample, labels, value in samples:
+                merged[(sample, labels)] = merged.get((sample, labels), 0) + value
+    _write_json(retired_path, {
+        name: [[sample, labels, value] for (sample, labels), value in merged.items()]
+        for name, merged in totals.items()
+    })
+    for path in exited:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "md_convert_stage_seconds",
+    "Time spent in each conversion stage.",
+    ("stage", "format"),
+))
+REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "md_convert_requests_in_flight",
+    "Conversion requests currently being handled.",
+    ("format",),
+))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "md_convert_queue_depth",
+    "Work waiting for a worker or browser slot.",
+    ("queue",),
+))
+BYTES_IN = REGISTRY.register(Counter(
+    "md_convert_bytes_in_total",
+    "Markdown bytes received for conversion.",
+    ("format",),
+))
+BYTES_OUT = REGISTRY.register(Counter(
+    "md_convert_bytes_out_total",
+    "Converted bytes produced.",
+    ("format",),
+))
+REQUEST_PEAK_BYTES = REGISTRY.register(Histogram(
+    "md_convert_request_peak_buffer_bytes",
+    "Largest total of pipeline buffers a request held at once.",
+    ("format",),
+    buckets=BYTE_BUCKETS,
+))
+BROWSER_RECYCLES = REGISTRY.register(Counter(
+    "md_convert_browser_recycles_total",
+    "Browsers replaced with a fresh launch, by reason.",
+    ("reason",),
+))
+COALESCED = REGISTRY.register(Counter(
+    "md_convert_coalesced_requests_total",
+    "Requests served by joining an identical conversion already in flight.",
+    ("format",),
+))
+PDF_OPTIMIZE_SAVED = REGISTRY.register(Counter(
+    "md_convert_pdf_optimize_saved_bytes_total",
+    "Bytes the PDF optimizer removed from renders, by profile.",
+    ("profile",),
+))
+ENGINE_CHOICES = REGISTRY.register(Counter(
+    "md_convert_markdown_engine_total",
+    "Documents converted by each Markdown engine, with the reason it was picked.",
+    ("engine", "reason", "format"),
+))
+CANCELLED = REGISTRY.register(Counter(
+    "md_convert_cancelled_requests_total",
+    "Conversions abandoned because they ran out of time or their client went away.",
+    ("format", "reason"),
+))
+ERRORS = REGISTRY.register(Counter(
+    "md_convert_errors_total",
+    "Conversion failures by the stage they happened in.",
+    ("stage",),
+))
+
+
+def observe_stage(stage: str, output_format: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage, format=output_format)
+
+
+@contextmanager
+def stage_timer(stage: str, output_format: str):
+    """Times a block as one pipeline stage and counts it as an error if it raises."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERRORS.inc(stage=stage)
+        raise
+    finally:
+        observe_stage(stage, output_format, time.perf_counter() - started)
+
+
+@contextmanager
+def in_flight(output_format: str):
+    REQUESTS_IN_FLIGHT.inc(format=output_format)
+    try:
+        yield
+    finally:
+        REQUESTS_IN_FLIGHT.dec(format=output_format)
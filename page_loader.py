@@ -0,0 +1,141 @@
+import os
+import time
+import asyncio
+from typing import Optional
+from urllib.parse import quote, unquote, urlparse
+
+# "ready" waits for fonts and decoded images; "load" and "networkidle" use Playwright's states
+WAIT_STRATEGIES = ("ready", "load", "networkidle")
+DEFAULT_WAIT_STRATEGY = os.environ.get("RENDER_WAIT_STRATEGY", "ready")
+DEFAULT_WAIT_TIMEOUT_MS = float(os.environ.get("RENDER_WAIT_TIMEOUT_MS", "30000"))
+# Optional JavaScript expression awaited after fonts and images, e.g. "window.mermaidReady"
+DEFAULT_READY_HOOK = os.environ.get("RENDER_READY_HOOK") or None
+
+# Pages are loaded with set_content, so relative resources are served from this origin
+LOCAL_ORIGIN = "http://markdown-convert.local/"
+
+_READY_SCRIPT = """
+async ([hook, timeoutMs]) => {
+    const ready = (async () => {
+        // Force layout so every font the document needs has been requested
+        document.body && document.body.getBoundingClientRect();
+        await document.fonts.ready;
+        await Promise.all(Array.from(document.images, (img) => img.decode().catch(() => {})));
+        if (hook) {
+            await (0, eval)(hook);
+        }
+    })();
+    const timeout = new Promise((_, reject) => setTimeout(
+        () => reject(new Error(`Page not ready after ${timeoutMs} ms`)), timeoutMs));
+    await Promise.race([ready, timeout]);
+}
+"""
+
+
+def _with_base(html: str, href: str = LOCAL_ORIGIN) -> str:
+    base = f'<base href="{href}">'
+    if "<head>" in html:
+        return html.replace("<head>", "<head>" + base, 1)
+    return base + html
+
+
+def _local_file(base_dir: str, url: str) -> Optional[str]:
+    root = os.path.realpath(base_dir)
+    path = os.path.realpath(os.path.join(root, unquote(urlparse(url).path).lstrip("/")))
+    if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+        return None
+    return path
+
+
+def _url_path(url: str) -> str:
+    return unquote(urlparse(url).path).lstrip("/")
+
+
+def _remaining(started: float, timeout_ms: float) -> float:
+    return max(timeout_ms - (time.monotonic() - started) * 1000, 1)
+
+
+def _check_strategy(strategy: str) -> None:
+    if strategy not in WAIT_STRATEGIES:
+        raise ValueError(f"Unknown wait strategy {strategy!r}, expected one of {WAIT_STRATEGIES}")
+
+
+async def load_page(
+    page,
+    html: str,
+    base_dir: Optional[str] = None,
+    strategy: str = DEFAULT_WAIT_STRATEGY,
+    timeout_ms: float = DEFAULT_WAIT_TIMEOUT_MS,
+    ready_hook: Optional[str] = DEFAULT_READY_HOOK,
+    assets=None,
+) -> float:
+    """Sets ``html`` as the page content and waits until it is printable.
+
+    Relative URLs resolve against ``base_dir`` when given, or are served
+    from an uploaded ``assets`` bundle. Returns the time spent loading and
+    waiting, in milliseconds.
+    """
+    _check_strategy(strategy)
+    started = time.monotonic()
+
+    if assets is not None:
+        async def serve_asset(route):
+            # Images may be re-encoded on the way, which is too slow for the event loop
+            found = await asyncio.to_thread(assets.get, _url_path(route.request.url))
+            if found is None:
+                await route.fulfill(status=404)
+            else:
+                body, content_type = found
+                await route.fulfill(body=body, content_type=content_type)
+
+        await page.route(LOCAL_ORIGIN + "**", serve_asset)
+        html = _with_base(html, LOCAL_ORIGIN + (quote(assets.root) + "/" if assets.root else ""))
+
+    if base_dir is not None:
+        async def serve_local(route):
+            path = _local_file(base_dir, route.request.url)
+            if path is None:
+                await route.fulfill(status=404)
+            else:
+                await route.fulfill(path=path)
+
+        await page.route(LOCAL_ORIGIN + "**", serve_local)
+        html = _with_base(html)
+
+    wait_until = "networkidle" if strategy == "networkidle" else "load"
+    await page.set_content(html, wait_until=wait_until, timeout=timeout_ms)
+    if strategy == "ready":
+        await page.evaluate(_READY_SCRIPT, [ready_hook, _remaining(started, timeout_ms)])
+
+    return (time.monotonic() - started) * 1000
+
+
+def load_page_sync(
+    page,
+    html: str,
+    base_dir: Optional[str] = None,
+    strategy: str = DEFAULT_WAIT_STRATEGY,
+    timeout_ms: float = DEFAULT_WAIT_TIMEOUT_MS,
+    ready_hook: Optional[str] = DEFAULT_READY_HOOK,
+) -> float:
+    """Synchronous Playwright counterpart of :func:`load_page`."""
+    _check_strategy(strategy)
+    started = time.monotonic()
+
+    if base_dir is not None:
+        def serve_local(route):
+            path = _local_file(base_dir, route.request.url)
+            if path is None:
+                route.fulfill(status=404)
+            else:
+                route.fulfill(path=path)
+
+        page.route(LOCAL_ORIGIN + "**", serve_local)
+        html = _with_base(html)
+
+    wait_until = "networkidle" if strategy == "networkidle" else "load"
+    page.set_content(html, wait_until=wait_until, timeout=timeout_ms)
+    if strategy == "ready":
+        page.evaluate(_READY_SCRIPT, [ready_hook, _remaining(started, timeout_ms)])
+
+    return (time.monotonic() - started) * 1000
@@ -0,0 +1,370 @@
+import os
+import json
+import time
+import queue
+import atexit
+import socket
+import threading
+import subprocess
+import http.client
+from typing import Iterator, List, Optional, Sequence
+
+# "server" keeps long-lived `pandoc server` processes; "subprocess" runs pandoc per call
+DEFAULT_BACKEND = os.environ.get("PANDOC_BACKEND", "server")
+DEFAULT_POOL_SIZE = int(os.environ.get("PANDOC_WORKERS", "0")) or (os.cpu_count() or 1)
+DEFAULT_TIMEOUT = float(os.environ.get("PANDOC_TIMEOUT", "60"))
+STARTUP_TIMEOUT = 10.0
+# Characters of source text encoded and sent to pandoc at a time
+STREAM_CHUNK_CHARS = 64 * 1024
+
+# Command line flags that map onto pandoc server's JSON options
+_SERVER_FLAGS = {
+    "--standalone": ("standalone", True),
+    "-s": ("standalone", True),
+}
+
+
+class PandocServerUnavailable(Exception):
+    """Raised when `pandoc server` cannot be started or stops answering."""
+
+
+class PandocTimeout(RuntimeError):
+    """Raised when a conversion runs past its timeout; the pandoc process doing it is killed."""
+
+
+def pandoc_path() -> str:
+    """Locates the pandoc binary; pypandoc is only imported once pandoc is needed."""
+    import pypandoc
+
+    return pypandoc.get_pandoc_path()
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _server_options(extra_args: Sequence[str]) -> Optional[dict]:
+    """Translates pandoc flags to server options, or None if any flag is unsupported."""
+    options = {}
+    for arg in extra_args:
+        if arg not in _SERVER_FLAGS:
+            return None
+        key, value = _SERVER_FLAGS[arg]
+        options[key] = value
+    return options
+
+
+def _source_chunks(source: str) -> Iterator[str]:
+    for start in range(0, len(source), STREAM_CHUNK_CHARS):
+        yield source[start:start + STREAM_CHUNK_CHARS]
+
+
+def _request_body(source: str, params: dict) -> Iterator[bytes]:
+    """Encodes a pandoc server request piece by piece.
+
+    The source is escaped one chunk at a time rather than serialized into a
+    second full-size JSON string and then a third full-size bytes object.
+    """
+    yield b'{"text": "'
+    for chunk in _source_chunks(source):
+        yield json.dumps(chunk, ensure_ascii=False)[1:-1].encode("utf-8")
+    yield b'", ' + json.dumps(params)[1:].encode("utf-8")
+
+
+class _ServerWorker:
+    """One `pandoc server` process and a keep-alive HTTP connection to it."""
+
+    def __init__(self, executable: str, timeout: float):
+        self.port = _free_port()
+        self.timeout = timeout
+        self.process = subprocess.Popen(
+            [executable, "server", "--port", str(self.port), "--timeout", str(int(timeout))],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self._connection: Optional[http.client.HTTPConnection] = None
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def wait_ready(self, timeout: float = STARTUP_TIMEOUT) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.alive():
+                raise PandocServerUnavailable("pandoc server exited during startup")
+            try:
+                socket.create_connection(("127.0.0.1", self.port), timeout=0.5).close()
+                return
+            except OSError:
+                time.sleep(0.05)
+        self.close()
+        raise PandocServerUnavailable("pandoc server did not start listening in time")
+
+    def convert(self, source: str, params: dict, timeout: Optional[float] = None) -> str:
+        headers = {"Content-Type": "application/json", "Accept": "application/json"}
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+
+        # A kept-alive connection may have been closed by the server; retry once on a new one
+        for attempt in range(2):
+            if self._connection is None:
+                self._connection = http.client.HTTPConnection("127.0.0.1", self.port)
+            self._connection.timeout = timeout
+            if self._connection.sock is not None:
+                self._connection.sock.settimeout(timeout)
+            try:
+                # Without a Content-Length, http.client sends the chunks with chunked encoding
+                self._connection.request("POST", "/", _request_body(source, params), headers)
+                response = self._connection.getresponse()
+                data = response.read()
+                break
+            except socket.timeout:
+                self._connection.close()
+                self._connection = None
+                raise PandocTimeout(f"pandoc did not finish within {timeout:g}s")
+            except (http.client.HTTPException, OSError) as e:
+                self._connection.close()
+                self._connection = None
+                if attempt or not self.alive():
+                    raise PandocServerUnavailable(f"pandoc server request failed: {e}")
+
+        if response.status != 200:
+            raise RuntimeError(
+                f"pandoc server conversion failed ({response.status}): "
+                f"{data.decode('utf-8', 'replace')}"
+            )
+        result = json.loads(data)
+        if result.get("base64"):
+            raise RuntimeError("pandoc server returned binary output for a text conversion")
+        return result["output"]
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+        if self.alive():
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+class PandocServerPool:
+    """Up to ``size`` long-lived `pandoc server` workers shared between threads.
+
+    Workers are spawned on demand, so a one-shot script only ever pays for a
+    single process while a busy server grows to one worker per core.
+    """
+
+    def __init__(self, size: int = DEFAULT_POOL_SIZE, executable: Optional[str] = None,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.size = max(1, size)
+        self.executable = executable
+        self.timeout = timeout
+        self._idle: "queue.Queue[_ServerWorker]" = queue.Queue()
+        self._workers: List[_ServerWorker] = []
+        self._lock = threading.Lock()
+        self._spawning = 0
+        self._closed = False
+
+    def start(self, workers: int = 1) -> None:
+        """Eagerly spawns ``workers`` processes so the first conversions are warm."""
+        for _ in range(min(workers, self.size)):
+            self._idle.put(self._spawn())
+
+    def _spawn(self) -> _ServerWorker:
+        if self.executable is None:
+            self.executable = pandoc_path()
+        worker = _ServerWorker(self.executable, self.timeout)
+        worker.wait_ready()
+        with self._lock:
+            self._workers.append(worker)
+        return worker
+
+    def _discard(self, worker: _ServerWorker) -> None:
+        worker.close()
+        with self._lock:
+            if worker in self._workers:
+                self._workers.remove(worker)
+
+    def _acquire(self, timeout: Optional[float] = None) -> _ServerWorker:
+        """An idle worker, a new one while the pool can grow, or the next to come free.
+
+        With a ``timeout`` shorter than the pool's, the caller's budget bounds
+        the wait and running out of it raises :class:`PandocTimeout`.
+        """
+        if self._closed:
+            raise PandocServerUnavailable("pandoc server pool is closed")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            can_grow = len(self._workers) + self._spawning < self.size
+            if can_grow:
+                self._spawning += 1
+        if can_grow:
+            try:
+                return self._spawn()
+            finally:
+                with self._lock:
+                    self._spawning -= 1
+        wait = self.timeout if timeout is None else min(timeout, self.timeout)
+        try:
+            return self._idle.get(timeout=wait)
+        except queue.Empty:
+            if wait != self.timeout:
+                raise PandocTimeout(f"no pandoc server worker became free within {wait:g}s")
+            raise PandocServerUnavailable("no pandoc server worker became free in time")
+
+    def convert_text(
+        self, source: str, to: str, format: str, options: dict, timeout: Optional[float] = None
+    ) -> str:
+        acquire_started = time.monotonic()
+        worker = self._acquire(timeout)
+        if timeout is not None:
+            # The wait for a worker comes out of the same budget as the conversion
+            timeout -= time.monotonic() - acquire_started
+            if timeout <= 0:
+                self._idle.put(worker)
+                raise PandocTimeout("no time left for the conversion after waiting for a pandoc server worker")
+        try:
+            return worker.convert(source, {"from": format, "to": to, **options}, timeout)
+        except (PandocServerUnavailable, PandocTimeout):
+            # A timed out worker is still busy with the conversion, so it is stopped too
+            self._discard(worker)
+            worker = None
+            raise
+        finally:
+            if worker is not None:
+                self._idle.put(worker)
+
+    def has_workers(self) -> bool:
+        with self._lock:
+            return bool(self._workers)
+
+    def stop(self) -> None:
+        self._closed = True
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+
+_pool: Optional[PandocServerPool] = None
+_pool_lock = threading.Lock()
+_server_disabled = DEFAULT_BACKEND != "server"
+
+
+def get_pool() -> Optional[PandocServerPool]:
+    """Returns the process-wide server pool, or None when running in per-call mode."""
+    global _pool
+    if _server_disabled:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = PandocServerPool()
+            atexit.register(_pool.stop)
+        return _pool
+
+
+def start(workers: int = 1) -> bool:
+    """Warms the server pool; returns False if pandoc server is not available."""
+    global _server_disabled
+    pool = get_pool()
+    if pool is None:
+        return False
+    try:
+        pool.start(workers)
+        return True
+    except (PandocServerUnavailable, OSError):
+        _server_disabled = True
+        return False
+
+
+def stop() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.stop()
+            _pool = None
+
+
+def convert_text(
+    source: str, to: str, format: str, extra_args: Sequence[str] = (), timeout: Optional[float] = None
+) -> str:
+    """Drop-in replacement for pypandoc.convert_text backed by the server pool.
+
+    Falls back to a pandoc process per call when the backend is set to
+    "subprocess", when `pandoc server` is unavailable (pandoc older than
+    2.18 or built without server support), or when the flags have no
+    server equivalent. With a ``timeout`` the pandoc process is killed and
+    :class:`PandocTimeout` raised once the conversion runs past it.
+    """
+    global _server_disabled
+    pool = get_pool()
+    options = _server_options(extra_args)
+    if pool is not None and options is not None:
+        try:
+            return pool.convert_text(source, to, format, options, timeout)
+        except PandocServerUnavailable:
+            # Keep serving through the per-call path if the server cannot be started at all
+            if not pool.has_workers():
+                _server_disabled = True
+        except OSError:
+            _server_disabled = True
+    return _convert_subprocess(source, to, format, extra_args, timeout)
+
+
+def _convert_subprocess(
+    source: str, to: str, format: str, extra_args: Sequence[str], timeout: Optional[float] = None
+) -> str:
+    """Runs one pandoc process, feeding the source to its stdin chunk by chunk."""
+    process = subprocess.Popen(
+        [pandoc_path(), "--from", format, "--to", to, *extra_args],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    errors = []
+
+    def feed() -> None:
+        try:
+            for chunk in _source_chunks(source):
+                process.stdin.write(chunk.encode("utf-8"))
+            process.stdin.close()
+        except BrokenPipeError:
+            # pandoc exited early; its exit status and stderr say why
+            pass
+
+    # stdin and stderr are serviced from threads so no pipe can fill up and deadlock pandoc
+    feeder = threading.Thread(target=feed, daemon=True)
+    drainer = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    timed_out = threading.Event()
+
+    def kill() -> None:
+        timed_out.set()
+        process.kill()
+
+    killer = threading.Timer(timeout, kill) if timeout is not None else None
+    feeder.start()
+    drainer.start()
+    if killer is not None:
+        killer.start()
+    try:
+        output = process.stdout.read()
+        feeder.join()
+        drainer.join()
+        process.wait()
+    finally:
+        if killer is not None:
+            killer.cancel()
+    if timed_out.is_set():
+        raise PandocTimeout(f"pandoc did not finish within {timeout:g}s")
+    if process.returncode != 0:
+        message = b"".join(errors).decode("utf-8", "replace").strip()
+        raise RuntimeError(f"Pandoc died with exitcode \"{process.returncode}\" during conversion: {message}")
+    return output.decode("utf-8")
@@ -1,17 +1,23 @@
 import os
 import sys
 import tempfile
+from typing import Optional
 from playwright.sync_api import sync_playwright
-import pypandoc
+import pandoc_worker
+import font_assets
+from page_loader import load_page_sync
 
-def convert_markdown_to_pdf_sync(md_content: str) -> str:
-    """Converts Markdown content to PDF using Playwright synchronously."""
+def convert_markdown_to_pdf_sync(md_content: str, output_path: Optional[str] = None) -> str:
+    """Converts Markdown content to PDF using Playwright synchronously.
+
+    Without ``output_path`` the PDF is written to a temporary directory that
+    is removed again before this returns.
+    """
 
     with tempfile.TemporaryDirectory() as temp_dir:
-        html_path = os.path.join(temp_dir, "temp.html")
-        pdf_path = os.path.join(temp_dir, "output.pdf")
+        pdf_path = output_path or os.path.join(temp_dir, "output.pdf")
 
-        html_content = pypandoc.convert_text(
+        html_content = pandoc_worker.convert_text(
             md_content,
             "html",
             format="markdown",
@@ -47,14 +53,11 @@ def convert_markdown_to_pdf_sync(md_content: str) -> str:
         </html>
         """
 
-        with open(html_path, "w", encoding="utf-8") as f:
-            f.write(styled_html)
-
         with sync_playwright() as p:
             browser = p.chromium.launch()
             page = browser.new_page()
-            page.goto(f"file://{os.path.abspath(html_path)}")
-            page.wait_for_load_state("networkidle")
+            page.route(font_assets.FONT_FILE_PATTERN, font_assets.handle_font_route_sync)
+            load_page_sync(page, font_assets.inline_fonts(styled_html, md_content))
             page.pdf(
                 path=pdf_path,
                 format="A4",
@@ -70,8 +73,8 @@ def convert_markdown_to_pdf_sync(md_content: str) -> str:
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python pdf_converter.py <markdown_file>")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python pdf_converter.py <markdown_file> [output_pdf]")
         sys.exit(1)
 
     markdown_file = sys.argv[1]
@@ -80,7 +83,7 @@ if __name__ == "__main__":
         with open(markdown_file, "r", encoding="utf-8") as f:
             md_content = f.read()
 
-        pdf_path = convert_markdown_to_pdf_sync(md_content)
+        pdf_path = convert_markdown_to_pdf_sync(md_content, sys.argv[2] if len(sys.argv) == 3 else None)
         print(pdf_path)  # Print the PDF path to stdout
     except Exception as e:
         print(f"Error during PDF conversion: {e}", file=sys.stderr)
@@ -0,0 +1,178 @@
+import io
+import os
+import shutil
+import tempfile
+import subprocess
+import importlib.util
+from typing import Optional
+
+from html_template import PDF_OPTIONS
+from image_assets import PILLOW_INSTALLED, max_pixels
+
+# Imported by the optimizer itself, so startup does not pay for it; without it there is no linearization
+PIKEPDF_INSTALLED = importlib.util.find_spec("pikepdf") is not None
+
+# Ghostscript rewrites the whole file: subsets fonts, downsamples images and shares duplicates
+GHOSTSCRIPT = os.environ.get("GHOSTSCRIPT", "gs")
+PDF_OPTIMIZE_TIMEOUT = float(os.environ.get("PDF_OPTIMIZE_TIMEOUT", "120"))
+
+# image_dpi None keeps images at their resolution; jpeg_quality None keeps them lossless.
+# Ghostscript takes its JPEG quality from gs_settings, pypdf from jpeg_quality.
+PROFILES = {
+    # Smallest files for reading on screens: 150 dpi JPEGs, linearized for fast web view
+    "screen": {"image_dpi": 150, "jpeg_quality": 60, "linearize": True, "gs_settings": "/screen"},
+    # Office and home printers
+    "print": {"image_dpi": 300, "jpeg_quality": 85, "linearize": False, "gs_settings": "/printer"},
+    # Nothing lossy: fonts are subset and duplicates shared, images are kept as they are
+    "archive": {"image_dpi": None, "jpeg_quality": None, "linearize": False, "gs_settings": "/prepress"},
+}
+
+
+class OptimizeError(Exception):
+    """Raised when the optimizer fails on a PDF."""
+
+
+def ghostscript_path() -> Optional[str]:
+    return shutil.which(GHOSTSCRIPT)
+
+
+def backend_options() -> dict:
+    """Which optimizers are installed, for cache keys: each produces different output."""
+    return {
+        "ghostscript": ghostscript_path() is not None,
+        "pillow": PILLOW_INSTALLED,
+        "pikepdf": PIKEPDF_INSTALLED,
+    }
+
+
+def optimize_pdf(data: bytes, profile: str) -> bytes:
+    """Shrinks a PDF according to one of PROFILES.
+
+    With Ghostscript, fonts are re-subset, images downsampled to the
+    profile's resolution and identical objects written once. Without it,
+    pypdf shares identical objects and recompresses page content, and with
+    Pillow also downscales and re-encodes oversized images. pikepdf
+    linearizes for profiles that ask for it. The original comes back when
+    the optimized file would not be smaller.
+    """
+    settings = PROFILES[profile]
+    if ghostscript_path() is not None:
+        result = _ghostscript(data, settings)
+    else:
+        result = _pypdf(data, settings)
+    if len(result) >= len(data):
+        result = data
+    if settings["linearize"] and PIKEPDF_INSTALLED:
+        result = _linearize(result)
+    return result
+
+
+def _ghostscript(data: bytes, settings: dict) -> bytes:
+    args = [
+        ghostscript_path(),
+        "-q", "-dNOPAUSE", "-dBATCH", "-dSAFER",
+        "-sDEVICE=pdfwrite",
+        "-dCompatibilityLevel=1.7",
+        f"-dPDFSETTINGS={settings['gs_settings']}",
+        "-dSubsetFonts=true",
+        "-dCompressFonts=true",
+        "-dDetectDuplicateImages=true",
+    ]
+    dpi = settings["image_dpi"]
+    for kind in ("Color", "Gray", "Mono"):
+        if dpi is None:
+            args.append(f"-dDownsample{kind}Images=false")
+        else:
+            args += [f"-dDownsample{kind}Images=true", f"-d{kind}ImageResolution={dpi}"]
+    if settings["jpeg_quality"] is None:
+        # Re-encoding would either lose detail or inflate the JPEGs Chromium wrote
+        args += ["-dAutoFilterColorImages=false", "-dAutoFilterGrayImages=false", "-dPassThroughJPEGImages=true"]
+
+    # Ghostscript seeks around its input, so both ends go through files
+    with tempfile.TemporaryDirectory(prefix="pdf-optimize-") as directory:
+        source = os.path.join(directory, "in.pdf")
+        target = os.path.join(directory, "out.pdf")
+        with open(source, "wb") as f:
+            f.write(data)
+        try:
+            subprocess.run(
+                args + [f"-sOutputFile={target}", source],
+                check=True,
+                capture_output=True,
+                timeout=PDF_OPTIMIZE_TIMEOUT,
+            )
+        except subprocess.CalledProcessError as e:
+            raise OptimizeError(f"Ghostscript failed: {e.stderr.decode('utf-8', 'replace').strip()}")
+        except subprocess.TimeoutExpired:
+            raise OptimizeError(f"Ghostscript took longer than {PDF_OPTIMIZE_TIMEOUT:g}s")
+        except OSError as e:
+            raise OptimizeError(f"Cannot run Ghostscript: {e}")
+        try:
+            with open(target, "rb") as f:
+                return f.read()
+        except OSError as e:
+            raise OptimizeError(f"Ghostscript wrote no output: {e}")
+
+
+def _pypdf(data: bytes, settings: dict) -> bytes:
+    from pypdf import PdfWriter
+    from pypdf.errors import PdfReadError
+
+    try:
+        writer = PdfWriter(clone_from=io.BytesIO(data))
+        if PILLOW_INSTALLED and settings["image_dpi"] is not None:
+            _recompress_images(writer, settings)
+        for page in writer.pages:
+            page.compress_content_streams()
+        writer.compress_identical_objects()
+        output = io.BytesIO()
+        writer.write(output)
+    except PdfReadError as e:
+        raise OptimizeError(f"Cannot read PDF: {e}")
+    except Exception as e:
+        # pypdf and Pillow raise whatever the malformed object they hit happens to provoke
+        raise OptimizeError(f"pypdf failed: {e!r}")
+    return output.getvalue()
+
+
+def _recompress_images(writer, settings: dict) -> None:
+    from PIL import Image
+
+    box = max_pixels(PDF_OPTIONS, settings["image_dpi"])
+    seen = set()
+    for page in writer.pages:
+        for image in page.images:
+            reference = image.indirect_reference
+            if reference is None or reference.idnum in seen:
+                continue
+            seen.add(reference.idnum)
+            # pypdf writes replacements without their transparency mask
+            if "/SMask" in reference.get_object():
+                continue
+            try:
+                picture = image.image
+            except (OSError, ValueError, NotImplementedError):
+                continue
+            if picture is None:
+                continue
+            oversized = picture.width > box[0] or picture.height > box[1]
+            if not oversized and picture.mode not in ("RGB", "L"):
+                continue
+            if oversized:
+                picture = picture.copy()
+                picture.thumbnail(box, Image.LANCZOS)
+            if picture.mode not in ("RGB", "L"):
+                picture = picture.convert("RGB")
+            image.replace(picture, quality=settings["jpeg_quality"])
+
+
+def _linearize(data: bytes) -> bytes:
+    import pikepdf
+
+    output = io.BytesIO()
+    try:
+        with pikepdf.open(io.BytesIO(data)) as pdf:
+            pdf.save(output, linearize=True)
+    except Exception as e:
+        raise OptimizeError(f"Cannot linearize PDF: {e}")
+    return output.getvalue()
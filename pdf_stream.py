@@ -0,0 +1,117 @@
+import os
+import base64
+from typing import AsyncIterator, Tuple
+
+# Documents whose HTML is at least this large are printed through a CDP stream
+PDF_STREAM_THRESHOLD = int(os.environ.get("PDF_STREAM_THRESHOLD", str(1024 * 1024)))
+STREAM_CHUNK_SIZE = 256 * 1024
+
+# Paper sizes in inches, as Playwright defines them for page.pdf(format=...)
+PAPER_SIZES = {
+    "letter": (8.5, 11),
+    "legal": (8.5, 14),
+    "tabloid": (11, 17),
+    "ledger": (17, 11),
+    "a0": (33.1, 46.8),
+    "a1": (23.4, 33.1),
+    "a2": (16.54, 23.4),
+    "a3": (11.7, 16.54),
+    "a4": (8.27, 11.7),
+    "a5": (5.83, 8.27),
+    "a6": (4.13, 5.83),
+}
+_UNITS_PER_INCH = {"in": 1.0, "cm": 2.54, "mm": 25.4, "px": 96.0}
+
+
+def _to_inches(value) -> float:
+    if isinstance(value, (int, float)):
+        return value / _UNITS_PER_INCH["px"]
+    value = value.strip().lower()
+    for unit, per_inch in _UNITS_PER_INCH.items():
+        if value.endswith(unit):
+            return float(value[: -len(unit)]) / per_inch
+    return float(value) / _UNITS_PER_INCH["px"]
+
+
+def paper_size(options: dict) -> Tuple[float, float]:
+    """Returns the (width, height) in inches described by page.pdf() style options."""
+    if "format" in options:
+        return PAPER_SIZES[options["format"].lower()]
+    return _to_inches(options.get("width", "8.5in")), _to_inches(options.get("height", "11in"))
+
+
+def printable_area(options: dict) -> Tuple[float, float]:
+    """Returns the (width, height) in inches inside the margins, turned for landscape."""
+    width, height = paper_size(options)
+    if options.get("landscape"):
+        width, height = height, width
+    margin = options.get("margin", {})
+    width -= _to_inches(margin.get("left", 0)) + _to_inches(margin.get("right", 0))
+    height -= _to_inches(margin.get("top", 0)) + _to_inches(margin.get("bottom", 0))
+    return width, height
+
+
+def cdp_print_params(options: dict) -> dict:
+    """Translates page.pdf() options into Page.printToPDF parameters."""
+    width, height = paper_size(options)
+    margin = options.get("margin", {})
+    return {
+        "paperWidth": width,
+        "paperHeight": height,
+        "marginTop": _to_inches(margin.get("top", 0)),
+        "marginRight": _to_inches(margin.get("right", 0)),
+        "marginBottom": _to_inches(margin.get("bottom", 0)),
+        "marginLeft": _to_inches(margin.get("left", 0)),
+        "printBackground": options.get("print_background", False),
+        "landscape": options.get("landscape", False),
+        "preferCSSPageSize": options.get("prefer_css_page_size", False),
+        "displayHeaderFooter": options.get("display_header_footer", False),
+        "headerTemplate": options.get("header_template", ""),
+        "footerTemplate": options.get("footer_template", ""),
+        # Bookmarks from the document headings; ignored by Chromium releases without it
+        "generateDocumentOutline": options.get("outline", False),
+    }
+
+
+async def stream_pdf(page, options: dict, chunk_size: int = STREAM_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Prints ``page`` with Page.printToPDF in stream transfer mode and yields the chunks.
+
+    Chromium keeps the finished PDF on its side and hands it over piece by
+    piece, so neither the browser protocol message nor this process ever
+    holds the whole document as a single base64 string.
+    """
+    session = await page.context.new_cdp_session(page)
+    try:
+        result = await session.send(
+            "Page.printToPDF", {**cdp_print_params(options), "transferMode": "ReturnAsStream"}
+        )
+        handle = result["stream"]
+        try:
+            while True:
+                chunk = await session.send("IO.read", {"handle": handle, "size": chunk_size})
+                data = chunk.get("data", "")
+                if data:
+                    yield base64.b64decode(data) if chunk.get("base64Encoded") else data.encode("utf-8")
+                if chunk.get("eof"):
+                    break
+        finally:
+            await session.send("IO.close", {"handle": handle})
+    finally:
+        await session.detach()
+
+
+async def prime_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Runs ``chunks`` up to its first item so set-up errors raise here, not mid-response."""
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def primed() -> AsyncIterator[bytes]:
+        if first is None:
+            return
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return primed()
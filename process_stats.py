@@ -0,0 +1,94 @@
+import os
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+except ImportError:  # /proc fallback, Linux only
+    psutil = None
+
+
+def _children_from_proc() -> Dict[int, List[int]]:
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # The command name may contain spaces, so parse after its closing parenthesis
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    return children
+
+
+def _rss_from_proc(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+def tree_rss(pid: int) -> int:
+    """Resident bytes of ``pid`` and all its descendants (Chromium, node, pandoc).
+
+    Shared pages are counted once per process, so this overstates the true
+    footprint of multi-process Chromium, but it does so consistently.
+    """
+    if psutil is not None:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            return 0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                continue
+        return total
+
+    if not os.path.isdir("/proc"):
+        return 0
+    children = _children_from_proc()
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        total += _rss_from_proc(current)
+        stack.extend(children.get(current, ()))
+    return total
+
+
+def find_pid(marker: str) -> Optional[int]:
+    """Returns the process whose command line contains ``marker``, or None.
+
+    When child processes inherited the marker too, the topmost one is returned.
+    """
+    if not os.path.isdir("/proc"):
+        return None
+    matches = set()
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                if marker.encode("utf-8") in f.read():
+                    matches.add(int(entry))
+        except OSError:
+            continue
+    for pid in matches:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        if int(stat[stat.rindex(")") + 2:].split()[1]) not in matches:
+            return pid
+    return None
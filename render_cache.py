@@ -0,0 +1,219 @@
+import os
+import json
+import time
+import hashlib
+import asyncio
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Union
+
+DEFAULT_MEMORY_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 1024 * 1024 * 1024
+DEFAULT_DISK_TTL = 24 * 60 * 60
+# Other processes may share the disk tier, so its real size is rescanned this often
+DISK_RESCAN_INTERVAL = 60.0
+_HASH_CHUNK_CHARS = 64 * 1024
+
+
+def make_cache_key(content: Union[bytes, str], output_format: str, options: dict) -> str:
+    """Hashes the source together with everything that affects the output.
+
+    Text is hashed as UTF-8 a slice at a time, giving the same key as its
+    encoded bytes without making an encoded copy of the whole source.
+    """
+    digest = hashlib.sha256()
+    digest.update(output_format.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    digest.update(b"\0")
+    if isinstance(content, str):
+        for start in range(0, len(content), _HASH_CHUNK_CHARS):
+            digest.update(content[start:start + _HASH_CHUNK_CHARS].encode("utf-8"))
+    else:
+        digest.update(content)
+    return digest.hexdigest()
+
+
+class RenderCache:
+    """Content-addressed cache of rendered outputs.
+
+    The memory tier is an LRU bounded by the total size of the stored
+    values. The optional disk tier keeps one file per key under
+    ``disk_dir``, expires entries older than ``disk_ttl`` seconds and drops
+    the least recently written files once ``disk_max_bytes`` is exceeded.
+    Disk hits are promoted into the memory tier. Several processes can
+    share one ``disk_dir``: writes are atomic renames and the size budget is
+    re-measured from the directory periodically.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_MEMORY_MAX_BYTES,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = DEFAULT_DISK_MAX_BYTES,
+        disk_ttl: float = DEFAULT_DISK_TTL,
+    ):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.disk_ttl = disk_ttl
+
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "disk_hits": 0,
+            "disk_evictions": 0,
+        }
+
+        self._disk_bytes = 0
+        self._disk_scanned = time.monotonic()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, _, size in self._disk_files())
+
+    @classmethod
+    def from_env(cls) -> "RenderCache":
+        """Builds a cache configured from RENDER_CACHE_* environment variables."""
+        return cls(
+            max_bytes=int(os.environ.get("RENDER_CACHE_MAX_BYTES", DEFAULT_MEMORY_MAX_BYTES)),
+            disk_dir=os.environ.get("RENDER_CACHE_DIR") or None,
+            disk_max_bytes=int(os.environ.get("RENDER_CACHE_DISK_MAX_BYTES", DEFAULT_DISK_MAX_BYTES)),
+            disk_ttl=float(os.environ.get("RENDER_CACHE_DISK_TTL", DEFAULT_DISK_TTL)),
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                self._counters["hits"] += 1
+                return value
+
+        value = self._disk_get(key)
+        with self._lock:
+            if value is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            self._counters["disk_hits"] += 1
+            self._memory_put(key, value)
+        return value
+
+    def put(self, key: str, value: bytes) -> None:
+        with self._lock:
+            self._memory_put(key, value)
+        self._disk_put(key, value)
+
+    async def get_async(self, key: str) -> Optional[bytes]:
+        """:meth:`get` for coroutines; with a disk tier it runs in a thread, off the event loop."""
+        if not self.disk_dir:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def put_async(self, key: str, value: bytes) -> None:
+        """:meth:`put` for coroutines; with a disk tier it runs in a thread, off the event loop."""
+        if not self.disk_dir:
+            self.put(key, value)
+            return
+        await asyncio.to_thread(self.put, key, value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_bytes": self._disk_bytes if self.disk_dir else None,
+            }
+
+    def _memory_put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= len(previous)
+        self._entries[key] = value
+        self._bytes += len(value)
+        while self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted)
+            self._counters["evictions"] += 1
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], key)
+
+    def _disk_files(self):
+        for root, _, names in os.walk(self.disk_dir):
+            for name in names:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def _disk_get(self, key: str) -> Optional[bytes]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.disk_ttl:
+                self._disk_remove(path)
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _disk_put(self, key: str, value: bytes) -> None:
+        if not self.disk_dir or len(value) > self.disk_max_bytes:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced = 0
+        # Write then rename so concurrent readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._disk_bytes += len(value) - replaced
+        if (
+            self._disk_bytes > self.disk_max_bytes
+            or time.monotonic() - self._disk_scanned > DISK_RESCAN_INTERVAL
+        ):
+            self._disk_trim()
+
+    def _disk_remove(self, path: str) -> None:
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+            self._counters["disk_evictions"] += 1
+
+    def _disk_trim(self) -> None:
+        now = time.time()
+        files = sorted(self._disk_files(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in files)
+        for path, mtime, size in files:
+            if total <= self.disk_max_bytes and now - mtime <= self.disk_ttl:
+                continue
+            self._disk_remove(path)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+            self._disk_scanned = time.monotonic()
@@ -0,0 +1,200 @@
+import os
+import re
+import math
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from browser_pool import PoolBusyError
+
+# Documents predicted to print to at most this many pages take the fast lane
+SMALL_JOB_PAGES = float(os.environ.get("RENDER_SMALL_JOB_PAGES", "10"))
+# Render slots held back for small documents; 0 means a quarter of the slots
+FAST_LANE_SLOTS = int(os.environ.get("RENDER_FAST_LANE_SLOTS", "0"))
+# Predicted pages a large document may print per slot it occupies
+LARGE_SLOT_PAGES = float(os.environ.get("RENDER_LARGE_SLOT_PAGES", "100"))
+DEFAULT_MAX_WAITING = int(os.environ.get("RENDER_QUEUE_MAX", "64"))
+DEFAULT_QUEUE_TIMEOUT = float(os.environ.get("RENDER_QUEUE_TIMEOUT", "60"))
+
+# Extra weight of layout-heavy elements, in bytes of plain text they print like
+HEADING_UNITS = 200
+TABLE_ROW_UNITS = 100
+IMAGE_UNITS = 20000
+# Starting guess of pages per unit until real renders have been seen: ~3 KB of text per page
+INITIAL_PAGES_PER_UNIT = 1 / 3000
+LEARNING_RATE = 0.1
+
+_HEADING_RE = re.compile(r"^#{1,6}\s", re.MULTILINE)
+_TABLE_ROW_RE = re.compile(r"^\s*\|", re.MULTILINE)
+_IMAGE_RE = re.compile(r"!\[")
+_PDF_PAGE_RE = re.compile(rb"/Type\s*/Page\b")
+
+FAST = "fast"
+LARGE = "large"
+
+
+def count_pdf_pages(data: bytes) -> int:
+    """Counts the page objects in (a chunk of) a PDF as Chromium writes it."""
+    return len(_PDF_PAGE_RE.findall(data))
+
+
+class _Ticket:
+    def __init__(self, client: str, lane: str, slots: int):
+        self.client = client
+        self.lane = lane
+        self.slots = slots
+        self.shared = False
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+
+
+class RenderScheduler:
+    """Admits PDF renders to the browser pool's slots by their expected cost.
+
+    :meth:`estimate` predicts the page count of a Markdown document from its
+    size and its heading, table row and image counts, scaled by the pages
+    per unit learned from finished renders (:meth:`observe`). Documents of
+    up to ``small_pages`` pages are small: they may use any free slot,
+    including ``fast_slots`` that only small documents can use. Large
+    documents share the remaining slots and occupy one slot per
+    ``large_slot_pages`` predicted pages, which chunked renders use as
+    their parallelism.
+
+    Waiting renders are queued per client and lane. The client holding the
+    fewest slots goes first, and a large render that does not fit yet is not
+    overtaken on the shared slots, so it cannot be starved by a stream of
+    small ones; they keep flowing through the fast lane meanwhile.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        fast_slots: int = FAST_LANE_SLOTS,
+        small_pages: float = SMALL_JOB_PAGES,
+        large_slot_pages: float = LARGE_SLOT_PAGES,
+        max_waiting: int = DEFAULT_MAX_WAITING,
+        queue_timeout: Optional[float] = DEFAULT_QUEUE_TIMEOUT,
+    ):
+        if capacity < 1:
+            raise ValueError("Scheduler capacity must be at least 1")
+        # A single slot cannot be reserved without shutting large documents out entirely
+        self.fast_slots = min(fast_slots or max(1, capacity // 4), capacity - 1)
+        self.shared_slots = capacity - self.fast_slots
+        self.small_pages = small_pages
+        self.large_slot_pages = large_slot_pages
+        self.max_waiting = max_waiting
+        self.queue_timeout = queue_timeout
+        self.pages_per_unit = INITIAL_PAGES_PER_UNIT
+
+        self._fast_in_use = 0
+        self._shared_in_use = 0
+        self._client_slots: Dict[str, int] = {}
+        self._queues: Dict[Tuple[str, str], Deque[_Ticket]] = {}
+        self._arrivals: Dict[_Ticket, int] = {}
+        self._sequence = 0
+
+    def waiting(self, lane: Optional[str] = None) -> int:
+        return sum(1 for ticket in self._arrivals if lane is None or ticket.lane == lane)
+
+    @staticmethod
+    def units(md_content: str) -> float:
+        """Sizes a document in bytes of plain text, weighting the elements that take up page space."""
+        return (
+            len(md_content)
+            + HEADING_UNITS * len(_HEADING_RE.findall(md_content))
+            + TABLE_ROW_UNITS * len(_TABLE_ROW_RE.findall(md_content))
+            + IMAGE_UNITS * len(_IMAGE_RE.findall(md_content))
+        )
+
+    def estimate(self, md_content: str) -> float:
+        """Predicts how many pages ``md_content`` prints to."""
+        return max(1.0, self.units(md_content) * self.pages_per_unit)
+
+    def observe(self, md_content: str, pages: int) -> None:
+        """Learns from the page count of a finished render."""
+        units = self.units(md_content)
+        if units > 0 and pages > 0:
+            self.pages_per_unit += LEARNING_RATE * (pages / units - self.pages_per_unit)
+
+    @asynccontextmanager
+    async def admit(self, pages: float, client: str = "") -> AsyncIterator[_Ticket]:
+        """Waits for room to render a document of ``pages`` predicted pages.
+
+        Raises :class:`PoolBusyError` when too many renders are already
+        waiting or no room frees up within ``queue_timeout`` seconds.
+        """
+        if pages <= self.small_pages:
+            ticket = _Ticket(client, FAST, 1)
+        else:
+            slots = math.ceil(pages / self.large_slot_pages)
+            ticket = _Ticket(client, LARGE, max(1, min(slots, self.shared_slots)))
+        if len(self._arrivals) >= self.max_waiting:
+            raise PoolBusyError("Render queue is full")
+
+        self._sequence += 1
+        self._arrivals[ticket] = self._sequence
+        self._queues.setdefault((client, ticket.lane), deque()).append(ticket)
+        self._dispatch()
+        try:
+            await asyncio.wait_for(ticket.future, self.queue_timeout)
+        except BaseException as e:
+            if ticket.future.done() and not ticket.future.cancelled():
+                self._release(ticket)
+            else:
+                self._dequeue(ticket)
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                raise PoolBusyError(f"No render slot became free within {self.queue_timeout:g}s") from None
+            raise
+        try:
+            yield ticket
+        finally:
+            self._release(ticket)
+
+    def _dequeue(self, ticket: _Ticket) -> None:
+        key = (ticket.client, ticket.lane)
+        queue = self._queues[key]
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[key]
+        del self._arrivals[ticket]
+
+    def _grant(self, ticket: _Ticket, shared: bool) -> None:
+        self._dequeue(ticket)
+        ticket.shared = shared
+        if shared:
+            self._shared_in_use += ticket.slots
+        else:
+            self._fast_in_use += ticket.slots
+        self._client_slots[ticket.client] = self._client_slots.get(ticket.client, 0) + ticket.slots
+        ticket.future.set_result(None)
+
+    def _release(self, ticket: _Ticket) -> None:
+        if ticket.shared:
+            self._shared_in_use -= ticket.slots
+        else:
+            self._fast_in_use -= ticket.slots
+        remaining = self._client_slots[ticket.client] - ticket.slots
+        if remaining:
+            self._client_slots[ticket.client] = remaining
+        else:
+            del self._client_slots[ticket.client]
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while True:
+            heads = sorted(
+                (queue[0] for queue in self._queues.values()),
+                key=lambda ticket: (self._client_slots.get(ticket.client, 0), self._arrivals[ticket]),
+            )
+            shared_blocked = False
+            for ticket in heads:
+                if ticket.lane == FAST and self._fast_in_use < self.fast_slots:
+                    self._grant(ticket, shared=False)
+                    break
+                if not shared_blocked and self._shared_in_use + ticket.slots <= self.shared_slots:
+                    self._grant(ticket, shared=True)
+                    break
+                shared_blocked = True
+            else:
+                return
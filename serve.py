@@ -0,0 +1,136 @@
+"""Runs the service as several uvicorn worker processes sized to the host.
+
+Every worker owns its own Chromium pool and pandoc servers. Workers reuse
+each other's renders through the shared disk cache in RENDER_CACHE_DIR,
+and they publish their metrics to METRICS_DIR so /metrics on any worker
+reports the whole host. Settings that are already in the environment win
+over the computed defaults.
+"""
+import os
+import sys
+import math
+import shutil
+import argparse
+import tempfile
+from typing import Optional
+
+# Resident memory of one worker: Python, its pandoc servers and the browser process
+WORKER_BASE_MB = int(os.environ.get("SERVE_WORKER_BASE_MB", "300"))
+# Additional memory per page rendering at the same time
+PAGE_MB = int(os.environ.get("SERVE_PAGE_MB", "150"))
+# Share of the memory limit the workers may plan to use
+MEMORY_BUDGET = 0.8
+# Pages rendering per core; Chromium waits on layout and I/O part of the time
+PAGES_PER_CPU = 2
+
+
+def cpu_limit() -> int:
+    """Usable cores, honouring CPU affinity and a cgroup v2 CPU quota."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return max(1, cpus)
+
+
+def memory_limit_mb() -> Optional[int]:
+    """The smaller of physical memory and a cgroup memory limit, in MiB."""
+    limits = []
+    for path in ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit():
+            limits.append(int(value) // (1024 * 1024))
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    limits.append(int(line.split()[1]) // 1024)
+                    break
+    except OSError:
+        pass
+    return min(limits) if limits else None
+
+
+def plan(cpus: int, memory_mb: Optional[int], workers: Optional[int] = None) -> dict:
+    """Picks the worker count and per-worker pool sizes.
+
+    Up to one worker per core, as long as each can still afford
+    PAGES_PER_CPU pages in the memory budget; the pages per worker then
+    share out PAGES_PER_CPU per core within what memory allows.
+    """
+    budget = memory_mb * MEMORY_BUDGET if memory_mb is not None else None
+    if workers is None:
+        workers = cpus
+        if budget is not None:
+            affordable = int(budget // (WORKER_BASE_MB + PAGES_PER_CPU * PAGE_MB))
+            workers = max(1, min(cpus, affordable))
+    pages = max(1, PAGES_PER_CPU * cpus // workers)
+    if budget is not None:
+        pages = max(1, min(pages, int((budget / workers - WORKER_BASE_MB) // PAGE_MB)))
+    return {
+        "workers": workers,
+        "pages_per_browser": pages,
+        "pandoc_workers": max(1, cpus // workers),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the converter with one process per core")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", "8000")))
+    parser.add_argument("-w", "--workers", type=int,
+                        default=int(os.environ.get("SERVE_WORKERS", os.environ.get("WEB_CONCURRENCY", "0"))) or None,
+                        help="worker processes (default: from CPU count and memory)")
+    parser.add_argument("--dry-run", action="store_true", help="print the plan and exit")
+    args = parser.parse_args(argv)
+
+    cpus = cpu_limit()
+    memory_mb = memory_limit_mb()
+    settings = plan(cpus, memory_mb, args.workers)
+    print(
+        f"{cpus} CPUs, {memory_mb if memory_mb is not None else 'unknown'} MiB: "
+        f"{settings['workers']} workers x {settings['pages_per_browser']} pages, "
+        f"{settings['pandoc_workers']} pandoc workers each"
+    )
+    if args.dry_run:
+        return 0
+
+    os.environ.setdefault("BROWSER_POOL_SIZE", "1")
+    os.environ.setdefault("BROWSER_POOL_PAGES_PER_BROWSER", str(settings["pages_per_browser"]))
+    os.environ.setdefault("PANDOC_WORKERS", str(settings["pandoc_workers"]))
+    os.environ.setdefault("RENDER_CACHE_DIR", os.path.join(tempfile.gettempdir(), "md-convert-cache"))
+
+    metrics_dir = os.environ.get("METRICS_DIR")
+    owns_metrics_dir = not metrics_dir
+    if owns_metrics_dir:
+        metrics_dir = os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="md-convert-metrics-")
+    else:
+        # Snapshots left by a previous run belong to processes that no longer exist
+        os.makedirs(metrics_dir, exist_ok=True)
+        for name in os.listdir(metrics_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(metrics_dir, name))
+
+    import uvicorn
+
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=settings["workers"])
+    finally:
+        if owns_metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+import os
+import asyncio
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from metrics import COALESCED
+
+# Output buffered per shared stream so later callers can join from the first chunk
+DEFAULT_MAX_BUFFER_BYTES = int(os.environ.get("COALESCE_MAX_BUFFER_BYTES", str(64 * 1024 * 1024)))
+# Chunks the producer may run ahead of its slowest reader once the stream can no longer be joined
+MAX_LAG_CHUNKS = 4
+
+T = TypeVar("T")
+
+
+class SharedRenderCancelled(Exception):
+    """Raised to the readers of a shared stream whose producer was cancelled."""
+
+
+class _Call:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class _Stream:
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        # Index of chunks[0] within the whole stream once consumed chunks are dropped
+        self.base = 0
+        self.size = 0
+        self.joinable = True
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.timings: dict = {}
+        self.readers: Dict[object, int] = {}
+        self.task: Optional[asyncio.Task] = None
+        self._updated = asyncio.Event()
+
+    @property
+    def end(self) -> int:
+        return self.base + len(self.chunks)
+
+    def notify(self) -> None:
+        self._updated.set()
+        self._updated.clear()
+
+    async def wait(self) -> None:
+        await self._updated.wait()
+
+    def trim(self) -> None:
+        if self.joinable or not self.readers:
+            return
+        consumed = min(self.readers.values()) - self.base
+        if consumed > 0:
+            del self.chunks[:consumed]
+            self.base += consumed
+
+
+class SingleFlight:
+    """Runs one conversion per key at a time and shares it with every identical caller.
+
+    The first caller for a key starts the work in its own task; callers that
+    arrive while it runs attach to it instead of starting their own. A
+    caller that goes away only detaches: the work is cancelled once no
+    caller is left waiting for it.
+    """
+
+    def __init__(self, max_buffer_bytes: int = DEFAULT_MAX_BUFFER_BYTES):
+        self.max_buffer_bytes = max_buffer_bytes
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Stream] = {}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[T]], output_format: str) -> T:
+        """Returns the result of ``func()``, shared with concurrent calls for ``key``."""
+        call = self._calls.get(key)
+        if call is None:
+            call = self._calls[key] = _Call(asyncio.ensure_future(func()))
+            call.task.add_done_callback(lambda _: self._forget(self._calls, key, call))
+        else:
+            COALESCED.inc(format=output_format)
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                # Callers arriving before the task has unwound start afresh instead of joining a cancelled call
+                self._forget(self._calls, key, call)
+
+    async def stream(
+        self,
+        key: str,
+        produce: Callable[[dict], AsyncIterator[bytes]],
+        output_format: str,
+        timings: Optional[dict] = None,
+    ) -> AsyncIterator[bytes]:
+        """Yields the chunks of ``produce(timings)``, shared with concurrent streams for ``key``.
+
+        Callers join from the first chunk for as long as the stream's output
+        fits in ``max_buffer_bytes``; after that the stream is no longer
+        joinable and only runs a few chunks ahead of its slowest reader.
+        ``timings`` receives what the producer records in its own dict.
+        """
+        flight = self._streams.get(key)
+        if flight is None:
+            flight = self._streams[key] = _Stream()
+            flight.task = asyncio.ensure_future(self._produce(key, flight, produce))
+        else:
+            COALESCED.inc(format=output_format)
+
+        reader = object()
+        flight.readers[reader] = flight.base
+        try:
+            while True:
+                position = flight.readers[reader]
+                if position < flight.end:
+                    chunk = flight.chunks[position - flight.base]
+                    flight.readers[reader] = position + 1
+                    flight.trim()
+                    flight.notify()
+                    if timings is not None:
+                        timings.update(flight.timings)
+                    yield chunk
+                elif flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                else:
+                    await flight.wait()
+        finally:
+            del flight.readers[reader]
+            if not flight.readers and not flight.done:
+                flight.task.cancel()
+                self._forget(self._streams, key, flight)
+            else:
+                flight.trim()
+                flight.notify()
+
+    async def _produce(self, key: str, flight: _Stream, produce: Callable[[dict], AsyncIterator[bytes]]) -> None:
+        try:
+            async for chunk in produce(flight.timings):
+                flight.chunks.append(chunk)
+                flight.size += len(chunk)
+                if flight.joinable and flight.size > self.max_buffer_bytes:
+                    flight.joinable = False
+                    self._forget(self._streams, key, flight)
+                    flight.trim()
+                flight.notify()
+                while not flight.joinable and flight.readers and flight.end - min(flight.readers.values()) > MAX_LAG_CHUNKS:
+                    await flight.wait()
+        except asyncio.CancelledError:
+            flight.error = SharedRenderCancelled("The shared conversion was cancelled")
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            self._forget(self._streams, key, flight)
+            flight.notify()
+
+    @staticmethod
+    def _forget(flights: dict, key: str, flight) -> None:
+        if flights.get(key) is flight:
+            del flights[key]
@@ -0,0 +1,50 @@
+import sys
+import time
+from typing import Awaitable, Callable, Dict
+
+
+class Warmup:
+    """Tracks the start-up steps that have to finish before the server takes traffic.
+
+    Each step is recorded as pending, ok or failed along with how long it
+    took. An optional step may fail without holding readiness back; any
+    other failure keeps the instance unready until it is restarted.
+    """
+
+    def __init__(self):
+        self.steps: Dict[str, dict] = {}
+        self.finished = False
+        self.stopping = False
+        self._started = time.perf_counter()
+
+    async def step(self, name: str, func: Callable[[], Awaitable[None]], optional: bool = False) -> bool:
+        """Runs ``func`` as the step ``name``; returns whether it succeeded."""
+        state = self.steps[name] = {"status": "pending", "optional": optional}
+        started = time.perf_counter()
+        try:
+            await func()
+        except Exception as e:
+            state.update(status="failed", error=str(e))
+            print(f"Warm-up step {name} failed: {e}", file=sys.stderr)
+            return False
+        else:
+            state["status"] = "ok"
+            return True
+        finally:
+            state["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def finish(self) -> None:
+        self.finished = True
+        elapsed = time.perf_counter() - self._started
+        print(f"Warm-up {'finished' if self.ready else 'failed'} after {elapsed:.1f}s", file=sys.stderr)
+
+    @property
+    def ready(self) -> bool:
+        return (
+            self.finished
+            and not self.stopping
+            and all(state["status"] == "ok" or state["optional"] for state in self.steps.values())
+        )
+
+    def report(self) -> dict:
+        return {"ready": self.ready, "finished": self.finished, "steps": self.steps}